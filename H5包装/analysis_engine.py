@@ -1,59 +1,31 @@
 """
 玩家社群发言分析引擎 - 桥接模块
-直接引用源代码目录中的模块，确保 H5包装 始终使用最新的源代码
+流程实现统一在仓库根目录的 core 包（core/pipeline.py），这里只做 H5 专用的参数封装和错误收集；
+仓库根目录 pip install -e . 后即可导入，不再修改 sys.path
+
+- 导入本模块没有副作用：不打印、不改 sys.path、不加载 pandas / numpy / requests
+- core 在第一次构造 PlayerCommunityAnalyzer 时才加载；原 notebook 的函数按名字按需加载（见 _LAZY_EXPORTS）
+- PlayerCommunityAnalyzer.from_config() 按 config.py 里的模型 / 并发 / 限流 / 预过滤 / 检查点等参数构造
+- 启动开销由 python -m core.bench_import 守住
 
 基于: 玩家发言总结_版本总结V2-Copy1.0(单日）/top5_Q2.ipynb
 """
 from __future__ import annotations
-import sys
+import importlib
 from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union
 
-# ==================== 配置源代码路径 ====================
-# 获取项目根目录
-PROJECT_ROOT = Path(__file__).parent.parent
-
-# 源代码目录路径
-SOURCE_DIR = PROJECT_ROOT / "玩家发言整理（供运营侧）" / "玩家发言总结_版本总结V2-Copy1.0(单日）"
-
-# 将源代码目录添加到 Python 路径（必须在导入前执行）
-if SOURCE_DIR.exists():
-    if str(SOURCE_DIR) not in sys.path:
-        sys.path.insert(0, str(SOURCE_DIR))
-    print(f"✅ 已加载源代码路径: {SOURCE_DIR}")
-    _SOURCE_LOADED = True
-else:
-    print(f"⚠️ 源代码路径不存在: {SOURCE_DIR}")
-    _SOURCE_LOADED = False
-
-# ==================== 从源代码导入模块（通配符导入，自动包含所有新增函数） ====================
-if _SOURCE_LOADED:
-    try:
-        # 从 data_processing.py 导入所有
-        from data_processing import *
-        
-        # 从 model_classifyV1_Copy1_Copy1.py 导入所有
-        from model_classifyV1_Copy1_Copy1 import *
-        
-        print("✅ 成功从源代码目录导入所有模块（通配符导入）")
-        
-    except ImportError as e:
-        print(f"⚠️ 导入源代码模块失败: {e}")
-        _SOURCE_LOADED = False
+if TYPE_CHECKING:
+    from core.pipeline import PipelineConfig
 
 
 # ==================== H5包装专用分析器类 ====================
-import json
-import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Union
-
-
 class PlayerCommunityAnalyzer:
     """
     玩家社群分析器 - 封装完整的分析流程
     专为 H5 Streamlit 应用设计
     
-    完全基于 top5_Q2.ipynb 的流程实现
+    流程本身在 core.pipeline.run_pipeline，这里负责检查点、进度回调和错误收集
     """
     
     def __init__(
@@ -63,6 +35,23 @@ class PlayerCommunityAnalyzer:
         v3_model_id: str,
         v3_1_model_id: str,
         prompt_dir: Union[str, Path],
+        max_workers: int = 4,
+        qps: float = 2.0,
+        use_cache: bool = True,
+        checkpoint_dir: Optional[Union[str, Path]] = None,
+        parse_cache_dir: Optional[Union[str, Path]] = None,
+        opinion_workers: Optional[int] = None,
+        opinion_timeout: Optional[float] = None,
+        prefilter: bool = True,
+        prefilter_rules: Optional[Union[str, Path]] = None,
+        dedup: bool = True,
+        stream: bool = False,
+        temperature: float = 0.20,
+        max_tokens: int = 16384,
+        timeout: int = 600,
+        retries: int = 2,
+        batch_size: Optional[int] = None,
+        batch_tokens: int = 15000,
     ):
         """
         初始化分析器
@@ -73,28 +62,96 @@ class PlayerCommunityAnalyzer:
             v3_model_id: V3 模型 ID（用于筛选游戏相关发言）
             v3_1_model_id: V3.1 模型 ID（用于话题簇分析和观点提取）
             prompt_dir: 提示词目录
+            max_workers: 模型#1/#2 批处理的并发批次数（<=1 时串行）
+            qps: 全局请求速率上限（次/秒），所有模型调用共享同一个令牌桶；<=0 不限流
+            use_cache: 是否使用磁盘响应缓存（输入完全相同的调用直接复用上次结果）
+            checkpoint_dir: 检查点根目录；为 None 时不落盘（analyze 的 resume 不生效）
+            parse_cache_dir: 聊天记录解析缓存目录；同一个 txt 只增量解析新增部分，为 None 时每次全量解析
+            opinion_workers: 模型#4 观点分析并发数，默认同 max_workers
+            opinion_timeout: 模型#4 单次调用墙钟超时（秒），默认同 HTTP 超时；超时的讨论点记为缺失
+            prefilter: 是否在模型#1 之前做本地预过滤（只影响送模型的行，热度/观点仍用全部发言）
+            prefilter_rules: 预过滤规则 JSON 路径；None 用默认规则
+            dedup: 是否合并近似重复发言（代表行带 重复次数/重复发言人；热度仍按全部发言统计）
+            stream: 模型输出是否走 SSE 流式（默认关闭；timeout 变为读超时；断流时保留已闭合的 JSON 对象，该批次不落检查点）
+            temperature / max_tokens / timeout / retries: 模型调用的采样参数、HTTP 超时（秒）和重试次数
+            batch_size / batch_tokens: analyze 默认的切批参数（单批行数上限 / 单批估算 token 预算）
+        """
+        from core.batch_executor import TokenBucket
+        from core.pipeline import PipelineConfig, make_model_caller
+        
+        self.config: PipelineConfig = PipelineConfig(
+            api_url=api_url,
+            api_key=api_key,
+            filter_model=v3_model_id,
+            main_model=v3_1_model_id,
+            prompt_dir=prompt_dir,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            retries=retries,
+            batch_size=batch_size,
+            batch_tokens=batch_tokens,
+            max_workers=max_workers,
+            qps=qps,
+            opinion_workers=opinion_workers,
+            opinion_timeout=opinion_timeout,
+            use_cache=use_cache,
+            stream=stream,
+            prefilter=prefilter,
+            prefilter_rules_file=prefilter_rules,
+            dedup=dedup,
+            parse_cache_dir=parse_cache_dir,
+        )
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        # 令牌桶跨多次 analyze 共享
+        self.rate_limiter = TokenBucket(rate=qps)
+        self._model_caller = make_model_caller(self.config, self.rate_limiter)
+    
+    @classmethod
+    def from_config(cls, api_key: Optional[str] = None, **overrides: Any) -> "PlayerCommunityAnalyzer":
         """
-        if not _SOURCE_LOADED:
-            raise RuntimeError("源代码模块未正确加载，请检查路径配置")
+        按 H5包装/config.py 构造分析器，overrides 覆盖其中任意参数（如 qps=1.0、checkpoint_dir=None）
         
-        self.api_url = api_url
-        self.api_key = api_key
-        self.v3_model_id = v3_model_id
-        self.v3_1_model_id = v3_1_model_id
-        self.prompt_dir = Path(prompt_dir)
+        config 在这里才导入（它在导入时会建 prompts / data / output 目录），导入本模块仍然没有副作用
+        """
+        import config as h5_config
         
-        # 分析参数（与 top5_Q2.ipynb 一致）
-        self.temperature = 0.20
-        self.max_tokens = 16384
-        self.timeout = 600
-        self.retries = 2
-        self.sleep_between = 1
+        kwargs: Dict[str, Any] = dict(
+            api_url=h5_config.API_URL,
+            api_key=api_key or h5_config.DEFAULT_API_KEY,
+            v3_model_id=h5_config.V3_MODEL_ID,
+            v3_1_model_id=h5_config.V3_1_MODEL_ID,
+            prompt_dir=h5_config.PROMPT_DIR,
+            max_workers=h5_config.MAX_WORKERS,
+            qps=h5_config.QPS_LIMIT,
+            checkpoint_dir=h5_config.CHECKPOINT_DIR,
+            parse_cache_dir=h5_config.PARSE_CACHE_DIR,
+            opinion_workers=h5_config.OPINION_WORKERS,
+            opinion_timeout=h5_config.OPINION_TIMEOUT_SEC,
+            prefilter=h5_config.PREFILTER_ENABLED,
+            prefilter_rules=h5_config.PREFILTER_RULES_FILE,
+            dedup=h5_config.DEDUP_ENABLED,
+            stream=h5_config.STREAM_OUTPUT,
+            temperature=h5_config.TEMPERATURE,
+            max_tokens=h5_config.MAX_TOKENS,
+            timeout=h5_config.TIMEOUT_SEC,
+            retries=h5_config.RETRIES,
+            batch_size=h5_config.BATCH_SIZE,
+            batch_tokens=h5_config.BATCH_TOKENS,
+        )
+        kwargs.update(overrides)
+        return cls(**kwargs)
+    
+    def _call_model(self, model: str, system_prompt: str, user_prompt: str, stage: str = "") -> str:
+        """统一的模型调用入口（子类可覆盖，例如接入别的网关或做离线回放）"""
+        return self._model_caller(model, system_prompt, user_prompt, stage)
+    
+    def _process_batch(self, b: int, batch_lines: List[str]) -> Optional[tuple]:
+        """单批次：模型#1 筛选 → 模型#2 话题簇划分（见 core.pipeline.process_batch）"""
+        from core.pipeline import process_batch
         
-        # 加载提示词（与 top5_Q2.ipynb 一致）
-        self.system_prompt01 = load_system_prompt(self.prompt_dir / "提示词1.md")
-        self.system_prompt02 = load_system_prompt(self.prompt_dir / "2话题分类.md")
-        self.system_prompt03 = load_system_prompt(self.prompt_dir / "3日聚合.md")
-        self.system_prompt04 = load_system_prompt(self.prompt_dir / "2话题分类和总结.md")
+        cfg = self.config
+        return process_batch(b, batch_lines, self._call_model, cfg.prompts, cfg.filter_model, cfg.main_model)
     
     def analyze(
         self,
@@ -103,8 +160,11 @@ class PlayerCommunityAnalyzer:
         speaker_map: Dict[str, str],
         start_time: str,
         end_time: str,
-        batch_size: int = 300,
+        batch_size: Optional[int] = None,
+        batch_tokens: Optional[int] = None,
         progress_callback: Optional[callable] = None,
+        run_id: Optional[str] = None,
+        resume: bool = False,
     ) -> Dict[str, Any]:
         """
         执行完整的分析流程（与 top5_Q2.ipynb 主循环对应）
@@ -115,228 +175,37 @@ class PlayerCommunityAnalyzer:
             speaker_map: 研发人员 ID 映射字典
             start_time: 开始时间，格式：YYYY-MM-DD HH:MM:SS
             end_time: 结束时间，格式：YYYY-MM-DD HH:MM:SS
-            batch_size: 每批处理的消息数量（默认300，与 top5_Q2.ipynb 一致）
+            batch_size: 单批行数上限；None 用构造时的 batch_size（默认不限，只按 token 预算切）
+            batch_tokens: 单批估算 token 预算；None 用构造时的 batch_tokens。按对话间隙切批，模型#1 原样输出也不会超过 max_tokens
             progress_callback: 进度回调函数，接收 (current, total, message) 参数
+            run_id: 检查点 ID；不传则由 txt 文件指纹 + 时间范围 + 切批参数生成
+            resume: True 时跳过该 run_id 下已完成的阶段和批次；False 时清空旧检查点重新跑
         
         Returns:
             分析结果字典
         """
-        results = {
-            "status": "processing",
-            "date": start_time.split(" ")[0] if " " in start_time else start_time[:10],
-            "time_range": f"{start_time} ~ {end_time}",
-            "total_messages": 0,
-            "filtered_messages": 0,
-            "top5_clusters": [],
-            "error": None,
-        }
+        from dataclasses import replace
+        from core.checkpoint_store import CheckpointStore
+        from core.pipeline import run_pipeline
         
-        def update_progress(step: int, total: int, message: str):
-            if progress_callback:
-                progress_callback(step, total, message)
+        cfg = replace(
+            self.config,
+            batch_size=self.config.batch_size if batch_size is None else batch_size,
+            batch_tokens=self.config.batch_tokens if batch_tokens is None else batch_tokens,
+        )
+        results: Dict[str, Any] = {"error": None}
+        
+        if self.checkpoint_dir is not None:
+            run_id = run_id or cfg.run_id_for(txt_path, start_time, end_time)
+            results["run_id"] = run_id
+        ckpt = CheckpointStore(self.checkpoint_dir, run_id, resume=resume)
         
         try:
-            # ==================== Step 1: 数据预处理 ====================
-            # 对应 top5_Q2.ipynb 的数据处理部分
-            update_progress(1, 6, "正在加载聊天记录...")
-            
-            jsonl_lines01 = build_jsonl_for_range(
-                pathtxt=txt_path,
-                mapping_file=mapping_file,
-                speaker_map=speaker_map,
-                start_time=start_time,
-                end_time=end_time,
-                return_str=False,
-            )
-            
-            results["total_messages"] = len(jsonl_lines01)
-            
-            if len(jsonl_lines01) == 0:
-                results["status"] = "no_data"
-                results["error"] = "指定时间范围内没有聊天记录"
-                return results
-            
-            # ==================== Step 2: 模型#1 + 模型#2 批处理 ====================
-            # 对应 top5_Q2.ipynb 的 "加讨论观点分析的版本测试" 部分
-            update_progress(2, 6, "正在进行话题簇分析...")
-            
-            batch_cluster_outputs = []
-            total_batches = (len(jsonl_lines01) + batch_size - 1) // batch_size
-            written_total = 0
-            
-            for b in range(total_batches):
-                start_idx = b * batch_size
-                end_idx = min(start_idx + batch_size, len(jsonl_lines01))
-                batch_lines = jsonl_lines01[start_idx:end_idx]
-                
-                try:
-                    # --- 模型 #1：筛选游戏相关发言 ---
-                    user_prompt1 = build_user_prompt_filter(batch_lines)
-                    output_filter = call_ark_chat_completions(
-                        api_url=self.api_url,
-                        api_key=self.api_key,
-                        model=self.v3_model_id,
-                        system_prompt=self.system_prompt01,
-                        user_prompt=user_prompt1,
-                        temperature=self.temperature,
-                        max_tokens=self.max_tokens,
-                        timeout=self.timeout,
-                        retries=self.retries,
-                    )
-                    
-                    if not output_filter:
-                        continue
-                    
-                    filter_count = sum(1 for line in output_filter.splitlines() if line.strip())
-                    written_total += filter_count
-                    
-                    # --- 模型 #2：话题簇划分 ---
-                    user_prompt2 = build_user_prompt_clsuter(output_filter)
-                    output_cluster = call_ark_chat_completions(
-                        api_url=self.api_url,
-                        api_key=self.api_key,
-                        model=self.v3_1_model_id,
-                        system_prompt=self.system_prompt02,
-                        user_prompt=user_prompt2,
-                        temperature=self.temperature,
-                        max_tokens=self.max_tokens,
-                        timeout=self.timeout,
-                        retries=self.retries,
-                    )
-                    
-                    if not output_cluster:
-                        continue
-                    
-                    # 解析并添加 _cluster_id
-                    cluster_json_list = parse_model2_output_to_json_list(
-                        output_cluster,
-                        batch_idx=b + 1,
-                    )
-                    
-                    if not cluster_json_list:
-                        continue
-                    
-                    # 推断日期并分配全局ID
-                    date_str = infer_date_for_batch(cluster_json_list, batch_lines)
-                    batch_id = f"B{b + 1}"
-                    cluster_json_list = assign_global_cluster_ids(
-                        cluster_json_list, date_str, batch_id
-                    )
-                    
-                    # 转成 JSONL 文本
-                    output_cluster_with_ids = "\n".join(
-                        json.dumps(c, ensure_ascii=False) for c in cluster_json_list
-                    )
-                    batch_cluster_outputs.append(output_cluster_with_ids)
-                    
-                except Exception as e:
-                    print(f"[批次 {b + 1}] 出错: {e}")
-                    continue
-                
-                time.sleep(self.sleep_between)
-            
-            results["filtered_messages"] = written_total
-            
-            # ==================== Step 3: 模型#3 日话题簇聚合 ====================
-            update_progress(3, 6, "正在聚合话题簇...")
-            
-            all_cluster = aggregate_cluster_outputs(batch_cluster_outputs)
-            
-            user_prompt3 = build_user_prompt_cluster_agg(all_cluster)
-            output_cluster_agg = call_ark_chat_completions(
-                api_url=self.api_url,
-                api_key=self.api_key,
-                model=self.v3_1_model_id,
-                system_prompt=self.system_prompt03,
-                user_prompt=user_prompt3,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                timeout=self.timeout,
-                retries=self.retries,
+            run_pipeline(
+                cfg, txt_path, mapping_file, speaker_map, start_time, end_time,
+                ckpt=ckpt, progress=progress_callback, call_model=self._call_model,
+                result=results,
             )
-            
-            # 解析聚合结果
-            parsed_clusters = parse_jsonl_text_safe(output_cluster_agg, label="模型#3聚合输出")
-            parsed_subclusters = parse_jsonl_text(all_cluster)
-            
-            # 修复时间轴和子话题簇列表字段
-            for c in parsed_clusters:
-                ensure_time_axis_key(c, verbose=False)
-                ensure_subcluster_list_key(c)
-            
-            # ==================== Step 4: 计算热度 Top5 ====================
-            update_progress(4, 6, "正在计算热度排名...")
-            
-            top5_results = extract_top5_heat_clusters(
-                parsed_clusters, jsonl_lines01, top_k=5
-            )
-            final_result = attach_discussion_points(top5_results, parsed_subclusters)
-            
-            # ==================== Step 5: 模型#4 玩家观点分析 ====================
-            update_progress(5, 6, "正在分析玩家观点...")
-            
-            # 获取讨论点和时间轴的映射
-            rows = print_mech_time_from_top5(final_result, all_cluster)
-            
-            all_opinions = []
-            for idx, r in enumerate(rows, start=1):
-                mech = r.get("核心对象/机制") or ""
-                full_time = (r.get("发言时间") or "").strip()
-                
-                if not mech or not full_time:
-                    continue
-                
-                if " " not in full_time:
-                    continue
-                
-                fayan_date, fayan_time = full_time.split(" ", 1)
-                
-                # 获取该时间段的原始发言
-                dialogs_lines = get_dialogs_lines_by_fayan_time_debug(
-                    jsonl_lines01,
-                    fayan_date,
-                    fayan_time,
-                    debug=False,
-                )
-                
-                if not dialogs_lines:
-                    continue
-                
-                # 调用模型#4 分析玩家观点
-                user_prompt4 = build_user_prompt_subcluster_opinion(
-                    discussion_point=mech,
-                    json_lines=dialogs_lines,
-                )
-                
-                try:
-                    opinion_output = call_ark_chat_completions(
-                        api_url=self.api_url,
-                        api_key=self.api_key,
-                        model=self.v3_1_model_id,
-                        system_prompt=self.system_prompt04,
-                        user_prompt=user_prompt4,
-                        temperature=self.temperature,
-                        max_tokens=self.max_tokens,
-                        timeout=self.timeout,
-                        retries=self.retries,
-                    )
-                    
-                    opinions_this_mech = parse_opinion_output_to_list(opinion_output)
-                    all_opinions.extend(opinions_this_mech)
-                    
-                except Exception as e:
-                    print(f"模型#4 调用出错: {e}")
-                    continue
-            
-            # ==================== Step 6: 合并结果 ====================
-            update_progress(6, 6, "正在生成最终报告...")
-            
-            # 合并观点到 Top5
-            merged_top5 = merge_top5_with_opinions_numbered(final_result, all_opinions)
-            
-            results["top5_clusters"] = merged_top5
-            results["status"] = "success"
-            
         except Exception as e:
             import traceback
             results["status"] = "error"
@@ -347,43 +216,58 @@ class PlayerCommunityAnalyzer:
 
 
 # ==================== 导出列表 ====================
-__all__ = [
-    # 源代码导入的函数（供直接使用）
-    'load_and_process',
-    'build_jsonl_for_range',
-    'save_jsonl',
-    'load_system_prompt',
-    'build_user_prompt_filter',
-    'build_user_prompt_clsuter',
-    'build_user_prompt_cluster_agg',
-    'build_user_prompt_subcluster_opinion',
-    'call_ark_chat_completions',
-    'extract_valid_json_lines',
-    'add_index_to_jsonl_lines',
-    'count_output_filter_stats',
-    'get_covered_indices_from_cluster_output',
-    'aggregate_cluster_outputs',
-    'assign_global_cluster_ids',
-    'infer_date_for_batch',
-    'parse_model2_output_to_json_list',
-    'parse_jsonl_text',
-    'extract_top5_heat_clusters',
-    'attach_discussion_points',
-    'extract_cluster_stats',
-    'print_mech_time_from_top5',
-    'get_dialogs_lines_by_fayan_time_debug',
-    'merge_top5_with_opinions_numbered',
-    'parse_opinion_output_to_list',
-    'ensure_time_axis_key',
-    'ensure_subcluster_list_key',
-    'match_dialogs_by_time',
-    'append_daily_top5_to_version_jsonl',
-    
-    # H5包装专用
-    'PlayerCommunityAnalyzer',
-    
-    # 常量
-    'PROJECT_ROOT',
-    'SOURCE_DIR',
-    '_SOURCE_LOADED',
-]
+# 原 notebook 的函数 / 流水线类型：名字 → core 子模块，第一次访问时才导入（PEP 562）
+_LAZY_EXPORTS: Dict[str, str] = {
+    'load_and_process': 'core.data_processing',
+    'build_jsonl_for_range': 'core.data_processing',
+    'build_records_for_range': 'core.data_processing',
+    'save_jsonl': 'core.data_processing',
+    **{name: 'core.model_classify' for name in (
+        'load_system_prompt',
+        'build_user_prompt_filter',
+        'build_user_prompt_clsuter',
+        'build_user_prompt_cluster_agg',
+        'build_user_prompt_subcluster_opinion',
+        'call_ark_chat_completions',
+        'acall_ark_chat_completions',
+        'extract_valid_json_lines',
+        'add_index_to_jsonl_lines',
+        'count_output_filter_stats',
+        'get_covered_indices_from_cluster_output',
+        'aggregate_cluster_outputs',
+        'assign_global_cluster_ids',
+        'infer_date_for_batch',
+        'parse_model2_output_to_json_list',
+        'parse_jsonl_text',
+        'extract_top5_heat_clusters',
+        'attach_discussion_points_day',
+        'extract_cluster_stats',
+        'print_mech_time_from_top5',
+        'get_dialogs_lines_by_fayan_time_debug',
+        'merge_top5_with_opinions_numbered',
+        'parse_opinion_output_to_list',
+        'ensure_time_axis_key',
+        'ensure_subcluster_list_key',
+        'match_dialogs_by_time',
+        'append_daily_top5_to_version_jsonl',
+    )},
+    'PipelineConfig': 'core.pipeline',
+    'Prompts': 'core.pipeline',
+    'run_pipeline': 'core.pipeline',
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+__all__ = ['PlayerCommunityAnalyzer', *_LAZY_EXPORTS]
@@ -506,6 +506,15 @@ def main():
                 if selected_date not in available_dates:
                     st.warning(f"⚠️ {selected_date} 暂无数据，已自动选择最新日期")
                     selected_date = available_dates[0]
+
+                # 索引里带每日 summary，预览当天概况不用先加载日结果文件
+                day_summary = index.get("days", {}).get(selected_date)
+                if day_summary:
+                    st.caption(
+                        f"🔥 {day_summary.get('top_cluster', '')} · "
+                        f"{day_summary.get('total_clusters', 0)} 个话题簇 · "
+                        f"{day_summary.get('total_messages', 0)} 条发言"
+                    )
             else:
                 selected_date = None
         else:
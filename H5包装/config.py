@@ -16,8 +16,16 @@ V3_1_MODEL_ID = "ep-20251020160025-9p5tj"
 R1_MODEL_ID = "ep-20251020160103-5n6g2"
 
 # ============= 处理参数（与 top5_Q1.ipynb 保持一致）=============
-BATCH_SIZE = 300
-SLEEP_BETWEEN = 1   # 每批之间的间隔，防止QPS触发限流
+BATCH_SIZE = None           # 单批行数上限（None 不限，只按 token 预算切）
+BATCH_TOKENS = 15000        # 单批估算 token 预算（略低于 MAX_TOKENS，模型#1 原样输出不会被截断）
+PREFILTER_ENABLED = True    # 模型#1 之前本地去掉纯表情/链接/@/停用语/短回复
+PREFILTER_RULES_FILE = None # 预过滤规则 JSON（None 用默认规则，见源代码目录 prefilter.py）
+DEDUP_ENABLED = True        # 近似重复发言（刷屏/复读）只送一条代表，热度仍按全部发言统计
+STREAM_OUTPUT = False       # 模型输出走 SSE 流式（可选）：读超时代替总超时，断流时保留已完成的对象（不落检查点）
+MAX_WORKERS = 4     # 模型#1/#2 批处理并发数（<=1 为串行）
+QPS_LIMIT = 2.0     # 令牌桶限流：全局每秒最多请求数，替代每批之间固定 sleep
+OPINION_WORKERS = 4         # 模型#4 观点分析并发数（每个讨论点一次调用）
+OPINION_TIMEOUT_SEC = 600   # 模型#4 单次调用墙钟超时，超时的讨论点记为缺失，不拖累其他讨论点
 TEMPERATURE = 0.20
 MAX_TOKENS = 16384
 TIMEOUT_SEC = 600
@@ -39,6 +47,8 @@ BASE_DIR = Path(__file__).parent
 PROMPT_DIR = BASE_DIR / "prompts"
 DATA_DIR = BASE_DIR / "data"
 OUTPUT_DIR = BASE_DIR / "output"
+CHECKPOINT_DIR = OUTPUT_DIR / "checkpoints"   # 分析检查点（断点续跑）
+PARSE_CACHE_DIR = OUTPUT_DIR / "parse_cache"  # 聊天记录解析缓存（按日期分区，增量追加）
 
 # 确保目录存在
 PROMPT_DIR.mkdir(exist_ok=True)
@@ -1,37 +1,107 @@
 """
 玩家社群分析核心模块
-此模块作为共享代码库，供 H5包装 和 Jupyter Notebook 共同引用
+此模块作为共享代码库，供 H5包装、预计算方案、自动化分析方案 和 Jupyter Notebook 共同引用
+（仓库根目录 pip install -e . 后即可 import core，无需再改 sys.path）
+
+- core.pipeline：单日流水线的各阶段函数 + run_pipeline（按 core.dag 的 DAG 执行）
+- core.data_processing / core.model_classify：原 notebook 里的函数（旧目录下的同名文件只是转发到这里）
+- 其余子模块：Ark 客户端、响应缓存、检查点、预过滤、近似去重、切批、话题簇白名单等
+- 下面导出的名字都是按需加载（PEP 562）：import core 本身不加载 pandas / numpy / requests，
+  第一次访问某个名字时才导入它所在的子模块；启动开销见 python -m core.bench_import
 """
+from __future__ import annotations
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
 
-from .data_processing import (
-    load_and_process,
-    build_jsonl_for_range,
-    save_jsonl,
-)
-
-from .model_classify import (
-    load_system_prompt,
-    build_user_prompt_clsuter,
-    build_user_prompt_cluster_agg,
-    build_user_prompt_subcluster_opinion,
-    call_ark_chat_completions,
-    parse_cluster_response,
-    build_daily_top5_opinion_records,
-    PlayerCommunityAnalyzer,
-)
-
-__all__ = [
+# 导出名 → 所在子模块
+_EXPORTS: Dict[str, str] = {
     # 数据处理
-    'load_and_process',
-    'build_jsonl_for_range',
-    'save_jsonl',
+    'load_and_process': 'data_processing',
+    'build_jsonl_for_range': 'data_processing',
+    'build_records_for_range': 'data_processing',
+    'build_jsonl_by_day': 'data_processing',
+    'save_jsonl': 'data_processing',
     # 模型调用
-    'load_system_prompt',
-    'build_user_prompt_clsuter',
-    'build_user_prompt_cluster_agg',
-    'build_user_prompt_subcluster_opinion',
-    'call_ark_chat_completions',
-    'parse_cluster_response',
-    'build_daily_top5_opinion_records',
-    'PlayerCommunityAnalyzer',
-]
+    'load_system_prompt': 'model_classify',
+    'build_user_prompt_filter': 'model_classify',
+    'build_user_prompt_clsuter': 'model_classify',
+    'build_user_prompt_cluster_agg': 'model_classify',
+    'build_user_prompt_subcluster_opinion': 'model_classify',
+    'call_ark_chat_completions': 'model_classify',
+    # 共用数据结构
+    'MessageStore': 'message_store',
+    'CheckpointStore': 'checkpoint_store',
+    'make_run_id': 'checkpoint_store',
+    'PartialResult': 'checkpoint_store',
+    # 流水线
+    'Prompts': 'pipeline',
+    'PipelineConfig': 'pipeline',
+    'AggregateResult': 'pipeline',
+    'make_model_caller': 'pipeline',
+    'parse_messages': 'pipeline',
+    'select_for_model': 'pipeline',
+    'process_batch': 'pipeline',
+    'cluster_batches': 'pipeline',
+    'aggregate_clusters': 'pipeline',
+    'compute_heat': 'pipeline',
+    'analyze_opinions': 'pipeline',
+    'build_report': 'pipeline',
+    'run_pipeline': 'pipeline',
+    'build_pipeline_dag': 'pipeline',
+    # DAG 执行器
+    'Dag': 'dag',
+    'Node': 'dag',
+    'DagError': 'dag',
+    # 话题簇白名单
+    'WhitelistStore': 'topic_whitelist',
+    'clusters_in_output': 'topic_whitelist',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 之后的访问不再走 __getattr__
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+if TYPE_CHECKING:
+    from .data_processing import (
+        load_and_process, build_jsonl_for_range, build_records_for_range, build_jsonl_by_day, save_jsonl,
+    )
+    from .model_classify import (
+        load_system_prompt,
+        build_user_prompt_filter,
+        build_user_prompt_clsuter,
+        build_user_prompt_cluster_agg,
+        build_user_prompt_subcluster_opinion,
+        call_ark_chat_completions,
+    )
+    from .message_store import MessageStore
+    from .checkpoint_store import CheckpointStore, PartialResult, make_run_id
+    from .pipeline import (
+        Prompts,
+        PipelineConfig,
+        AggregateResult,
+        make_model_caller,
+        parse_messages,
+        select_for_model,
+        process_batch,
+        cluster_batches,
+        aggregate_clusters,
+        compute_heat,
+        analyze_opinions,
+        build_report,
+        run_pipeline,
+        build_pipeline_dag,
+    )
+    from .dag import Dag, Node, DagError
+    from .topic_whitelist import WhitelistStore, clusters_in_output
@@ -0,0 +1,443 @@
+"""
+Ark 模型调用客户端（四个模型阶段共用）
+- 复用 requests.Session + 连接池，避免每次调用都重新 TCP/TLS 握手
+- 指数退避 + 抖动重试；429/503 优先遵循 Retry-After
+- 记录每次调用的耗时与 token 用量（usage），可按阶段/模型汇总
+- acall 为 asyncio 版本：请求在线程池里复用同一个连接池，重试等待用 asyncio.sleep
+- 可挂 llm_cache.LLMResponseCache：输入完全相同的调用直接返回缓存结果，不再请求接口
+- stream 为 SSE 流式版本：边生成边产出文本片段；开始产出前的失败照常重试，
+  产出后断流抛 ArkStreamInterrupted（带已收到的文本）
+"""
+from __future__ import annotations
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .llm_cache import LLMResponseCache, cache_bypassed, make_cache_key
+
+# 这些状态码视为临时错误，可以重试；其余 4xx 直接失败（如 401 key 错误，重试无意义）
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class ArkAPIError(RuntimeError):
+    """Ark 接口调用失败（已用尽重试或遇到不可重试的错误）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ArkStreamInterrupted(ArkAPIError):
+    """流式输出已经产出部分内容后断开（网络错误 / 读超时 / 服务端错误事件），partial 为已收到的文本"""
+
+    def __init__(self, message: str, partial: str = "", status_code: Optional[int] = None):
+        super().__init__(message, status_code=status_code)
+        self.partial = partial
+
+
+@dataclass
+class CallMetric:
+    """单次 call 的指标（含所有重试）"""
+    stage: str
+    model: str
+    ok: bool
+    attempts: int
+    latency_s: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 只处理秒数形式；HTTP-date 形式交给指数退避"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class ArkClient:
+    """
+    线程安全的 Ark Chat Completions 客户端。
+    一个进程共用一个实例即可（见 get_default_client），api_key 按次传入。
+    cache 为 None 时不缓存；单次调用可用 use_cache=False 绕过。
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 16,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        max_metrics: int = 10000,
+        cache: Optional[LLMResponseCache] = None,
+    ):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_metrics = max_metrics
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._metrics: List[CallMetric] = []
+        self._lock = threading.Lock()
+
+    # ==================== 请求 ====================
+
+    @staticmethod
+    def _build_payload(model: str, system_prompt: str, user_prompt: str,
+                       temperature: float, max_tokens: int) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+
+    def _post_once(self, api_url: str, api_key: str, payload: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+        """发一次请求；失败时抛 ArkAPIError（带状态码 / Retry-After）"""
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+        try:
+            resp = self.session.post(api_url, headers=headers, json=payload, timeout=timeout)
+        except requests.RequestException as e:
+            # 网络错误 / 超时：可重试
+            raise ArkAPIError(f"请求异常: {e}") from e
+
+        if resp.status_code != 200:
+            raise ArkAPIError(
+                f"HTTP {resp.status_code}: {resp.text}",
+                status_code=resp.status_code,
+                retry_after=_parse_retry_after(resp.headers.get("Retry-After")),
+            )
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise ArkAPIError(f"响应不是合法 JSON: {resp.text[:200]}") from e
+
+    def _open_stream(self, api_url: str, api_key: str, payload: Dict[str, Any], timeout: int) -> requests.Response:
+        """发起 SSE 请求，只检查状态码；timeout 对流式请求是两次数据之间的读超时"""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {api_key}",
+        }
+        try:
+            resp = self.session.post(api_url, headers=headers, json=payload, timeout=timeout, stream=True)
+        except requests.RequestException as e:
+            raise ArkAPIError(f"请求异常: {e}") from e
+
+        if resp.status_code != 200:
+            try:
+                text = resp.text
+            finally:
+                resp.close()
+            raise ArkAPIError(
+                f"HTTP {resp.status_code}: {text}",
+                status_code=resp.status_code,
+                retry_after=_parse_retry_after(resp.headers.get("Retry-After")),
+            )
+        # text/event-stream 通常不带 charset，requests 会按 ISO-8859-1 解码
+        resp.encoding = "utf-8"
+        return resp
+
+    @staticmethod
+    def _iter_sse_events(resp: requests.Response) -> Iterator[Dict[str, Any]]:
+        """逐个产出 SSE 的 data JSON；遇到 [DONE] 结束"""
+        for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or line.startswith(":"):
+                continue
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and event.get("error"):
+                raise ArkAPIError(f"流式响应错误: {event['error']}")
+            yield event
+
+    def _should_retry(self, err: ArkAPIError) -> bool:
+        return err.status_code is None or err.status_code in RETRYABLE_STATUS
+
+    def _backoff_delay(self, attempt: int, err: ArkAPIError) -> float:
+        """attempt 从 0 开始；有 Retry-After 时以它为准，否则指数退避 + 抖动"""
+        if err.retry_after is not None:
+            return min(self.backoff_max, err.retry_after)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    @staticmethod
+    def _extract_content(data: Dict[str, Any]) -> str:
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ArkAPIError(f"响应缺少 choices[0].message.content: {str(data)[:200]}") from e
+
+    def call(
+        self,
+        api_url: str,
+        api_key: str,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 32700,
+        timeout: int = 600,
+        retries: int = 2,
+        stage: str = "",
+        use_cache: bool = True,
+    ) -> str:
+        cache_key = self._cache_key(use_cache, model, system_prompt, user_prompt, temperature, max_tokens)
+        cached = self._cache_get(cache_key, stage, model)
+        if cached is not None:
+            return cached
+
+        payload = self._build_payload(model, system_prompt, user_prompt, temperature, max_tokens)
+        t0 = time.perf_counter()
+        last_err: Optional[ArkAPIError] = None
+
+        for attempt in range(retries + 1):
+            try:
+                data = self._post_once(api_url, api_key, payload, timeout)
+                content = self._extract_content(data)
+            except ArkAPIError as e:
+                last_err = e
+                if attempt >= retries or not self._should_retry(e):
+                    break
+                time.sleep(self._backoff_delay(attempt, e))
+                continue
+            self._record(stage, model, True, attempt + 1, time.perf_counter() - t0, data)
+            if cache_key and content:
+                self.cache.put(cache_key, model, content)
+            return content
+
+        self._record(stage, model, False, attempt + 1, time.perf_counter() - t0, None, last_err)
+        raise ArkAPIError(f"Ark API 调用失败: {last_err}", status_code=getattr(last_err, "status_code", None))
+
+    async def acall(
+        self,
+        api_url: str,
+        api_key: str,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 32700,
+        timeout: int = 600,
+        retries: int = 2,
+        stage: str = "",
+        use_cache: bool = True,
+    ) -> str:
+        """call 的 asyncio 版本：同一个连接池，重试等待不阻塞事件循环"""
+        cache_key = self._cache_key(use_cache, model, system_prompt, user_prompt, temperature, max_tokens)
+        cached = self._cache_get(cache_key, stage, model)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        payload = self._build_payload(model, system_prompt, user_prompt, temperature, max_tokens)
+        t0 = time.perf_counter()
+        last_err: Optional[ArkAPIError] = None
+
+        for attempt in range(retries + 1):
+            try:
+                data = await loop.run_in_executor(None, self._post_once, api_url, api_key, payload, timeout)
+                content = self._extract_content(data)
+            except ArkAPIError as e:
+                last_err = e
+                if attempt >= retries or not self._should_retry(e):
+                    break
+                await asyncio.sleep(self._backoff_delay(attempt, e))
+                continue
+            self._record(stage, model, True, attempt + 1, time.perf_counter() - t0, data)
+            if cache_key and content:
+                self.cache.put(cache_key, model, content)
+            return content
+
+        self._record(stage, model, False, attempt + 1, time.perf_counter() - t0, None, last_err)
+        raise ArkAPIError(f"Ark API 调用失败: {last_err}", status_code=getattr(last_err, "status_code", None))
+
+    def stream(
+        self,
+        api_url: str,
+        api_key: str,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 32700,
+        timeout: int = 600,
+        retries: int = 2,
+        stage: str = "",
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """
+        流式调用：逐段产出 choices[0].delta.content。
+        - 缓存命中时一次性产出缓存内容；正常结束后整段写缓存，和 call 共用同一份缓存
+        - 第一段产出之前的错误按 call 的规则重试；之后断流抛 ArkStreamInterrupted（不写缓存）
+        """
+        cache_key = self._cache_key(use_cache, model, system_prompt, user_prompt, temperature, max_tokens)
+        cached = self._cache_get(cache_key, stage, model)
+        if cached is not None:
+            yield cached
+            return
+
+        payload = self._build_payload(model, system_prompt, user_prompt, temperature, max_tokens)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        t0 = time.perf_counter()
+        last_err: Optional[ArkAPIError] = None
+
+        for attempt in range(retries + 1):
+            parts: List[str] = []
+            usage: Optional[Dict[str, Any]] = None
+            try:
+                resp = self._open_stream(api_url, api_key, payload, timeout)
+                try:
+                    for event in self._iter_sse_events(resp):
+                        if event.get("usage"):
+                            usage = event["usage"]
+                        for choice in event.get("choices") or []:
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                except requests.RequestException as e:
+                    raise ArkAPIError(f"流式读取异常: {e}") from e
+                finally:
+                    resp.close()
+            except ArkAPIError as e:
+                last_err = e
+                if parts:
+                    # 已经交给调用方的内容收不回来，不能透明重试
+                    self._record(stage, model, False, attempt + 1, time.perf_counter() - t0, None, e)
+                    raise ArkStreamInterrupted(
+                        f"Ark 流式输出中断: {e}", partial="".join(parts), status_code=e.status_code,
+                    ) from e
+                if attempt >= retries or not self._should_retry(e):
+                    break
+                time.sleep(self._backoff_delay(attempt, e))
+                continue
+
+            content = "".join(parts)
+            self._record(stage, model, True, attempt + 1, time.perf_counter() - t0, {"usage": usage or {}})
+            if cache_key and content:
+                self.cache.put(cache_key, model, content)
+            return
+
+        self._record(stage, model, False, attempt + 1, time.perf_counter() - t0, None, last_err)
+        raise ArkAPIError(f"Ark API 调用失败: {last_err}", status_code=getattr(last_err, "status_code", None))
+
+    # ==================== 缓存 ====================
+
+    def _cache_key(self, use_cache: bool, model: str, system_prompt: str, user_prompt: str,
+                   temperature: float, max_tokens: int) -> Optional[str]:
+        """不启用缓存时返回 None"""
+        if self.cache is None or not use_cache or cache_bypassed():
+            return None
+        return make_cache_key(model, system_prompt, user_prompt,
+                              temperature=temperature, max_tokens=max_tokens)
+
+    def _cache_get(self, cache_key: Optional[str], stage: str, model: str) -> Optional[str]:
+        if not cache_key:
+            return None
+        t0 = time.perf_counter()
+        content = self.cache.get(cache_key)
+        if content is not None:
+            self._record(stage, model, True, 0, time.perf_counter() - t0, None, cached=True)
+        return content
+
+    # ==================== 指标 ====================
+
+    def _record(self, stage: str, model: str, ok: bool, attempts: int, latency: float,
+                data: Optional[Dict[str, Any]], err: Optional[ArkAPIError] = None,
+                cached: bool = False) -> None:
+        usage = (data or {}).get("usage") or {}
+        metric = CallMetric(
+            stage=stage,
+            model=model,
+            ok=ok,
+            attempts=attempts,
+            latency_s=round(latency, 3),
+            prompt_tokens=int(usage.get("prompt_tokens") or 0),
+            completion_tokens=int(usage.get("completion_tokens") or 0),
+            total_tokens=int(usage.get("total_tokens") or 0),
+            status_code=getattr(err, "status_code", None) if err else 200,
+            error=str(err) if err else None,
+            cached=cached,
+        )
+        with self._lock:
+            self._metrics.append(metric)
+            if len(self._metrics) > self.max_metrics:
+                del self._metrics[: len(self._metrics) - self.max_metrics]
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        """所有调用明细（list[dict]，便于直接写 JSON / DataFrame）"""
+        with self._lock:
+            return [asdict(m) for m in self._metrics]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按阶段（未指定阶段时按模型）汇总：次数、失败数、耗时、token 用量"""
+        agg: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "calls": 0, "failed": 0, "cache_hits": 0, "attempts": 0, "latency_s": 0.0, "max_latency_s": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+        })
+        with self._lock:
+            metrics = list(self._metrics)
+        for m in metrics:
+            a = agg[m.stage or m.model]
+            a["calls"] += 1
+            a["failed"] += 0 if m.ok else 1
+            a["cache_hits"] += 1 if m.cached else 0
+            a["attempts"] += m.attempts
+            a["latency_s"] = round(a["latency_s"] + m.latency_s, 3)
+            a["max_latency_s"] = max(a["max_latency_s"], m.latency_s)
+            a["prompt_tokens"] += m.prompt_tokens
+            a["completion_tokens"] += m.completion_tokens
+            a["total_tokens"] += m.total_tokens
+        return dict(agg)
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# 单例模式
+_default_client: Optional[ArkClient] = None
+_default_lock = threading.Lock()
+
+
+def get_default_client() -> ArkClient:
+    """获取进程内共享的 ArkClient 单例（默认挂磁盘缓存，ARK_CACHE_BYPASS=1 时不挂）"""
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                cache = None if cache_bypassed() else LLMResponseCache()
+                _default_client = ArkClient(cache=cache)
+    return _default_client
@@ -0,0 +1,125 @@
+"""
+批次并发执行器
+- TokenBucket：令牌桶限流，替代每批之间固定的 time.sleep
+- run_batches_concurrently：有界并发跑批，结果按批次下标原序返回（可选单批墙钟超时）
+"""
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+T_In = TypeVar("T_In")
+T_Out = TypeVar("T_Out")
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶：
+    - rate: 每秒补充的令牌数（即稳态 QPS 上限）
+    - capacity: 桶容量（允许的瞬时突发数），默认等于 max(1, rate)
+    - rate <= 0 表示不限流，acquire 直接返回
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """阻塞直到拿到 tokens 个令牌"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def run_batches_concurrently(
+    batches: Sequence[T_In],
+    worker: Callable[[int, T_In], T_Out],
+    max_workers: int = 4,
+    on_done: Optional[Callable[[int, Optional[T_Out], Optional[BaseException]], None]] = None,
+    timeout: Optional[float] = None,
+) -> List[Optional[T_Out]]:
+    """
+    用线程池并发执行 worker(batch_idx, batch)，batch_idx 从 0 开始。
+
+    - 返回列表与 batches 一一对应（按批次下标原序），与完成先后无关，
+      保证下游 assign_global_cluster_ids 等依赖批次顺序的逻辑结果确定
+    - 单批抛异常不会中断其他批次：该位置返回 None，异常交给 on_done 回调
+    - on_done(batch_idx, result, error) 在每批完成时调用（用于进度/日志），总在调用线程里执行
+    - timeout：单批从开始执行起的墙钟秒数上限，超时按 TimeoutError 交给 on_done（排队等线程的时间不算），
+      本函数不等它、直接返回。线程无法强杀，超时的批次仍在后台跑到底层 HTTP 超时/重试结束为止：
+      · 它的返回值被丢弃，但 worker 自己的副作用（如写检查点）照常发生——调用方要在 on_done 里
+        记下超时的下标，让 worker 返回前自行放弃（见 opinion_fanout.run_opinion_fanout）
+      · 这段时间它仍占着本次线程池的一个槽位，排在后面的批次会晚开始
+      · 线程池线程不是守护线程，解释器退出时会等它结束（最长约为 HTTP 超时 ×（重试次数 + 1））
+    - max_workers <= 1 且未设 timeout 时退化为串行执行，行为与旧版 for 循环一致
+    """
+    results: List[Optional[T_Out]] = [None] * len(batches)
+    if not batches:
+        return results
+
+    def _notify(i: int, res: Any, err: Optional[BaseException]) -> None:
+        if on_done is not None:
+            on_done(i, res, err)
+
+    if max_workers <= 1 and timeout is None:
+        for i, batch in enumerate(batches):
+            try:
+                results[i] = worker(i, batch)
+            except Exception as e:
+                _notify(i, None, e)
+                continue
+            _notify(i, results[i], None)
+        return results
+
+    started: Dict[int, float] = {}
+
+    def _run(i: int, batch: T_In) -> T_Out:
+        started[i] = time.monotonic()
+        return worker(i, batch)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {pool.submit(_run, i, batch): i for i, batch in enumerate(batches)}
+        pending = set(futures)
+        # 设了超时就定期醒来检查进行中的批次，否则一直等到有批次完成
+        poll = None if timeout is None else min(1.0, max(timeout / 10, 0.01))
+        while pending:
+            done, pending = wait(pending, timeout=poll, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    _notify(i, None, e)
+                    continue
+                _notify(i, results[i], None)
+
+            if timeout is not None:
+                now = time.monotonic()
+                for fut in list(pending):
+                    i = futures[fut]
+                    t0 = started.get(i)
+                    if t0 is not None and now - t0 > timeout:
+                        pending.discard(fut)
+                        _notify(i, None, TimeoutError(f"批次 {i + 1} 超过 {timeout:g} 秒未完成"))
+    finally:
+        # 正常结束时所有批次已完成；有超时批次时不等它们
+        pool.shutdown(wait=False)
+
+    return results
@@ -0,0 +1,181 @@
+"""
+导入开销守卫：用 python -X importtime 测 import core / import analysis_engine 的耗时
+- 每个目标在新进程里导入 --repeat 次取最小值，减去空解释器本身的启动导入
+- 同时检查导入没有副作用：不往 stdout 打印、不改 sys.path、不提前加载 pandas / numpy / requests 等重依赖
+- 任一目标超出预算或有副作用时退出码为 1，可直接挂到 CI / 发布脚本里
+
+用法：
+    python -m core.bench_import
+    python -m core.bench_import --budget-ms 80 --repeat 7 --top 15
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+HERE = Path(__file__).parent
+REPO_ROOT = HERE.parent
+
+# 导入时不应加载的重依赖（第一次真正用到时再加载）
+HEAVY_MODULES = ("pandas", "numpy", "requests", "openpyxl", "docx", "tqdm")
+
+_MARKER = "__bench_import__"
+
+
+@dataclass
+class ImportTarget:
+    label: str
+    module: str
+    cwd: Path
+    budget_ms: float
+    forbidden: Tuple[str, ...] = HEAVY_MODULES
+
+
+DEFAULT_TARGETS = [
+    ImportTarget("core", "core", REPO_ROOT, budget_ms=30.0),
+    ImportTarget("H5包装/analysis_engine", "analysis_engine", REPO_ROOT / "H5包装", budget_ms=30.0),
+]
+
+
+@dataclass
+class ImportSample:
+    total_us: int                               # 目标导入的累计耗时（已去掉解释器启动部分）
+    modules: Dict[str, Tuple[int, int]]         # 顶层导入 → (self_us, cumulative_us)
+    rows: List[Tuple[int, int, int, str]] = field(default_factory=list)  # 目标引入的全部导入（含嵌套）
+    stdout: str = ""                            # 导入期间打印到 stdout 的内容
+    path_changed: bool = False
+    loaded_heavy: List[str] = field(default_factory=list)
+
+
+# ==================== 解析 -X importtime 输出 ====================
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """返回 [(层级, self_us, cumulative_us, 模块名)]，层级 0 为顶层导入"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name_col = parts[2][1:] if parts[2].startswith(" ") else parts[2]
+        level = (len(name_col) - len(name_col.lstrip(" "))) // 2
+        rows.append((level, int(parts[0]), int(parts[1]), name_col.strip()))
+    return rows
+
+
+def _run_once(code: str, cwd: Path) -> Tuple[str, str]:
+    # PYTHONPATH 指向仓库根目录，效果等同 pip install -e .，未安装时也能测
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(cwd),
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        env={**os.environ, "PYTHONPATH": str(REPO_ROOT)},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入失败（cwd={cwd}）：\n{proc.stderr[-2000:]}")
+    return proc.stdout, proc.stderr
+
+
+def _baseline_modules(cwd: Path) -> set:
+    """空解释器 + 探测脚本本身会导入的顶层模块（从目标的耗时里扣掉）"""
+    _, stderr = _run_once("import sys, json", cwd)
+    return {name for level, _, _, name in parse_importtime(stderr) if level == 0}
+
+
+def measure(target: ImportTarget, baseline: Optional[set] = None) -> ImportSample:
+    baseline = baseline if baseline is not None else _baseline_modules(target.cwd)
+    forbidden = json.dumps(list(target.forbidden))
+    code = (
+        "import sys, json\n"
+        "_before = list(sys.path)\n"
+        f"import {target.module}\n"
+        f"print({_MARKER!r} + json.dumps({{'path_changed': sys.path != _before, "
+        f"'heavy': [m for m in {forbidden} if m in sys.modules]}}))\n"
+    )
+    stdout, stderr = _run_once(code, target.cwd)
+
+    printed, _, probe = stdout.rpartition(_MARKER)
+    info = json.loads(probe)
+    # -X importtime 先输出子模块再输出父模块：嵌套行归到其后第一个顶层行名下，只保留目标引入的部分
+    rows, pending = [], []
+    for row in parse_importtime(stderr):
+        pending.append(row)
+        if row[0] == 0:
+            if row[3] not in baseline:
+                rows.extend(pending)
+            pending = []
+    modules = {name: (self_us, cum_us) for level, self_us, cum_us, name in rows if level == 0}
+    return ImportSample(
+        total_us=sum(cum for _, cum in modules.values()),
+        modules=modules,
+        rows=rows,
+        stdout=printed,
+        path_changed=info["path_changed"],
+        loaded_heavy=info["heavy"],
+    )
+
+
+def measure_best(target: ImportTarget, repeat: int = 5) -> ImportSample:
+    """多跑几次取最快的一次（排除磁盘冷缓存、pyc 首次编译的抖动）"""
+    baseline = _baseline_modules(target.cwd)
+    samples = [measure(target, baseline) for _ in range(max(1, repeat))]
+    return min(samples, key=lambda s: s.total_us)
+
+
+# ==================== 报告 ====================
+
+def check(target: ImportTarget, sample: ImportSample) -> List[str]:
+    """返回问题列表；为空表示通过"""
+    problems = []
+    total_ms = sample.total_us / 1000
+    if total_ms > target.budget_ms:
+        problems.append(f"耗时 {total_ms:.1f}ms 超出预算 {target.budget_ms:.0f}ms")
+    if sample.stdout.strip():
+        problems.append(f"导入时打印了内容：{sample.stdout.strip()[:120]!r}")
+    if sample.path_changed:
+        problems.append("导入时修改了 sys.path")
+    if sample.loaded_heavy:
+        problems.append(f"导入时加载了重依赖：{', '.join(sample.loaded_heavy)}")
+    return problems
+
+
+def format_sample(target: ImportTarget, sample: ImportSample, top: int = 10) -> str:
+    lines = [f"📦 import {target.module}（{target.label}）: {sample.total_us / 1000:.1f}ms / 预算 {target.budget_ms:.0f}ms"]
+    ranked = sorted(sample.rows, key=lambda r: r[2], reverse=True)[:top]
+    for level, self_us, cum_us, name in ranked:
+        lines.append(f"    {cum_us / 1000:8.1f}ms  (self {self_us / 1000:6.1f}ms)  {'  ' * level}{name}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="python -X importtime 导入开销守卫")
+    ap.add_argument("--repeat", type=int, default=5, help="每个目标导入次数，取最快一次")
+    ap.add_argument("--budget-ms", type=float, default=None, help="覆盖所有目标的预算（毫秒）")
+    ap.add_argument("--top", type=int, default=10, help="列出累计耗时最高的前 N 个导入")
+    args = ap.parse_args(argv)
+
+    failed = False
+    for target in DEFAULT_TARGETS:
+        if args.budget_ms is not None:
+            target.budget_ms = args.budget_ms
+        sample = measure_best(target, repeat=args.repeat)
+        print(format_sample(target, sample, top=args.top))
+        problems = check(target, sample)
+        for p in problems:
+            print(f"  ❌ {p}")
+        if not problems:
+            print("  ✅ 通过")
+        failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+QQ 导出 txt 解析性能对比：旧版 while 循环 + 逐客服 str.contains  vs  单遍解析 + 合并正则
+- 默认跑《欢迎来到地球》测试1群 / 测试2群 两份样本
+- 同时校验两者输出一致（旧版 speaker_id 回退 bug 除外，见 _assert_same）
+
+用法：
+    python -m core.bench_parse
+    python -m core.bench_parse --txt a.txt b.txt --mapping mapping地球1.xlsx --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import re
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .data_processing import load_and_process
+
+HERE = Path(__file__).parent
+SAMPLE_DIR = HERE.parent / "玩家发言分类（供研发侧）"
+SOURCE_DIR = HERE.parent / "玩家发言整理（供运营侧）" / "玩家发言总结_版本总结V2-Copy1.0(单日）"
+DEFAULT_TXTS = [
+    SAMPLE_DIR / "《欢迎来到地球》测试1群.txt",
+    SAMPLE_DIR / "《欢迎来到地球》测试2群.txt",
+]
+DEFAULT_MAPPING = SOURCE_DIR / "mapping地球1.xlsx"
+
+
+# ==================== 旧版实现（基线，勿改） ====================
+
+def legacy_load_and_process(filepath: str, MAPPING_FILE, speaker_map) -> pd.DataFrame:
+    df_nick = pd.read_excel(MAPPING_FILE, sheet_name="昵称映射")
+    df_nick["真实客服"] = df_nick["真实客服"].astype(str).str.strip()
+    df_nick["昵称"]    = df_nick["昵称"].astype(str).str.strip()
+    nickname_to_real = (
+        df_nick
+        .groupby("真实客服", sort=False)["昵称"]
+        .apply(list)
+        .to_dict()
+    )
+
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        raw = f.read().splitlines()
+    recs, cur_grp, cur_obj = [], None, None
+    pat = re.compile(r"(\d{4}-\d{2}-\d{2} \d{1,2}:\d{2}:\d{2})\s+(.+)")
+    i = 0
+    while i < len(raw):
+        line = raw[i].strip()
+        if line.startswith("消息分组:"):
+            cur_grp = line.split(":", 1)[1].strip(); i += 1; continue
+        if line.startswith("消息对象:"):
+            cur_obj = line.split(":", 1)[1].strip(); i += 1; continue
+        m = pat.match(line)
+        if m and cur_obj:
+            t, sender = m.groups(); i += 1
+            content = raw[i].strip() if i < len(raw) else ""
+            recs.append({
+                "消息分组": cur_grp,
+                "聊天对象/群": cur_obj,
+                "时间": t,
+                "发言人": sender,
+                "消息内容": content
+            })
+        i += 1
+    df = pd.DataFrame(recs)
+    df.drop_duplicates(inplace=True)
+    df['时间'] = pd.to_datetime(df['时间'], errors='coerce')
+    df['使用人'] = df['发言人']
+    df['真实客服'] = None
+    for real, nicks in nickname_to_real.items():
+        pat = "|".join(re.escape(x) for x in nicks + [real])
+        df.loc[df['使用人'].str.contains(pat, na=False), '真实客服'] = real
+    df['speaker_id'] = (
+        df['发言人']
+          .str.extract(r'\((\d+)\)')
+          .fillna(df['发言人'])
+    )
+    df = df[~df['speaker_id'].isin(['10000', '1000000','系统消息(1000000)'])]
+    df = df[~df['聊天对象/群'].isin(['青瓷客服打卡群'])]
+    df["研发"] = df["speaker_id"].map(speaker_map)
+    mask_empty_or_emoji = df["消息内容"].astype(str).str.strip().isin(["", "[表情]"])
+    spam_words = ["+1", "冲", "蹲", "up", "哈", "嘿", "哦"]
+    mask_spam = df["消息内容"].isin(spam_words)
+    return df[~(mask_empty_or_emoji | mask_spam)].copy()
+
+
+# ==================== 计时 ====================
+
+def _best_of(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _assert_same(old: pd.DataFrame, new: pd.DataFrame) -> None:
+    """
+    真实客服旧版是 None、新版可能是 NaN，统一成缺失后再比。
+    旧版 DataFrame.fillna(Series) 按列名对齐，发言人不带“(QQ号)”时 speaker_id
+    会被填成第一行的发言人（bug），新版按原意回退为发言人本身，这些行的 speaker_id 不比较。
+    """
+    a = old.reset_index(drop=True).astype(object)
+    b = new.reset_index(drop=True).astype(object)
+    a, b = a.where(a.notna(), None), b.where(b.notna(), None)
+    no_qq = ~a["发言人"].str.contains(r"\(\d+\)", na=False)
+    a.loc[no_qq, "speaker_id"] = b.loc[no_qq, "speaker_id"]
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QQ 导出 txt 解析性能对比")
+    parser.add_argument("--txt", nargs="+", type=Path, default=DEFAULT_TXTS, help="聊天记录 txt")
+    parser.add_argument("--mapping", type=Path, default=DEFAULT_MAPPING, help="映射表 Excel")
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    print(f"{'文件':<28}{'大小':>10}{'行数':>9}{'旧版(s)':>10}{'新版(s)':>10}{'加速':>8}")
+    for txt in args.txt:
+        if not txt.exists():
+            print(f"⚠️ 找不到样本: {txt}")
+            continue
+        t_old, df_old = _best_of(lambda: legacy_load_and_process(str(txt), str(args.mapping), {}), args.repeat)
+        t_new, df_new = _best_of(lambda: load_and_process(str(txt), str(args.mapping), {}), args.repeat)
+        _assert_same(df_old, df_new)
+        size_mb = txt.stat().st_size / 1024 / 1024
+        print(f"{txt.name:<28}{size_mb:>8.2f}MB{len(df_new):>9}{t_old:>10.3f}{t_new:>10.3f}{t_old / t_new:>7.1f}x")
+    print("✅ 新旧实现输出一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+本地预过滤 vs 模型#1：删了多少、省了多少 token、误删了多少模型#1 会保留的发言
+- 不给模型#1 判定时，只统计删除量 / token / 批次数变化，并列出各规则删得最多的发言
+- --labels：模型#1 的输出文件（保留下来的原始 JSON 行，可多个文件）
+- --call-model1：现场按未过滤的批次调用模型#1 拿判定（走 llm_cache，重复跑不重复计费）
+- 误删 = 模型#1 保留、但预过滤删掉的发言；按 (发言日期, 发言时间, 消息内容) 对齐
+
+用法：
+    python -m core.bench_prefilter --txt a.txt --start "2025-12-24 00:00:00" --end "2025-12-25 00:00:00"
+    python -m core.bench_prefilter --txt a.txt --start ... --end ... --labels model1_B*.jsonl
+    python -m core.bench_prefilter --txt a.txt --start ... --end ... --call-model1 --api-key xxx
+"""
+from __future__ import annotations
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from .data_processing import build_jsonl_for_range
+from .message_store import MessageStore
+from .prefilter import REASONS, format_report, load_prefilter_rules, message_text, prefilter_positions
+from .token_batcher import DEFAULT_BATCH_TOKENS, estimate_tokens, pack_batches
+
+HERE = Path(__file__).parent
+SAMPLE_DIR = HERE.parent / "玩家发言分类（供研发侧）"
+SOURCE_DIR = HERE.parent / "玩家发言整理（供运营侧）" / "玩家发言总结_版本总结V2-Copy1.0(单日）"
+DEFAULT_TXT = SAMPLE_DIR / "《欢迎来到地球》测试2群.txt"
+DEFAULT_MAPPING = SOURCE_DIR / "mapping地球1.xlsx"
+DEFAULT_API_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+DEFAULT_MODEL1_ID = "ep-20251020160142-5d7hp"
+
+Key = Tuple[str, str, str]
+
+
+def _key(msg: Dict) -> Key:
+    return (msg.get("发言日期") or "", msg.get("发言时间") or "", message_text(msg))
+
+
+def _keys_from_output(text: str) -> Set[Key]:
+    from .model_classify import extract_valid_json_lines
+    keys: Set[Key] = set()
+    for line in extract_valid_json_lines(text):
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            keys.add(_key(obj))
+    return keys
+
+
+def _labels_from_files(paths: List[Path]) -> Set[Key]:
+    keys: Set[Key] = set()
+    for p in paths:
+        keys |= _keys_from_output(p.read_text(encoding="utf-8"))
+    return keys
+
+
+def _labels_from_model1(store: MessageStore, args) -> Set[Key]:
+    from .model_classify import (
+        build_user_prompt_filter,
+        call_ark_chat_completions,
+        load_system_prompt,
+    )
+    system_prompt01 = load_system_prompt(SOURCE_DIR / "提示词1.md")
+    keys: Set[Key] = set()
+    batches = pack_batches(store, max_tokens=args.batch_tokens)
+    for b, batch in enumerate(batches, start=1):
+        print(f"  模型#1 批次 {b}/{len(batches)}...")
+        output = call_ark_chat_completions(
+            api_url=args.api_url,
+            api_key=args.api_key,
+            model=args.model,
+            system_prompt=system_prompt01,
+            user_prompt=build_user_prompt_filter(batch),
+            temperature=0.20,
+            max_tokens=16384,
+            stage="model1",
+        )
+        keys |= _keys_from_output(output or "")
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地预过滤 vs 模型#1")
+    parser.add_argument("--txt", type=Path, default=DEFAULT_TXT, help="聊天记录 txt")
+    parser.add_argument("--mapping", type=Path, default=DEFAULT_MAPPING, help="映射表 Excel")
+    parser.add_argument("--start", default="1970-01-01 00:00:00", help="开始时间")
+    parser.add_argument("--end", default="2100-01-01 00:00:00", help="结束时间")
+    parser.add_argument("--rules", type=Path, default=None, help="预过滤规则 JSON（不传用默认规则）")
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKENS, help="单批 token 预算")
+    parser.add_argument("--labels", nargs="+", type=Path, help="模型#1 输出文件（保留的 JSON 行）")
+    parser.add_argument("--call-model1", action="store_true", help="现场调用模型#1 获取判定")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--model", default=DEFAULT_MODEL1_ID, help="模型#1 ID")
+    parser.add_argument("--examples", type=int, default=10, help="每类列出的发言条数")
+    args = parser.parse_args()
+
+    lines = build_jsonl_for_range(
+        pathtxt=str(args.txt),
+        mapping_file=str(args.mapping),
+        speaker_map={},
+        start_time=args.start,
+        end_time=args.end,
+        return_str=False,
+    )
+    store = MessageStore.from_lines(lines)
+    if not len(store):
+        print("⚠️ 时间范围内没有发言")
+        return
+
+    rules = load_prefilter_rules(args.rules)
+    kept, report = prefilter_positions(store, rules)
+    sub = store.take(kept)
+
+    tok_all = sum(estimate_tokens(s) for s in store.lines)
+    tok_kept = sum(estimate_tokens(s) for s in sub.lines)
+    n_all = len(pack_batches(store, max_tokens=args.batch_tokens))
+    n_kept = len(pack_batches(sub, max_tokens=args.batch_tokens))
+    print(format_report(report))
+    print(f"📉 估算 token {tok_all} → {tok_kept}（-{1 - tok_kept / tok_all:.1%}），"
+          f"模型#1 批次 {n_all} → {n_kept}")
+
+    removed_by = report["removed_positions"]
+    for reason in REASONS:
+        if not removed_by[reason]:
+            continue
+        top = Counter(message_text(store.messages[p]) for p in removed_by[reason]).most_common(args.examples)
+        print(f"\n[{reason}] " + " | ".join(f"{t!r}×{n}" for t, n in top))
+
+    if args.call_model1 and not args.api_key:
+        parser.error("--call-model1 需要 --api-key")
+    if args.labels:
+        labels = _labels_from_files(args.labels)
+    elif args.call_model1:
+        labels = _labels_from_model1(store, args)
+    else:
+        return
+
+    pos_kept_by_model = {p for p, m in enumerate(store.messages) if _key(m) in labels}
+    print(f"\n🤖 模型#1 保留 {len(pos_kept_by_model)}/{len(store)} 条")
+    total_removed = 0
+    total_false = 0
+    for reason in REASONS:
+        ps = removed_by[reason]
+        if not ps:
+            continue
+        false_drops = [p for p in ps if p in pos_kept_by_model]
+        total_removed += len(ps)
+        total_false += len(false_drops)
+        print(f"  {reason:<8} 删除 {len(ps):>6}，其中模型#1 会保留 {len(false_drops):>5}（{len(false_drops) / len(ps):.1%}）")
+        if false_drops:
+            top = Counter(message_text(store.messages[p]) for p in false_drops).most_common(args.examples)
+            print("           " + " | ".join(f"{t!r}×{n}" for t, n in top))
+    agree = 1 - total_false / total_removed if total_removed else 1.0
+    recall = 1 - total_false / len(pos_kept_by_model) if pos_kept_by_model else 1.0
+    print(f"✅ 与模型#1 一致率（删掉的确实是闲聊）: {agree:.1%}；模型#1 保留的发言仍送达: {recall:.1%}")
+
+
+if __name__ == "__main__":
+    main()
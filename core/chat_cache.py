@@ -0,0 +1,312 @@
+"""
+QQ 导出 txt 解析结果的列式缓存（按日期分区，支持增量追加）
+- 每个 txt（按绝对路径）一个缓存目录，解析后的原始消息按“发言日期”分区存成 Parquet
+  （未安装 pyarrow 时退化为 pickle，行为一致）
+- 导出文件每天只在末尾追加：记录已解析到的字节偏移 + 前缀校验，下次只解析新增的尾部；
+  文件变短或前缀校验不一致（重新导出/被改写）时整份重建
+- 按时间范围查询只读覆盖到的日期分区，日常跑单日窗口的耗时与历史长度无关
+- 缓存的是未标注的原始消息（RAW_COLUMNS + seq），映射表改了也不需要重建
+- 同步 / 查询 / 清理都在 <root>/.lock 跨进程文件锁内：多个进程（run_daily 的进程池、多个 worker）
+  各自 new 一个 ParsedChatCache 指向同一目录也不会同时改写同一份缓存
+- root 默认放用户缓存目录（%LOCALAPPDATA% / $XDG_CACHE_HOME / ~/.cache）下，不写进安装目录
+
+目录结构：
+    <root>/
+    ├── .lock
+    └── <sha1(path)[:16]>/
+        ├── manifest.json
+        ├── date=2025-11-10.parquet
+        └── ...
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from .data_processing import RAW_COLUMNS, parse_qq_export
+
+try:
+    import pyarrow  # noqa: F401
+    _FORMAT = "parquet"
+except ImportError:
+    _FORMAT = "pkl"
+
+MANIFEST_VERSION = 1
+LOCK_FILE = ".lock"
+# 前缀校验只取开头和“上次偏移”前各 64KB：能发现重新导出/改写，又不用每次读全文件
+_CHECK_BYTES = 64 * 1024
+
+
+def default_cache_dir() -> Path:
+    """用户缓存目录下的 player-community/chat_cache（同 llm_cache，core 装成 site-packages 时也可写）"""
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "player-community" / "chat_cache"
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _sha256(b: bytes) -> str:
+    return hashlib.sha256(b).hexdigest()
+
+
+def _prefix_signature(f, offset: int) -> Tuple[str, str]:
+    """(开头 64KB 的哈希, offset 之前 64KB 的哈希)"""
+    f.seek(0)
+    head = f.read(min(offset, _CHECK_BYTES))
+    edge_start = max(0, offset - _CHECK_BYTES)
+    f.seek(edge_start)
+    edge = f.read(offset - edge_start)
+    return _sha256(head), _sha256(edge)
+
+
+def _atomic_replace(path: Path, write_fn) -> None:
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    os.close(fd)
+    try:
+        write_fn(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ParsedChatCache:
+    """
+    用法：
+        cache = ParsedChatCache()
+        raw = cache.load_range(txt_path, "2025-12-24 00:00:00", "2025-12-25 00:00:00")
+        df = annotate_messages(raw, load_nickname_map(mapping), speaker_map)
+
+    load_range 返回的是覆盖 [start, end) 的整日分区（调用方再按精确时间过滤），
+    行顺序与原文件一致。
+    """
+
+    def __init__(self, root: Optional[Union[str, Path]] = None, lock_timeout: float = 600.0):
+        self.root = Path(root) if root is not None else default_cache_dir()
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """本实例的线程锁 + <root>/.lock 跨进程文件锁（首次解析大文件可能要几分钟，超时给得宽）"""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / LOCK_FILE, "a+b") as f:
+                deadline = time.monotonic() + self.lock_timeout
+                while True:
+                    try:
+                        _try_lock(f)
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f"等待解析缓存锁超时（{self.lock_timeout}s）: {f.name}")
+                        time.sleep(0.05)
+                try:
+                    yield
+                finally:
+                    _unlock(f)
+
+    # ==================== 路径 / manifest ====================
+
+    def _dir_for(self, txt_path: Path) -> Path:
+        key = hashlib.sha1(str(txt_path).encode("utf-8")).hexdigest()[:16]
+        return self.root / key
+
+    @staticmethod
+    def _part_path(cache_dir: Path, date: str, fmt: str) -> Path:
+        return cache_dir / f"date={date}.{fmt}"
+
+    @staticmethod
+    def _read_manifest(cache_dir: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with (cache_dir / "manifest.json").open("r", encoding="utf-8") as f:
+                m = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if m.get("version") != MANIFEST_VERSION or m.get("format") != _FORMAT:
+            return None
+        return m
+
+    @staticmethod
+    def _write_manifest(cache_dir: Path, manifest: Dict[str, Any]) -> None:
+        def _dump(tmp: str) -> None:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+        _atomic_replace(cache_dir / "manifest.json", _dump)
+
+    # ==================== 分区读写 ====================
+
+    @staticmethod
+    def _read_part(path: Path) -> pd.DataFrame:
+        if _FORMAT == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    @staticmethod
+    def _write_part(path: Path, df: pd.DataFrame) -> None:
+        if _FORMAT == "parquet":
+            _atomic_replace(path, lambda tmp: df.to_parquet(tmp, index=False))
+        else:
+            _atomic_replace(path, lambda tmp: df.to_pickle(tmp))
+
+    def _append_rows(self, cache_dir: Path, manifest: Dict[str, Any], rows: pd.DataFrame) -> None:
+        """新解析出的行按日期合并进分区（通常只涉及最后一两天）"""
+        if rows.empty:
+            return
+        parts = manifest["partitions"]
+        for date, grp in rows.groupby(rows["时间"].str.slice(0, 10), sort=False):
+            path = self._part_path(cache_dir, date, _FORMAT)
+            if date in parts and path.exists():
+                grp = pd.concat([self._read_part(path), grp], ignore_index=True)
+            self._write_part(path, grp.reset_index(drop=True))
+            parts[date] = len(grp)
+
+    # ==================== 同步 ====================
+
+    def sync(self, txt_path: Union[str, Path]) -> Dict[str, Any]:
+        """
+        让缓存跟上 txt 当前内容，返回 manifest。
+        只解析到最后一个换行为止；末尾没换行的半行留给下次（查询时临时解析，见 load_range）。
+        """
+        with self._locked():
+            return self._sync(Path(txt_path).resolve())
+
+    def _sync(self, txt_path: Path) -> Dict[str, Any]:
+        """sync 的实现，调用方已持锁"""
+        cache_dir = self._dir_for(txt_path)
+        size = txt_path.stat().st_size
+        manifest = self._read_manifest(cache_dir)
+
+        with txt_path.open("rb") as f:
+            if manifest is not None:
+                offset = manifest["offset"]
+                if size < offset or list(_prefix_signature(f, offset)) != manifest["prefix_sig"]:
+                    print(f"♻️ [解析缓存] 文件被改写，重建: {txt_path.name}")
+                    manifest = None
+                elif size == offset:
+                    return manifest
+
+            if manifest is None:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                manifest = {
+                    "version": MANIFEST_VERSION,
+                    "format": _FORMAT,
+                    "source": str(txt_path),
+                    "offset": 0,
+                    "prefix_sig": None,
+                    "state": {},
+                    "next_seq": 0,
+                    "partitions": {},
+                }
+
+            offset = manifest["offset"]
+            f.seek(offset)
+            tail = f.read(size - offset)
+            cut = tail.rfind(b"\n") + 1
+            if cut == 0:  # 新增部分还不到一整行
+                return manifest
+
+            state = dict(manifest["state"])
+            text = tail[:cut].decode("utf-8", errors="ignore")
+            rows = parse_qq_export(text.splitlines(), state=state, final=False)
+            rows["seq"] = range(manifest["next_seq"], manifest["next_seq"] + len(rows))
+
+            self._append_rows(cache_dir, manifest, rows)
+            manifest["offset"] = offset + cut
+            manifest["prefix_sig"] = list(_prefix_signature(f, manifest["offset"]))
+            manifest["state"] = state
+            manifest["next_seq"] += len(rows)
+
+        self._write_manifest(cache_dir, manifest)
+        print(f"🗂️ [解析缓存] {txt_path.name}: 新增 {len(rows)} 条（已缓存 {manifest['offset']} 字节）")
+        return manifest
+
+    # ==================== 查询 ====================
+
+    def load_range(
+        self,
+        txt_path: Union[str, Path],
+        start_time: Any = "1970-01-01 00:00:00",
+        end_time: Any = "2100-01-01 00:00:00",
+    ) -> pd.DataFrame:
+        """
+        返回 [start_time, end_time) 覆盖到的各日期分区的原始消息（列为 RAW_COLUMNS），
+        只读命中的分区；结果按原文件顺序排列。
+        同步和读分区在同一次持锁内完成，读到一半时别的进程不会重建这份缓存。
+        """
+        txt_path = Path(txt_path).resolve()
+        cache_dir = self._dir_for(txt_path)
+
+        st = pd.to_datetime(start_time)
+        et = pd.to_datetime(end_time)
+        first_day = st.strftime("%Y-%m-%d")
+        last_day = (et - pd.Timedelta(microseconds=1)).strftime("%Y-%m-%d")
+
+        with self._locked():
+            manifest = self._sync(txt_path)
+            dates = [d for d in manifest["partitions"] if first_day <= d <= last_day]
+            frames: List[pd.DataFrame] = [
+                self._read_part(self._part_path(cache_dir, d, _FORMAT)) for d in sorted(dates)
+            ]
+
+        # 末尾未换行的半行（以及悬空的时间头）不入缓存，这里按 final=True 临时补上
+        tail = self._unterminated_tail(txt_path, manifest)
+        if not tail.empty:
+            day = tail["时间"].str.slice(0, 10)
+            frames.append(tail[(day >= first_day) & (day <= last_day)])
+
+        if not frames:
+            return pd.DataFrame(columns=RAW_COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        return df.sort_values("seq", kind="stable")[RAW_COLUMNS].reset_index(drop=True)
+
+    @staticmethod
+    def _unterminated_tail(txt_path: Path, manifest: Dict[str, Any]) -> pd.DataFrame:
+        with txt_path.open("rb") as f:
+            f.seek(manifest["offset"])
+            rest = f.read()
+        state = dict(manifest["state"])
+        if not rest and not state.get("pending"):
+            return pd.DataFrame(columns=RAW_COLUMNS + ["seq"])
+        rows = parse_qq_export(rest.decode("utf-8", errors="ignore").splitlines(), state=state, final=True)
+        rows["seq"] = range(manifest["next_seq"], manifest["next_seq"] + len(rows))
+        return rows
+
+    def clear(self, txt_path: Optional[Union[str, Path]] = None) -> None:
+        """清掉某个 txt 的缓存；不传则清空所有 txt 的缓存（锁文件保留）"""
+        with self._locked():
+            if txt_path:
+                shutil.rmtree(self._dir_for(Path(txt_path).resolve()), ignore_errors=True)
+                return
+            for child in self.root.iterdir():
+                if child.is_dir():
+                    shutil.rmtree(child, ignore_errors=True)
@@ -0,0 +1,197 @@
+"""
+分阶段检查点（断点续跑）
+- 每个 run_id 一个目录，每个阶段一个 JSON 文件；模型#1/#2 的批处理按批次单独落盘
+- 写入走临时文件 + os.replace，进程中途崩溃不会留下半截文件
+- resume=True 时已完成的阶段/批次直接读盘跳过；resume=False 时先清空该 run 的旧检查点
+- 不完整的结果（如流式输出中断、只抢救出一部分对象）由阶段函数抛 PartialResult 交回：
+  值照常返回给调用方但不落盘；本次运行之后的阶段、其他阶段的批次也不再落盘（它们依赖这份不完整的结果），
+  同一阶段的其他批次互不依赖，照常落盘；续跑时只重新执行没落盘的部分
+
+目录结构：
+    <root>/<run_id>/
+    ├── meta.json
+    ├── step1_jsonl.json
+    ├── step2_batches/B0001.json ...
+    ├── step3_agg.json
+    ├── step4_top5.json
+    └── step5_opinions.json
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+_MISSING = object()
+
+
+class PartialResult(Exception):
+    """阶段/批次函数只拿到了不完整的结果：value 照常返回给调用方，但不写检查点"""
+
+    def __init__(self, value: Any, reason: str = ""):
+        super().__init__(reason or "不完整的结果")
+        self.value = value
+
+
+def is_partial(value: Any) -> bool:
+    """值是否被标记为不完整（如 model_classify.PartialOutput）"""
+    return getattr(value, "partial", False) is True
+
+
+def make_run_id(txt_path: Union[str, Path], start_time: str, end_time: str, *extra: Any) -> str:
+    """
+    由输入决定的 run_id：同一个 txt（路径 + 大小 + 修改时间）+ 同一时间窗 → 同一个 run_id，
+    这样重跑时无需手动指定就能找到上次的检查点。
+    """
+    p = Path(txt_path)
+    try:
+        st = p.stat()
+        fingerprint = f"{p.resolve()}|{st.st_size}|{int(st.st_mtime)}"
+    except OSError:
+        fingerprint = str(p)
+    raw = "|".join([fingerprint, str(start_time), str(end_time), *map(str, extra)])
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+    date = str(start_time)[:10] or "run"
+    return f"{date}_{digest}"
+
+
+def _atomic_write_json(path: Path, obj: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class CheckpointStore:
+    """
+    root 或 run_id 为 None 时为“禁用”状态：所有 run_* 方法直接执行函数，不读写磁盘，
+    调用方无需到处判断是否开启了检查点。
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]],
+        run_id: Optional[str],
+        resume: bool = False,
+    ):
+        self.enabled = root is not None and bool(run_id)
+        self.run_id = run_id
+        self.resume = resume
+        self.run_dir = Path(root) / run_id if self.enabled else None
+        self._partial_from: Set[str] = set()  # 本次运行出现过不完整结果的阶段名
+        self.partial_reasons: List[str] = []  # 对应的原因（写进结果字典，供调用方判断 / 打日志）
+
+        if self.enabled:
+            if not resume and self.run_dir.exists():
+                shutil.rmtree(self.run_dir)
+            self.run_dir.mkdir(parents=True, exist_ok=True)
+            meta_path = self.run_dir / "meta.json"
+            meta = self._read(meta_path, default={})
+            meta.setdefault("run_id", run_id)
+            meta.setdefault("created_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            meta["resumed_at" if resume else "started_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            _atomic_write_json(meta_path, meta)
+
+    # ==================== 路径 ====================
+
+    def _stage_path(self, stage: str) -> Path:
+        return self.run_dir / f"{stage}.json"
+
+    def _batch_path(self, stage: str, batch_idx: int) -> Path:
+        return self.run_dir / f"{stage}_batches" / f"B{batch_idx + 1:04d}.json"
+
+    @staticmethod
+    def _read(path: Path, default: Any = _MISSING) -> Any:
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            if default is _MISSING:
+                raise
+            return default
+
+    @property
+    def partial(self) -> bool:
+        """本次运行是否出现过不完整的结果（出现后阶段检查点不再落盘）"""
+        return bool(self._partial_from)
+
+    def mark_partial(self, stage: str, reason: str) -> None:
+        """
+        没有走 PartialResult 的失败（如出错的批次、失败的讨论点）也记为不完整：
+        之后的阶段不再落盘，续跑时从没落盘的批次/阶段重新执行
+        """
+        self._partial_from.add(stage)
+        self.partial_reasons.append(f"{stage}: {reason}")
+        if self.enabled:
+            print(f"⚠️ [检查点] {stage} {reason}，之后的阶段不落盘，续跑时重新执行")
+
+    # ==================== 阶段级 ====================
+
+    def has(self, stage: str) -> bool:
+        return self.enabled and self._stage_path(stage).exists()
+
+    def load(self, stage: str) -> Any:
+        return self._read(self._stage_path(stage))
+
+    def save(self, stage: str, value: Any) -> None:
+        if self.enabled and not self.partial:
+            _atomic_write_json(self._stage_path(stage), value)
+
+    def _run_partial(self, fn: Callable[[], Any], stage: str, label: str) -> Tuple[Any, bool]:
+        """执行 fn，返回 (值, 是否不完整)；抛 PartialResult 时记下阶段名并取出其中的值"""
+        try:
+            return fn(), False
+        except PartialResult as e:
+            self._partial_from.add(stage)
+            self.partial_reasons.append(f"{label}: {e}")
+            if self.enabled:
+                print(f"⚠️ [检查点] {label} 结果不完整（{e}），不落盘，续跑时重新执行")
+            return e.value, True
+
+    def run_stage(self, stage: str, fn: Callable[[], Any]) -> Any:
+        """阶段已完成则读盘返回，否则执行 fn 并落盘（值必须可 JSON 序列化；不完整的结果不落盘）"""
+        if self.has(stage):
+            print(f"⏩ [检查点] 跳过已完成阶段: {stage}")
+            return self.load(stage)
+        value, partial = self._run_partial(fn, stage, stage)
+        if not partial:
+            self.save(stage, value)
+        return value
+
+    # ==================== 批次级 ====================
+
+    def has_batch(self, stage: str, batch_idx: int) -> bool:
+        return self.enabled and self._batch_path(stage, batch_idx).exists()
+
+    def run_batch(self, stage: str, batch_idx: int, fn: Callable[[], Any]) -> Any:
+        """
+        单批次检查点：只有 fn 正常返回才落盘（包括返回 None 的“空批次”），
+        抛异常的批次不落盘，续跑时会重新执行；抛 PartialResult 的批次返回其中的值，同样不落盘。
+        """
+        path = self._batch_path(stage, batch_idx) if self.enabled else None
+        if path is not None and path.exists():
+            return self._read(path)["value"]
+        value, partial = self._run_partial(fn, stage, f"{stage} 批次 {batch_idx + 1}")
+        if path is not None and not partial and self._partial_from <= {stage}:
+            _atomic_write_json(path, {"batch_idx": batch_idx, "value": value})
+        return value
+
+    def completed_batches(self, stage: str) -> int:
+        if not self.enabled:
+            return 0
+        d = self.run_dir / f"{stage}_batches"
+        return len(list(d.glob("B*.json"))) if d.exists() else 0
+
+    def clear(self) -> None:
+        if self.enabled and self.run_dir.exists():
+            shutil.rmtree(self.run_dir)
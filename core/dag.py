@@ -0,0 +1,114 @@
+"""
+极简 DAG 执行器：把流水线阶段声明成节点，按依赖拓扑序执行
+- 节点按名字连线：节点名就是它的输出名，inputs 是它要的上游输出名（或外部传入的参数名）
+- 构造时检查重名和成环，运行时检查缺少的外部输入，都报 DagError
+- output_type 不为空时运行时校验返回值类型，阶段函数改了返回结构能第一时间发现
+- cache=True 的节点经 CheckpointStore.run_stage 落盘（输出需可 JSON 序列化），续跑时直接读盘；
+  自己内部已经按批次/阶段落盘的节点（如 core.pipeline 的各阶段）不必再开
+- run 可以只跑到指定 targets，也可以把已算好的值当输入传进去，从中间接着跑
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .checkpoint_store import CheckpointStore
+
+
+class DagError(ValueError):
+    """DAG 定义或输入不合法"""
+
+
+@dataclass(frozen=True)
+class Node:
+    name: str                                  # 输出名，下游按这个名字取
+    fn: Callable[..., Any]                     # 按 inputs 的顺序接收位置参数
+    inputs: Tuple[str, ...] = ()
+    output_type: Optional[type] = None         # 运行时校验（可以是 tuple of types）
+    cache: bool = False                        # 输出落 CheckpointStore（阶段名 dag_<name>）
+
+
+# (节点名, 第几个, 本次要跑的节点总数)，节点开始前调用
+NodeCallback = Callable[[str, int, int], None]
+# (节点名, 输出)，节点完成后调用
+DoneCallback = Callable[[str, Any], None]
+
+
+class Dag:
+    def __init__(self, nodes: Sequence[Node]):
+        self.nodes: Dict[str, Node] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise DagError(f"节点重名: {node.name}")
+            self.nodes[node.name] = node
+        self.external_inputs: Set[str] = {
+            name for node in nodes for name in node.inputs if name not in self.nodes
+        }
+        self.order: List[str] = self._toposort()
+
+    def _toposort(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = 访问中，2 = 已完成
+
+        def visit(name: str, path: List[str]) -> None:
+            if state.get(name) == 2 or name not in self.nodes:
+                return
+            if state.get(name) == 1:
+                raise DagError(f"依赖成环: {' → '.join(path + [name])}")
+            state[name] = 1
+            for dep in self.nodes[name].inputs:
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        return order
+
+    def required(self, targets: Iterable[str], given: Iterable[str] = ()) -> List[str]:
+        """跑出 targets 需要执行的节点（拓扑序）；given 里已有的值不再重算，也不再往上追"""
+        given = set(given)
+        need: Set[str] = set()
+        stack = [t for t in targets]
+        while stack:
+            name = stack.pop()
+            if name in need or name in given:
+                continue
+            if name not in self.nodes:
+                raise DagError(f"缺少输入: {name}")
+            need.add(name)
+            stack.extend(self.nodes[name].inputs)
+        return [name for name in self.order if name in need]
+
+    def run(
+        self,
+        inputs: Dict[str, Any],
+        targets: Optional[Sequence[str]] = None,
+        ckpt: Optional[CheckpointStore] = None,
+        on_node: Optional[NodeCallback] = None,
+        on_done: Optional[DoneCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        执行到 targets（默认全部节点），返回 inputs + 所有已计算节点输出的字典。
+        inputs 里可以直接放某个节点的输出，该节点及其只为它服务的上游都会跳过。
+        """
+        ckpt = ckpt or CheckpointStore(None, None)
+        values = dict(inputs)
+        plan = self.required(targets if targets is not None else self.order, given=values)
+
+        for i, name in enumerate(plan, start=1):
+            node = self.nodes[name]
+            if on_node:
+                on_node(name, i, len(plan))
+            args = [values[dep] for dep in node.inputs]
+            if node.cache:
+                value = ckpt.run_stage(f"dag_{name}", lambda: node.fn(*args))
+            else:
+                value = node.fn(*args)
+            if node.output_type is not None and not isinstance(value, node.output_type):
+                raise DagError(
+                    f"节点 {name} 输出类型不符: 期望 {node.output_type}，实际 {type(value).__name__}"
+                )
+            values[name] = value
+            if on_done:
+                on_done(name, value)
+        return values
@@ -0,0 +1,323 @@
+from __future__ import annotations
+import re, json
+from pathlib import Path
+from typing import Dict, Iterable, List, Union, Optional
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+# ———————————————— 0. QQ 导出 txt 单遍解析 ————————————————
+RAW_COLUMNS = ["消息分组", "聊天对象/群", "时间", "发言人", "消息内容"]
+_HEADER_PAT = re.compile(r"(\d{4}-\d{2}-\d{2} \d{1,2}:\d{2}:\d{2})\s+(.+)")
+_SPEAKER_ID_PAT = re.compile(r"\((\d+)\)")
+
+
+def parse_qq_export(source: Union[str, Path, Iterable[str]],
+                    state: Optional[dict] = None,
+                    final: bool = True) -> pd.DataFrame:
+    """
+    单遍解析 QQ 导出 txt → 原始消息 DataFrame（列见 RAW_COLUMNS，时间仍为字符串）
+    - source: txt 路径，或任意可迭代的行（用于只解析文件追加的尾部）
+    - state: 续解析状态 {"cur_grp", "cur_obj", "pending"}，传入时读取并原地更新，
+             下一段接着上一段的“消息分组/消息对象”和未配内容的时间头继续解析
+    - final: False 时末尾悬空的时间头不输出，留在 state["pending"] 等下一段的内容行
+    规则与旧版 while 循环一致：时间头行的下一行为消息内容（只取一行）；
+    尚未出现“消息对象:”之前的时间头行忽略，且不吞掉下一行。
+    """
+    if isinstance(source, (str, Path)):
+        # 与旧版一致用 str.splitlines 分行（\u2028 等也视为换行）
+        with open(source, "r", encoding="utf-8", errors="ignore") as f:
+            return parse_qq_export(f.read().splitlines(), state, final)
+
+    state = state if state is not None else {}
+    cur_grp = state.get("cur_grp")
+    cur_obj = state.get("cur_obj")
+    pending = state.get("pending")  # 上一行是时间头：(时间, 发言人)，本行即消息内容
+    pending = tuple(pending) if pending else None
+
+    grps, objs, times, senders, contents = [], [], [], [], []
+    match = _HEADER_PAT.match
+
+    for line in source:
+        line = line.strip()
+        if pending is not None:
+            grps.append(cur_grp); objs.append(cur_obj)
+            times.append(pending[0]); senders.append(pending[1]); contents.append(line)
+            pending = None
+            continue
+        if line.startswith("消息"):
+            if line.startswith("消息分组:"):
+                cur_grp = line.split(":", 1)[1].strip(); continue
+            if line.startswith("消息对象:"):
+                cur_obj = line.split(":", 1)[1].strip(); continue
+        # 时间头行必以数字开头，先用首字符过滤，绝大多数内容行不走正则
+        if cur_obj and line[:1].isdigit():
+            m = match(line)
+            if m:
+                pending = m.groups()
+
+    if pending is not None and final:  # 文件以时间头结尾：内容为空
+        grps.append(cur_grp); objs.append(cur_obj)
+        times.append(pending[0]); senders.append(pending[1]); contents.append("")
+        pending = None
+    state.update(cur_grp=cur_grp, cur_obj=cur_obj, pending=list(pending) if pending else None)
+
+    return pd.DataFrame(
+        {"消息分组": grps, "聊天对象/群": objs, "时间": times, "发言人": senders, "消息内容": contents},
+        columns=RAW_COLUMNS,
+    )
+
+
+def load_nickname_map(MAPPING_FILE) -> dict:
+    """映射表“昵称映射” sheet → {真实客服: [昵称, ...]}（保持表内顺序）"""
+    df_nick = pd.read_excel(MAPPING_FILE, sheet_name="昵称映射")
+    # 确保都是 str，并去两端空白
+    df_nick["真实客服"] = df_nick["真实客服"].astype(str).str.strip()
+    df_nick["昵称"]    = df_nick["昵称"].astype(str).str.strip()
+    return (
+        df_nick
+        .groupby("真实客服", sort=False)["昵称"]
+        .apply(list)
+        .to_dict()
+    )
+
+
+class NicknameResolver:
+    """
+    发言人 → 真实客服（子串匹配昵称或真实姓名）
+    - 一个合并正则先判断是否命中任意客服，绝大多数玩家一次 search 就返回
+    - 命中时按映射表倒序找第一个匹配的客服，等价于旧版“逐个客服覆盖赋值、后者优先”
+    """
+
+    def __init__(self, nickname_to_real: dict):
+        self._pats = [
+            (real, re.compile("|".join(re.escape(x) for x in list(nicks) + [real])))
+            for real, nicks in nickname_to_real.items()
+        ]
+        self._any = re.compile("|".join(p.pattern for _, p in self._pats)) if self._pats else None
+
+    def resolve(self, name: str) -> Optional[str]:
+        if self._any is None or not isinstance(name, str) or not self._any.search(name):
+            return None
+        for real, pat in reversed(self._pats):
+            if pat.search(name):
+                return real
+        return None
+
+
+def annotate_messages(df: pd.DataFrame, nickname_to_real: dict, speaker_map: dict) -> pd.DataFrame:
+    """原始消息 DataFrame → 去重、转时间、标注客服/研发、清洗（同 load_and_process 的后半段）"""
+    df = df.drop_duplicates()
+    df["时间"] = pd.to_datetime(df["时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+
+    # 标注 使用人 & 真实客服：只对去重后的发言人各算一次
+    resolver = NicknameResolver(nickname_to_real)
+    senders = df["发言人"].unique()
+    df["使用人"] = df["发言人"]
+    df["真实客服"] = df["发言人"].map({s: resolver.resolve(s) for s in senders})
+    # 提取 speaker_id（取不到括号内数字时用发言人原文）
+    sid = {}
+    for s in senders:
+        m = _SPEAKER_ID_PAT.search(s) if isinstance(s, str) else None
+        sid[s] = m.group(1) if m else s
+    df["speaker_id"] = df["发言人"].map(sid)
+
+    # 去掉撤回消息 & 指定群
+    df = df[~df['speaker_id'].isin(['10000', '1000000','系统消息(1000000)'])]
+    df = df[~df['聊天对象/群'].isin(['青瓷客服打卡群'])]
+    df["研发"] = df["speaker_id"].map(speaker_map)
+    
+    #数据清洗
+    
+    # 1. 处理“空行”或“[表情]”的情况
+    mask_empty_or_emoji = df["消息内容"].astype(str).str.strip().isin(["", "[表情]"])
+    # 2. 处理灌水词（可自行扩展）
+    spam_words = ["+1", "冲", "蹲", "up", "哈", "嘿", "哦"]
+    mask_spam = df["消息内容"].isin(spam_words)
+    # 合并两个条件
+    mask_to_drop = mask_empty_or_emoji | mask_spam
+    # 删除这些无效行
+    df_cleaned = df[~mask_to_drop].copy()
+    
+    return df_cleaned
+
+
+# ———————————————— 1. 解析 + 标注 DataFrame ————————————————
+def load_and_process(filepath: str, MAPPING_FILE,speaker_map) -> pd.DataFrame:
+    # 单遍解析 txt → 原始消息 → 标注 & 清洗
+    nickname_to_real = load_nickname_map(MAPPING_FILE)
+    df = parse_qq_export(filepath)
+    return annotate_messages(df, nickname_to_real, speaker_map)
+
+
+
+
+
+# def load_and_process(filepath: str, nickname_to_real_path: str, speaker_map: dict) -> pd.DataFrame:
+#     ...
+
+def _identify_speaker(row) -> str:
+    """判定说话者类型：研发ID / 客服ID / 玩家ID"""
+    if pd.notna(row.get("研发")):
+        return "研发ID"
+    elif pd.notna(row.get("真实客服")):
+        return "客服ID"
+    else:
+        return "玩家ID"
+
+def _to_dt(x) -> pd.Timestamp:
+    return pd.to_datetime(x, errors="coerce")
+
+# 身份 → JSONL 里的 (ID 键, 消息键)
+ROLE_KEYS = {
+    "玩家ID": ("玩家ID", "玩家消息"),
+    "客服ID": ("客服ID", "客服消息"),
+    "研发ID": ("研发ID", "研发消息"),
+}
+RECORD_COLUMNS = ["发言日期", "发言时间", "身份", "发言人", "消息内容", "时间"]
+
+
+def build_records_for_range(
+    pathtxt: Union[str, Path],
+    mapping_file: Union[str, Path],
+    speaker_map: Optional[dict] = None,
+    start_time: Optional[Union[str, datetime]] = "1970-01-01 00:00:00",
+    end_time:   Optional[Union[str, datetime]] = "2100-01-01 00:00:00",
+    cache_dir: Optional[Union[str, Path]] = None,
+    as_frame: bool = True,
+) -> Union[pd.DataFrame, List[dict]]:
+    """
+    与 build_jsonl_for_range 相同的解析/筛选，但不序列化，直接返回结构化结果：
+    - as_frame=True：DataFrame，列见 RECORD_COLUMNS（身份为 玩家ID/客服ID/研发ID，时间为 datetime64）
+    - as_frame=False：list[dict]，与 JSONL 每行 json.loads 后完全相同
+    下游需要结构化数据时用它，省掉 dumps → loads 的往返。
+    start_time / end_time 为 None 表示该侧不限。
+    """
+    if start_time is None:
+        start_time = "1970-01-01 00:00:00"
+    if end_time is None:
+        end_time = "2100-01-01 00:00:00"
+    # 1) 载入原始DF
+    if cache_dir is not None:
+        from .chat_cache import ParsedChatCache
+        raw = ParsedChatCache(cache_dir).load_range(pathtxt, start_time, end_time)
+        df01 = annotate_messages(raw, load_nickname_map(str(mapping_file)), speaker_map or {})
+    else:
+        df01 = load_and_process(str(pathtxt), str(mapping_file), speaker_map or {})
+    if "时间" not in df01.columns:
+        raise ValueError("df01 缺少列：时间")
+
+    # 2) 时间格式 & 过滤
+    times = _to_dt(df01["时间"])
+    st = pd.to_datetime(start_time)
+    et = pd.to_datetime(end_time)
+    filtered = df01.loc[(times >= st) & (times < et)]
+    times = times.loc[filtered.index]
+
+    # 3) 判定身份（研发优先于客服，其余为玩家）
+    def _col(name: str) -> pd.Series:
+        return filtered[name] if name in filtered.columns else pd.Series(pd.NA, index=filtered.index)
+
+    role = np.select(
+        [_col("研发").notna().to_numpy(), _col("真实客服").notna().to_numpy()],
+        ["研发ID", "客服ID"],
+        default="玩家ID",
+    )
+
+    # 4) 按列组装（你要的“ID”字段这里用发言人字段（含昵称+ID））
+    records = pd.DataFrame({
+        "发言日期": times.dt.strftime("%Y-%m-%d").to_numpy(),
+        "发言时间": times.dt.strftime("%H:%M:%S").to_numpy(),
+        "身份": role,
+        "发言人": _col("发言人").fillna("").astype(str).to_numpy(),
+        "消息内容": _col("消息内容").fillna("").astype(str).str.strip().to_numpy(),
+        "时间": times.to_numpy(),
+    }, columns=RECORD_COLUMNS)
+
+    return records if as_frame else records_to_dicts(records)
+
+
+def records_to_dicts(records: pd.DataFrame) -> List[dict]:
+    """build_records_for_range 的 DataFrame → list[dict]（键顺序与 JSONL 一致）"""
+    out: List[dict] = []
+    for d, t, role, speaker, content in zip(
+        records["发言日期"], records["发言时间"], records["身份"], records["发言人"], records["消息内容"]
+    ):
+        id_key, msg_key = ROLE_KEYS[role]
+        out.append({"发言日期": d, "发言时间": t, id_key: speaker, msg_key: content})
+    return out
+
+
+def records_to_jsonl(records: pd.DataFrame) -> List[str]:
+    """
+    build_records_for_range 的 DataFrame → JSONL 行。
+    只有发言人/消息内容需要转义（按列批量 dumps），其余部分直接拼接，输出与逐行 json.dumps 逐字节一致。
+    """
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    speakers = map(dumps, records["发言人"])
+    contents = map(dumps, records["消息内容"])
+    return [
+        f'{{"发言日期": "{d}", "发言时间": "{t}", "{ROLE_KEYS[r][0]}": {sp}, "{ROLE_KEYS[r][1]}": {c}}}'
+        for d, t, r, sp, c in zip(records["发言日期"], records["发言时间"], records["身份"], speakers, contents)
+    ]
+
+
+def build_jsonl_for_range(
+    pathtxt: Union[str, Path],
+    mapping_file: Union[str, Path],
+    speaker_map: Optional[dict] = None,
+    start_time: Optional[Union[str, datetime]] = "1970-01-01 00:00:00",
+    end_time:   Optional[Union[str, datetime]] = "2100-01-01 00:00:00",
+    return_str: bool = False,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> Union[List[str], str]:
+    """
+    将（txt + 映射表）解析后的聊天数据，按时间范围筛选，转成 JSONL。
+    - pathtxt: 群聊txt路径
+    - mapping_file: Excel映射表（昵称→真实客服等）
+    - speaker_map: {speaker_id: "研发/运营姓名"} 的映射，可为 None
+    - start_time / end_time: 可传 str 或 datetime，None 表示该侧不限。包含 start，排除 end（[start, end)）
+    - return_str: True 则返回 JSONL 字符串；False 返回 JSON 行列表(list[str])
+    - cache_dir: 解析缓存目录（见 chat_cache.py）；传入时只增量解析 txt 新增部分、
+                 只读时间范围覆盖到的日期分区；None 则每次全量解析
+    需要结构化结果（不想再 json.loads）时用 build_records_for_range。
+    """
+    records = build_records_for_range(
+        pathtxt, mapping_file, speaker_map, start_time, end_time, cache_dir=cache_dir, as_frame=True,
+    )
+    jsonl_lines = records_to_jsonl(records)
+    return "\n".join(jsonl_lines) if return_str else jsonl_lines
+
+
+def build_jsonl_by_day(
+    pathtxt: Union[str, Path],
+    mapping_file: Union[str, Path],
+    speaker_map: Optional[dict] = None,
+    start_time: Union[str, datetime] = "1970-01-01 00:00:00",
+    end_time:   Union[str, datetime] = "2100-01-01 00:00:00",
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> Dict[str, List[str]]:
+    """
+    解析一次、按发言日期切分：{YYYY-MM-DD: JSONL 行}（只含有发言的日期）。
+    每天的行与对当天 00:00~次日 00:00 调 build_jsonl_for_range 的结果逐字节一致，
+    多日回填时用它代替逐日解析。
+    """
+    records = build_records_for_range(
+        pathtxt, mapping_file, speaker_map, start_time, end_time, cache_dir=cache_dir, as_frame=True,
+    )
+    return {
+        day: records_to_jsonl(day_records)
+        for day, day_records in records.groupby("发言日期", sort=True)
+    }
+
+def save_jsonl(lines_or_str: Union[List[str], str], out_path: Union[str, Path]) -> Path:
+    """把 JSONL 列表或字符串保存到文件"""
+    p = Path(out_path)
+    if isinstance(lines_or_str, list):
+        text = "\n".join(lines_or_str)
+    else:
+        text = lines_or_str
+    p.write_text(text, encoding="utf-8")
+    return p
+
+
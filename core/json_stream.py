@@ -0,0 +1,93 @@
+"""
+流式输出里的 JSON 对象增量提取（括号深度，字符串感知）
+- 模型边生成边推送文本片段；每收到一段就喂给 JsonObjectExtractor，
+  顶层 {...} 一闭合就吐出来，不必等整段响应结束再扫描
+- 与 parse_model2_output_to_json_list / parse_opinion_output_to_list 同样按大括号深度切对象，
+  但跳过字符串里的 { }（转义引号也处理），片段可以在任意位置断开
+- 对象之外的文字（解释语、```json 外壳、“- ” 列表前缀、数组的 [ , ]）直接丢弃
+- 流中途断开时，已闭合的对象照常可用，未闭合的尾巴留在 pending 里
+"""
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class JsonObjectExtractor:
+    """
+    用法：
+        ex = JsonObjectExtractor()
+        for chunk in stream:
+            for text in ex.feed(chunk):
+                obj = json.loads(text)
+    """
+
+    def __init__(self):
+        self._buf: List[str] = []   # 当前未闭合对象的文本片段
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.completed: List[str] = []  # 已吐出的全部对象原文（按顺序）
+
+    @property
+    def pending(self) -> str:
+        """尚未闭合的对象原文（流被截断时就是残缺的最后一个对象）"""
+        return "".join(self._buf)
+
+    def feed(self, chunk: str) -> List[str]:
+        """喂一段文本，返回这段里闭合的顶层对象原文（可能为空）"""
+        out: List[str] = []
+        if not chunk:
+            return out
+        start = 0 if self._depth > 0 else None  # 当前对象在 chunk 里的起点
+        for i, ch in enumerate(chunk):
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    start = i
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buf.append(chunk[start:i + 1])
+                    text = "".join(self._buf)
+                    self._buf = []
+                    start = None
+                    out.append(text)
+        if self._depth > 0 and start is not None:
+            self._buf.append(chunk[start:])
+        self.completed.extend(out)
+        return out
+
+
+def iter_json_objects(
+    chunks: Iterable[str],
+    parse: Callable[[str], Any] = json.loads,
+    on_error: Optional[Callable[[str, Exception], None]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    文本片段流 → 逐个 dict（对象一闭合就产出）。
+    parse 可换成带修复的解析函数；解析失败的对象跳过（on_error 可记录原文）。
+    """
+    ex = JsonObjectExtractor()
+    for chunk in chunks:
+        for text in ex.feed(chunk):
+            try:
+                obj = parse(text)
+            except (ValueError, TypeError) as e:
+                if on_error is not None:
+                    on_error(text, e)
+                continue
+            if isinstance(obj, dict):
+                yield obj
@@ -0,0 +1,167 @@
+"""
+模型响应持久化缓存（SQLite）
+- key = sha256(模型ID + 系统提示词 + 用户提示词 + 采样参数)，输入逐字节相同才命中
+- 按条目年龄（max_age_days）和总大小（max_bytes，LRU）淘汰
+- 环境变量 ARK_CACHE_BYPASS=1 可整体跳过缓存（不读也不写）
+- 缓存目录：环境变量 ARK_CACHE_DIR 指定，否则放用户缓存目录（%LOCALAPPDATA% / $XDG_CACHE_HOME / ~/.cache）下，不写进安装目录
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+CACHE_FILE_NAME = "ark_responses.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    model       TEXT NOT NULL,
+    response    TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at);
+"""
+
+
+def cache_bypassed() -> bool:
+    """ARK_CACHE_BYPASS=1/true/yes 时跳过缓存"""
+    return os.environ.get("ARK_CACHE_BYPASS", "").strip().lower() in {"1", "true", "yes"}
+
+
+def default_cache_path() -> Path:
+    """ARK_CACHE_DIR 优先；否则用户缓存目录下的 player-community/llm_cache（core 装成 site-packages 时也可写）"""
+    cache_dir = os.environ.get("ARK_CACHE_DIR", "").strip()
+    if cache_dir:
+        return Path(cache_dir).expanduser() / CACHE_FILE_NAME
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "player-community" / "llm_cache" / CACHE_FILE_NAME
+
+
+def make_cache_key(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    **sampling: Any,
+) -> str:
+    """
+    内容寻址 key：模型ID、系统提示词、用户提示词、采样参数（temperature / max_tokens 等）
+    任何一项变化都会得到不同的 key
+    """
+    payload = json.dumps(
+        {"model": model, "system": system_prompt, "user": user_prompt, "sampling": sampling},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    线程安全（单连接 + 锁），多进程共用同一个文件也可以（WAL + busy timeout）。
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_age_days: Optional[float] = 30,
+        max_bytes: Optional[int] = 512 * 1024 * 1024,
+        evict_every: int = 200,
+    ):
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.max_age_days is not None and now - created_at > self.max_age_days * 86400:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model, response, size, now, now),
+            )
+            self._conn.commit()
+            self._puts += 1
+            need_evict = self._puts % self.evict_every == 0
+        if need_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """先删过期条目，再按最近访问时间从旧到新删到 max_bytes 以内；返回删除条数"""
+        removed = 0
+        with self._lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (cutoff,)
+                ).rowcount
+
+            if self.max_bytes is not None:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    victims, freed = [], 0
+                    for key, size in self._conn.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                    ):
+                        victims.append((key,))
+                        freed += size
+                        if freed >= excess:
+                            break
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+                    removed += len(victims)
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+            ).fetchone()
+        return {"path": str(self.path), "entries": entries, "bytes": total, "hits": hits}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,107 @@
+"""
+预解析的原始发言（各阶段共用，替代到处 json.loads(jsonl_lines01)）
+- build_jsonl_for_range 的输出只 json.loads 一次；原文行、dict、按列的日期/秒数、_idx 都在这里
+- 时间轴查询走同一个 DayTimeIndex（懒建，只建一次）
+- 老接口仍接受 list[str]：函数内部用 as_message_store 转一下，传 MessageStore 时零开销
+"""
+from __future__ import annotations
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .time_index import DayTimeIndex, time_to_seconds
+
+
+class MessageStore:
+    """
+    按位置对齐的几列（下标 pos 从 0 开始）：
+    - lines[pos]:    原文 JSONL 行（已 strip），模型 #4 取原文直接用
+    - messages[pos]: json.loads 后的 dict（不额外塞字段，下游去重/统计语义不变）
+    - dates[pos]:    发言日期字符串
+    - seconds[pos]:  发言时间的当天秒数，时间无效为 -1
+    - idx[pos]:      稳定行号 _idx：行里自带 _idx 就用它，否则与 add_index_to_jsonl_lines 一致（原列表 1 起的行号）
+    """
+
+    def __init__(self, lines: List[str], messages: List[Dict[str, Any]], idx: Sequence[int]):
+        self.lines = lines
+        self.messages = messages
+        self.dates = np.array([m.get("发言日期") or "" for m in messages], dtype=object)
+        self.seconds = np.array(
+            [s if s is not None else -1 for s in (time_to_seconds(m.get("发言时间") or "") for m in messages)],
+            dtype=np.int64,
+        )
+        self.idx = np.asarray(idx, dtype=np.int64)
+        self._time_index: Optional[DayTimeIndex] = None
+        self._pos_by_idx: Optional[Dict[int, int]] = None
+
+    # ==================== 构建 ====================
+
+    @classmethod
+    def from_lines(cls, jsonl_lines: Iterable[str]) -> "MessageStore":
+        """JSONL 行 → store；空行和坏行跳过（与各函数原来的容错一致）"""
+        lines: List[str] = []
+        messages: List[Dict[str, Any]] = []
+        idx: List[int] = []
+        for n, line in enumerate(jsonl_lines, start=1):
+            s = (line or "").strip()
+            if not s:
+                continue
+            try:
+                obj = json.loads(s)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            lines.append(s)
+            messages.append(obj)
+            own = obj.get("_idx")
+            idx.append(own if isinstance(own, int) else n)
+        return cls(lines, messages, idx)
+
+    # ==================== 访问 ====================
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    @property
+    def time_index(self) -> DayTimeIndex:
+        if self._time_index is None:
+            self._time_index = DayTimeIndex.from_columns(self.dates, self.seconds)
+        return self._time_index
+
+    def positions_for_idx(self, idx_list: Iterable[int]) -> List[int]:
+        """_idx 列表 → 下标（按原始顺序，找不到的忽略）"""
+        if self._pos_by_idx is None:
+            self._pos_by_idx = {int(v): pos for pos, v in enumerate(self.idx)}
+        found = {self._pos_by_idx[i] for i in idx_list if i in self._pos_by_idx}
+        return sorted(found)
+
+    def lines_at(self, positions: Iterable[int]) -> List[str]:
+        return [self.lines[p] for p in positions]
+
+    def messages_at(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.messages[p] for p in positions]
+
+    def take(self, positions: Sequence[int]) -> "MessageStore":
+        """按下标取子集（保持给定顺序和原 _idx），不重新 json.loads"""
+        pos = np.asarray(positions, dtype=np.int64)
+        sub = MessageStore.__new__(MessageStore)
+        sub.lines = [self.lines[p] for p in pos]
+        sub.messages = [self.messages[p] for p in pos]
+        sub.dates = self.dates[pos]
+        sub.seconds = self.seconds[pos]
+        sub.idx = self.idx[pos]
+        sub._time_index = None
+        sub._pos_by_idx = None
+        return sub
+
+
+def as_message_store(source: Union[MessageStore, Iterable[str]]) -> MessageStore:
+    """MessageStore 原样返回；JSONL 行列表则现建一个（兼容老调用方式）"""
+    if isinstance(source, MessageStore):
+        return source
+    return MessageStore.from_lines(source)
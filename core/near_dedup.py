@@ -0,0 +1,190 @@
+"""
+送模型前的近似重复发言合并（SimHash）
+- 刷屏复读、“同上”、十个人重复报同一个 bug：同一时间窗内文本近似的发言合并成一条代表
+  （第一次出现的那条），代表行追加两个字段：
+      "重复次数": 合并的条数（含代表本身）
+      "重复发言人": 这些发言的发言人 ID（去重，按出现顺序）
+- 近似判定：去掉链接/占位符/@某人后的归一化文本（只留中日韩文字/字母/数字，小写）的字符二元组 SimHash，
+  64 位汉明距离 ≤ max_distance；归一化后很短的文本（< min_chars）只合并完全相同的
+- 只和 window_seconds 内（从组内第一条算起）、同一天的发言合并，避免把相隔很久的复述压成一个时间点
+- 查找用 4 段 16 位分桶（汉明距离 ≤ 3 时至少有一段完全相同），不做两两比较
+- 只影响送进模型#1/#2 的行；热度统计（extract_top5_heat_clusters 的 U/M）仍用完整的原始发言
+"""
+from __future__ import annotations
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union, Iterable
+
+import numpy as np
+
+from .message_store import MessageStore, as_message_store
+from .prefilter import message_text, normalize_core, strip_noise
+
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_WINDOW_SECONDS = 1800
+DEFAULT_MIN_CHARS = 4
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+_ID_KEYS = ("玩家ID", "客服ID", "研发ID")
+
+
+# ==================== SimHash ====================
+
+def _shingle_hashes(core: str) -> np.ndarray:
+    """字符二元组（不足 2 字就用整串）→ 稳定的 64 位哈希（不依赖 PYTHONHASHSEED）"""
+    grams = [core[i:i + 2] for i in range(len(core) - 1)] or [core]
+    raw = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    return np.frombuffer(raw, dtype=">u8")
+
+
+def simhash(text: str) -> int:
+    """归一化文本的 64 位 SimHash；空文本为 0"""
+    core = normalize_core(strip_noise(text))
+    if not core:
+        return 0
+    hashes = _shingle_hashes(core)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)  # (n, 64)，高位在前
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    out = 0
+    for b in (votes > 0):
+        out = (out << 1) | int(b)
+    return out
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(h: int) -> List[Tuple[int, int]]:
+    return [(i, (h >> (i * _BAND_BITS)) & _BAND_MASK) for i in range(_BANDS)]
+
+
+# ==================== 合并 ====================
+
+def _speaker_id(msg: Dict[str, Any]) -> Optional[str]:
+    for key in _ID_KEYS:
+        if key in msg:
+            return msg.get(key)
+    return None
+
+
+def find_near_duplicate_groups(
+    source: Union[MessageStore, Iterable[str]],
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    min_chars: int = DEFAULT_MIN_CHARS,
+) -> List[List[int]]:
+    """
+    按原顺序扫描，返回分组（每组是下标列表，第一个是代表）；没有重复的发言自成一组。
+    组内所有发言与代表同一天，且与代表相隔不超过 window_seconds。
+    """
+    store = as_message_store(source)
+    groups: List[List[int]] = []
+    # 进行中的组：代表的 (日期, 秒数, 指纹, 归一化文本)
+    heads: List[Tuple[str, int, int, str]] = []
+    buckets: Dict[Tuple[int, int], List[int]] = {}  # (段号, 段值) → 组号（长文本）
+    exact: Dict[str, List[int]] = {}                 # 归一化文本 → 组号（短文本）
+    fingerprints: Dict[str, Tuple[str, int]] = {}    # 原文 → (归一化文本, SimHash)，复读的同一句只算一次
+
+    def _alive(g: int, date: str, sec: int) -> bool:
+        h_date, h_sec, _, _ = heads[g]
+        if h_date != date:
+            return False
+        if sec < 0 or h_sec < 0:
+            return False
+        return sec - h_sec <= window_seconds
+
+    for pos, msg in enumerate(store.messages):
+        text = message_text(msg)
+        if text not in fingerprints:
+            core = normalize_core(strip_noise(text))
+            fingerprints[text] = (core, simhash(text) if len(core) >= min_chars else 0)
+        core, fp = fingerprints[text]
+        date, sec = store.dates[pos], int(store.seconds[pos])
+
+        match = None
+        if core:
+            if len(core) < min_chars:
+                cands = exact.get(core, [])
+                for g in reversed(cands):
+                    if _alive(g, date, sec):
+                        match = g
+                        break
+            else:
+                seen = set()
+                for band in _bands(fp):
+                    for g in reversed(buckets.get(band, [])):
+                        if g in seen:
+                            continue
+                        seen.add(g)
+                        if _alive(g, date, sec) and hamming(heads[g][2], fp) <= max_distance:
+                            match = g
+                            break
+                    if match is not None:
+                        break
+
+        if match is not None:
+            groups[match].append(pos)
+            continue
+
+        g = len(groups)
+        groups.append([pos])
+        heads.append((date, sec, fp, core))
+        if core:
+            if len(core) < min_chars:
+                exact.setdefault(core, []).append(g)
+            else:
+                for band in _bands(fp):
+                    buckets.setdefault(band, []).append(g)
+
+    return groups
+
+
+def collapse_near_duplicates(
+    source: Union[MessageStore, Iterable[str]],
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    min_chars: int = DEFAULT_MIN_CHARS,
+    verbose: bool = True,
+) -> Tuple[MessageStore, Dict[str, Any]]:
+    """
+    返回 (代表行组成的 store, 报告)。代表按原顺序排列，有重复的代表行带 重复次数 / 重复发言人。
+    报告：{"total", "kept", "collapsed", "groups": 有重复的组数, "largest": 最大组条数}
+    """
+    store = as_message_store(source)
+    groups = find_near_duplicate_groups(store, max_distance, window_seconds, min_chars)
+    reps = store.take([g[0] for g in groups])
+
+    dup_groups = 0
+    largest = 1
+    for i, g in enumerate(groups):
+        if len(g) < 2:
+            continue
+        dup_groups += 1
+        largest = max(largest, len(g))
+        speakers: List[str] = []
+        for p in g:
+            sid = _speaker_id(store.messages[p])
+            if sid and sid not in speakers:
+                speakers.append(sid)
+        msg = dict(reps.messages[i])
+        msg["重复次数"] = len(g)
+        msg["重复发言人"] = speakers
+        reps.messages[i] = msg
+        reps.lines[i] = json.dumps(msg, ensure_ascii=False)
+
+    report = {
+        "total": len(store),
+        "kept": len(reps),
+        "collapsed": len(store) - len(reps),
+        "groups": dup_groups,
+        "largest": largest,
+    }
+    if verbose:
+        print(
+            f"🧬 [近似去重] {report['groups']} 组重复发言合并为代表，少送 {report['collapsed']}/{report['total']} 条"
+            f"（最大一组 {report['largest']} 条）"
+        )
+    return reps, report
@@ -0,0 +1,128 @@
+"""
+模型#4 玩家观点分析的并发扇出（Step 5）
+- 每个 Top5 讨论点一次模型#4 调用、彼此独立：走 run_batches_concurrently 有界并发，替代串行 for 循环
+- 单次调用有墙钟超时；超时/出错的讨论点只记为失败，不影响其他讨论点（合并时为 _missing_opinion）。
+  超时的调用线程停不下来，它之后才返回的结果直接丢弃，不写 step5_batches 检查点
+- 结果按讨论点原序拼接，与完成先后无关：merge_top5_with_opinions_numbered 对同名讨论点
+  逐个消费的顺序与串行版一致
+- 检查点：每个讨论点单独落盘（step5_batches），全部成功后再写整阶段 step5_opinions，有失败时本次运行记为不完整；
+  续跑时只重跑失败/未完成的讨论点；流式输出中断（PartialOutput）的讨论点观点照常返回，但不落盘
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .batch_executor import run_batches_concurrently
+from .checkpoint_store import CheckpointStore, PartialResult, is_partial
+from .message_store import MessageStore
+from .model_classify import (
+    build_user_prompt_subcluster_opinion,
+    get_dialogs_lines_by_fayan_time_debug,
+    parse_opinion_output_to_list,
+    print_mech_time_from_top5,
+)
+
+OPINION_STAGE = "step5_opinions"
+OPINION_BATCH_STAGE = "step5"
+
+
+def build_opinion_jobs(
+    top5_results: List[Dict[str, Any]],
+    all_cluster: str,
+    message_store: MessageStore,
+) -> List[Dict[str, Any]]:
+    """
+    Top5 讨论点 → 模型#4 调用列表（顺序同 print_mech_time_from_top5）。
+    没匹配到发言时间、或时间段内没有原始发言的讨论点跳过（与原串行循环一致）。
+    """
+    jobs: List[Dict[str, Any]] = []
+    for r in print_mech_time_from_top5(top5_results, all_cluster):
+        mech = r.get("核心对象/机制") or ""
+        full_time = (r.get("发言时间") or "").strip()
+        if not mech or not full_time or " " not in full_time:
+            continue
+
+        fayan_date, fayan_time = full_time.split(" ", 1)
+        dialogs_lines = get_dialogs_lines_by_fayan_time_debug(
+            message_store, fayan_date, fayan_time, debug=False
+        )
+        if not dialogs_lines:
+            continue
+
+        jobs.append({
+            "讨论点": mech,
+            "user_prompt": build_user_prompt_subcluster_opinion(
+                discussion_point=mech,
+                json_lines=dialogs_lines,
+            ),
+        })
+    return jobs
+
+
+def run_opinion_fanout(
+    jobs: List[Dict[str, Any]],
+    call_model: Callable[[str], str],
+    max_workers: int = 4,
+    timeout: Optional[float] = None,
+    ckpt: Optional[CheckpointStore] = None,
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    并发执行模型#4：call_model(user_prompt) -> 模型原始输出。
+    返回 (按讨论点原序拼接的观点列表, 失败的讨论点下标)。
+    """
+    ckpt = ckpt or CheckpointStore(None, None)
+    timed_out: Set[int] = set()  # 已判超时的讨论点：调用线程晚些返回时不再落检查点
+
+    def _run(i: int, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        output = call_model(job["user_prompt"])
+        if i in timed_out:
+            # 本阶段已按失败处理，迟到的结果不落盘（抛出的异常没人接，线程随之结束）
+            raise TimeoutError(f"讨论点 {i + 1} 超时后才返回，结果丢弃")
+        opinions = parse_opinion_output_to_list(output)
+        if is_partial(output):
+            raise PartialResult(opinions, "model4 流式输出中断")
+        return opinions
+
+    def _worker(i: int, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return ckpt.run_batch(OPINION_BATCH_STAGE, i, lambda: _run(i, job))
+
+    failed: List[int] = []
+
+    def _on_done(i: int, res, err) -> None:
+        if err is not None:
+            if isinstance(err, TimeoutError):
+                timed_out.add(i)
+            failed.append(i)
+            print(f"    ❌ 模型#4 [{jobs[i]['讨论点']}] 出错: {err}")
+
+    results = run_batches_concurrently(
+        jobs, _worker, max_workers=max_workers, on_done=_on_done, timeout=timeout
+    )
+    all_opinions = [op for ops in results if ops for op in ops]
+    return all_opinions, sorted(failed)
+
+
+def run_opinion_stage(
+    ckpt: CheckpointStore,
+    top5_results: List[Dict[str, Any]],
+    all_cluster: str,
+    message_store: MessageStore,
+    call_model: Callable[[str], str],
+    max_workers: int = 4,
+    timeout: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """Step 5 整体：检查点命中直接返回；否则扇出调用，全部成功才写整阶段检查点"""
+    if ckpt.has(OPINION_STAGE):
+        print(f"⏩ [检查点] 跳过已完成阶段: {OPINION_STAGE}")
+        return ckpt.load(OPINION_STAGE)
+
+    jobs = build_opinion_jobs(top5_results, all_cluster, message_store)
+    all_opinions, failed = run_opinion_fanout(
+        jobs, call_model, max_workers=max_workers, timeout=timeout, ckpt=ckpt
+    )
+    print(f"  → 模型#4 完成 {len(jobs) - len(failed)}/{len(jobs)} 个讨论点，失败 {len(failed)} 个")
+
+    if failed:
+        ckpt.mark_partial(OPINION_STAGE, f"{len(failed)}/{len(jobs)} 个讨论点失败")
+    else:
+        ckpt.save(OPINION_STAGE, all_opinions)
+    return all_opinions
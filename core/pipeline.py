@@ -0,0 +1,530 @@
+"""
+单日分析流水线（top5_Q2.ipynb 的主流程，H5包装 / 预计算方案 / 自动化分析方案 共用这一份）
+- 每个阶段一个带类型的函数，可以单独调用、替换或在 notebook 里逐步跑：
+    parse_messages     Step 1  聊天记录 → MessageStore
+    select_for_model   Step 2a 本地预过滤 + 近似去重，决定哪些行送模型#1
+    cluster_batches    Step 2b 按 token 预算切批，模型#1 筛选 + 模型#2 话题簇（并发、按批次落盘）
+    aggregate_clusters Step 3  模型#3 日话题簇聚合
+    compute_heat       Step 4  热度 Top5 + 讨论点（按完整的原始发言统计）
+    analyze_opinions   Step 5  模型#4 玩家观点（按讨论点并发扇出）
+    build_report       Step 6  观点合并进 Top5
+- build_pipeline_dag 把各阶段声明成 DAG 节点（core.dag），run_pipeline 按它执行，返回三个入口共用的结果字典
+- 模型调用统一走 make_model_caller：令牌桶限流 + 共享 Ark 客户端（缓存/重试/可选流式）
+- 流式输出中断（模型返回 PartialOutput）、模型返回空字符串、批次出错时：本批次/阶段的结果照常往下用，
+  但不落盘（PartialResult / ckpt.mark_partial），续跑时只重跑这些批次和之后的阶段；结果字典带 partial=True 和 partial_reasons
+- 送模型的发言被预过滤光、或模型正常返回但没有话题簇，是“当天没东西可聊”，照常 success（top5_clusters 为空）
+"""
+from __future__ import annotations
+import contextlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple, Union
+
+from .batch_executor import TokenBucket, run_batches_concurrently
+from .checkpoint_store import CheckpointStore, PartialResult, is_partial, make_run_id
+from .dag import Dag, Node
+from .message_store import MessageStore
+from .model_classify import (
+    aggregate_cluster_outputs,
+    assign_global_cluster_ids,
+    attach_discussion_points_day,
+    build_user_prompt_cluster_agg,
+    build_user_prompt_clsuter,
+    build_user_prompt_filter,
+    call_ark_chat_completions,
+    ensure_subcluster_list_key,
+    ensure_time_axis_key,
+    extract_top5_heat_clusters,
+    infer_date_for_batch,
+    load_system_prompt,
+    merge_top5_with_opinions_numbered,
+    parse_jsonl_text,
+    parse_jsonl_text_safe,
+    parse_model2_output_to_json_list,
+)
+from .near_dedup import collapse_near_duplicates
+from .opinion_fanout import run_opinion_stage
+from .prefilter import PrefilterRules, load_prefilter_rules, prefilter_store
+from .token_batcher import DEFAULT_BATCH_TOKENS, batch_token_stats, pack_batches
+
+# (model, system_prompt, user_prompt, stage) -> 模型原始输出
+ModelCaller = Callable[[str, str, str, str], str]
+# (当前步, 总步数, 说明)
+ProgressCallback = Callable[[int, int, str], None]
+
+TOTAL_STEPS = 6
+
+
+# ==================== 配置 ====================
+
+@dataclass
+class Prompts:
+    """四个模型阶段的系统提示词"""
+    filter: str     # 模型#1 筛选游戏相关发言
+    cluster: str    # 模型#2 话题簇划分
+    aggregate: str  # 模型#3 日聚合
+    opinion: str    # 模型#4 玩家观点
+
+    @classmethod
+    def load(cls, prompt_dir: Union[str, Path]) -> "Prompts":
+        prompt_dir = Path(prompt_dir)
+        return cls(
+            filter=load_system_prompt(prompt_dir / "提示词1.md"),
+            cluster=load_system_prompt(prompt_dir / "2话题分类.md"),
+            aggregate=load_system_prompt(prompt_dir / "3日聚合.md"),
+            opinion=load_system_prompt(prompt_dir / "2话题分类和总结.md"),
+        )
+
+
+@dataclass
+class PipelineConfig:
+    api_url: str
+    api_key: str
+    filter_model: str                  # 模型#1
+    main_model: str                    # 模型#2/3/4
+    prompt_dir: Union[str, Path]
+    temperature: float = 0.20
+    max_tokens: int = 16384
+    timeout: int = 600
+    retries: int = 2
+    batch_size: Optional[int] = None   # 单批行数上限（None 不限，只按 token 预算切）
+    batch_tokens: int = DEFAULT_BATCH_TOKENS
+    max_workers: int = 4               # 模型#1/#2 并发批次数
+    qps: float = 2.0                   # 全局请求速率上限，<=0 不限流
+    opinion_workers: Optional[int] = None   # 默认同 max_workers
+    opinion_timeout: Optional[float] = None  # 默认同 timeout
+    use_cache: bool = True
+    stream: bool = False               # SSE 流式（读超时代替总超时；断流时保留已闭合的对象，不落检查点）
+    prefilter: bool = True
+    prefilter_rules_file: Optional[Union[str, Path]] = None
+    dedup: bool = True
+    parse_cache_dir: Optional[Union[str, Path]] = None
+    top_k: int = 5
+    prompts: Optional[Prompts] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.prompts is None:
+            self.prompts = Prompts.load(self.prompt_dir)
+        self._prefilter_rules: Optional[PrefilterRules] = (
+            load_prefilter_rules(self.prefilter_rules_file) if self.prefilter else None
+        )
+
+    @property
+    def prefilter_rules(self) -> Optional[PrefilterRules]:
+        return self._prefilter_rules
+
+    def run_id_for(self, txt_path: Union[str, Path], start_time: str, end_time: str) -> str:
+        """影响模型输入的参数都进 run_id，改了参数不会误用旧检查点"""
+        return make_run_id(
+            txt_path, start_time, end_time,
+            self.batch_size, self.batch_tokens, self.prefilter, self.dedup,
+        )
+
+
+def make_model_caller(
+    cfg: PipelineConfig,
+    rate_limiter: Optional[TokenBucket] = None,
+    concurrency: Optional[ContextManager] = None,
+) -> ModelCaller:
+    """
+    所有阶段共用的模型调用入口：先过令牌桶，再经共享 Ark 客户端请求。
+    concurrency 传信号量（threading / multiprocessing 均可）时，同时在途的请求数不超过它的容量，
+    多进程共用一个信号量即为全局并发上限。
+    """
+    limiter = rate_limiter or TokenBucket(rate=cfg.qps)
+    slots = concurrency if concurrency is not None else contextlib.nullcontext()
+
+    def _call(model: str, system_prompt: str, user_prompt: str, stage: str = "") -> str:
+        limiter.acquire()
+        with slots:
+            return call_ark_chat_completions(
+                api_url=cfg.api_url,
+                api_key=cfg.api_key,
+                model=model,
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                temperature=cfg.temperature,
+                max_tokens=cfg.max_tokens,
+                timeout=cfg.timeout,
+                retries=cfg.retries,
+                stage=stage,
+                use_cache=cfg.use_cache,
+                stream=cfg.stream,
+            )
+
+    return _call
+
+
+# ==================== Step 1 ====================
+
+def parse_messages(
+    txt_path: Union[str, Path],
+    mapping_file: Union[str, Path],
+    speaker_map: Dict[str, str],
+    start_time: str,
+    end_time: str,
+    cache_dir: Optional[Union[str, Path]] = None,
+    ckpt: Optional[CheckpointStore] = None,
+) -> MessageStore:
+    """聊天记录 → 时间窗内的原始发言（解析结果落 step1_jsonl 检查点）"""
+    # pandas 只有解析阶段用到，推迟到这里再加载，import core.pipeline 不付这份开销
+    from .data_processing import build_jsonl_for_range
+
+    ckpt = ckpt or CheckpointStore(None, None)
+    jsonl_lines = ckpt.run_stage("step1_jsonl", lambda: build_jsonl_for_range(
+        pathtxt=str(txt_path),
+        mapping_file=str(mapping_file),
+        speaker_map=speaker_map,
+        start_time=start_time,
+        end_time=end_time,
+        return_str=False,
+        cache_dir=cache_dir,
+    ))
+    return MessageStore.from_lines(jsonl_lines)
+
+
+# ==================== Step 2 ====================
+
+def select_for_model(
+    store: MessageStore,
+    prefilter_rules: Optional[PrefilterRules] = None,
+    dedup: bool = True,
+) -> Tuple[MessageStore, Dict[str, int]]:
+    """
+    本地预过滤 / 近似去重只决定哪些行送模型#1；热度统计和观点回溯仍用完整的 store。
+    返回 (送模型的子 store, {"prefiltered_messages", "deduped_messages"})
+    """
+    counts = {"prefiltered_messages": 0, "deduped_messages": 0}
+    batch_store = store
+    if prefilter_rules is not None:
+        batch_store, report = prefilter_store(batch_store, prefilter_rules)
+        counts["prefiltered_messages"] = report["removed"]
+    if dedup:
+        batch_store, report = collapse_near_duplicates(batch_store)
+        counts["deduped_messages"] = report["collapsed"]
+    return batch_store, counts
+
+
+def _partial_tracking(call_model: ModelCaller) -> Tuple[ModelCaller, List[str]]:
+    """
+    包一层 call_model，记下不可信的输出：返回 PartialOutput（流式中断）或空字符串的调用
+    （列表非空即本次结果不完整）
+    """
+    problems: List[str] = []
+
+    def _call(model: str, system_prompt: str, user_prompt: str, stage: str = "") -> str:
+        output = call_model(model, system_prompt, user_prompt, stage)
+        if is_partial(output):
+            problems.append(f"{stage or model} 流式输出中断")
+        elif not str(output).strip():
+            problems.append(f"{stage or model} 返回空输出")
+        return output
+
+    return _call, problems
+
+
+def process_batch(
+    b: int,
+    batch_lines: List[str],
+    call_model: ModelCaller,
+    prompts: Prompts,
+    filter_model: str,
+    main_model: str,
+) -> Optional[Tuple[int, str]]:
+    """
+    单批次：模型#1 筛选 → 模型#2 话题簇划分 → 解析并分配全局 _cluster_id
+    返回 (筛选后行数, 带 _cluster_id 的 JSONL 文本)；模型#1 无输出时返回 None
+    （空输出是否算失败由调用方判断，见 cluster_batches）
+    """
+    output_filter = call_model(filter_model, prompts.filter, build_user_prompt_filter(batch_lines), "model1")
+    if not output_filter:
+        return None
+
+    filter_count = sum(1 for line in output_filter.splitlines() if line.strip())
+
+    output_cluster = call_model(main_model, prompts.cluster, build_user_prompt_clsuter(output_filter), "model2")
+    if not output_cluster:
+        return filter_count, ""
+
+    cluster_json_list = parse_model2_output_to_json_list(output_cluster, batch_idx=b + 1)
+    if not cluster_json_list:
+        return filter_count, ""
+
+    # batch_id 只取决于批次下标，与完成顺序无关
+    date_str = infer_date_for_batch(cluster_json_list, batch_lines)
+    cluster_json_list = assign_global_cluster_ids(cluster_json_list, date_str, f"B{b + 1}")
+    return filter_count, "\n".join(json.dumps(c, ensure_ascii=False) for c in cluster_json_list)
+
+
+def cluster_batches(
+    batch_store: MessageStore,
+    call_model: ModelCaller,
+    prompts: Prompts,
+    filter_model: str,
+    main_model: str,
+    batch_tokens: int = DEFAULT_BATCH_TOKENS,
+    batch_size: Optional[int] = None,
+    max_workers: int = 4,
+    ckpt: Optional[CheckpointStore] = None,
+) -> Tuple[int, List[str]]:
+    """
+    切批后并发跑 process_batch；每个批次单独落盘，续跑时只重跑失败/未完成的批次。
+    模型返回空输出、流式中断或抛异常的批次都不落盘，并把本次运行标成不完整（之后的阶段不落盘）。
+    返回 (模型#1 保留的总行数, 按批次原序的模型#2 输出列表)
+    """
+    ckpt = ckpt or CheckpointStore(None, None)
+    batches = pack_batches(batch_store, max_tokens=batch_tokens, max_lines=batch_size)
+    stats = batch_token_stats(batches)
+    print(f"📦 切批: {stats['batches']} 批，估算 token {stats['min_tokens']}~{stats['max_tokens']}（均值 {stats['mean_tokens']}）")
+
+    def _run(b: int, batch_lines: List[str]):
+        caller, problems = _partial_tracking(call_model)
+        res = process_batch(b, batch_lines, caller, prompts, filter_model, main_model)
+        if problems:
+            raise PartialResult(res, "；".join(problems))
+        return res
+
+    def _worker(b: int, batch_lines: List[str]):
+        return ckpt.run_batch("step2", b, lambda: _run(b, batch_lines))
+
+    failed: List[int] = []
+
+    def _on_done(b: int, res, err):
+        if err is not None:
+            failed.append(b)
+            print(f"[批次 {b + 1}] 出错: {err}")
+
+    results = run_batches_concurrently(batches, _worker, max_workers=max_workers, on_done=_on_done)
+    if failed:
+        ckpt.mark_partial("step2", f"{len(failed)}/{len(batches)} 个批次出错")
+
+    filtered_total = 0
+    outputs: List[str] = []
+    for res in results:
+        if not res:
+            continue
+        filter_count, output_cluster_with_ids = res
+        filtered_total += filter_count
+        if output_cluster_with_ids:
+            outputs.append(output_cluster_with_ids)
+    return filtered_total, outputs
+
+
+# ==================== Step 3 ====================
+
+@dataclass
+class AggregateResult:
+    all_cluster: str                        # 全部子话题簇（JSONL）
+    output_cluster_agg: str                 # 模型#3 原始输出
+    clusters: List[Dict[str, Any]]          # 聚合话题簇（已补时间轴/子话题簇列表字段）
+    subclusters: List[Dict[str, Any]]       # 子话题簇
+
+
+def aggregate_clusters(
+    batch_outputs: List[str],
+    call_model: ModelCaller,
+    prompts: Prompts,
+    main_model: str,
+    ckpt: Optional[CheckpointStore] = None,
+) -> AggregateResult:
+    """模型#3 日话题簇聚合（模型输出落 step3_agg 检查点）；没有子话题簇时不调模型，聚合结果为空"""
+    ckpt = ckpt or CheckpointStore(None, None)
+
+    def _run() -> Dict[str, str]:
+        all_cluster = aggregate_cluster_outputs(batch_outputs)
+        if not all_cluster.strip():
+            return {"all_cluster": all_cluster, "output_cluster_agg": ""}
+        caller, problems = _partial_tracking(call_model)
+        output = caller(main_model, prompts.aggregate, build_user_prompt_cluster_agg(all_cluster), "model3")
+        value = {"all_cluster": all_cluster, "output_cluster_agg": str(output)}
+        if problems:
+            raise PartialResult(value, "；".join(problems))
+        return value
+
+    step3 = ckpt.run_stage("step3_agg", _run)
+    clusters = parse_jsonl_text_safe(step3["output_cluster_agg"], label="模型#3聚合输出")
+    for c in clusters:
+        ensure_time_axis_key(c, verbose=False)
+        ensure_subcluster_list_key(c)
+    return AggregateResult(
+        all_cluster=step3["all_cluster"],
+        output_cluster_agg=step3["output_cluster_agg"],
+        clusters=clusters,
+        subclusters=parse_jsonl_text(step3["all_cluster"]),
+    )
+
+
+# ==================== Step 4 ====================
+
+def compute_heat(
+    agg: AggregateResult,
+    store: MessageStore,
+    top_k: int = 5,
+    ckpt: Optional[CheckpointStore] = None,
+) -> List[Dict[str, Any]]:
+    """热度 TopK（U/M 按完整的原始发言统计）+ 讨论点列表"""
+    ckpt = ckpt or CheckpointStore(None, None)
+
+    def _run() -> List[Dict[str, Any]]:
+        top = extract_top5_heat_clusters(agg.clusters, store, top_k=top_k)
+        return attach_discussion_points_day(top, agg.subclusters)
+
+    return ckpt.run_stage("step4_top5", _run)
+
+
+# ==================== Step 5 / 6 ====================
+
+def analyze_opinions(
+    top5: List[Dict[str, Any]],
+    agg: AggregateResult,
+    store: MessageStore,
+    call_model: ModelCaller,
+    prompts: Prompts,
+    main_model: str,
+    max_workers: int = 4,
+    timeout: Optional[float] = None,
+    ckpt: Optional[CheckpointStore] = None,
+) -> List[Dict[str, Any]]:
+    """模型#4：每个讨论点一次调用，并发执行，结果按讨论点原序拼接"""
+    ckpt = ckpt or CheckpointStore(None, None)
+    return run_opinion_stage(
+        ckpt, top5, agg.all_cluster, store,
+        call_model=lambda prompt: call_model(main_model, prompts.opinion, prompt, "model4"),
+        max_workers=max_workers,
+        timeout=timeout,
+    )
+
+
+def build_report(top5: List[Dict[str, Any]], opinions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """观点按讨论点编号合并进 Top5"""
+    return merge_top5_with_opinions_numbered(top5, opinions)
+
+
+# ==================== 串联 ====================
+
+# 节点名 → 进度步骤（selection / clusters 同属 Step 2，只在 selection 处报一次）
+_STEP_MESSAGES = {
+    "store": (1, "正在加载聊天记录..."),
+    "selection": (2, "正在进行话题簇分析..."),
+    "agg": (3, "正在聚合话题簇..."),
+    "top5": (4, "正在计算热度排名..."),
+    "opinions": (5, "正在分析玩家观点..."),
+    "top5_clusters": (6, "正在生成最终报告..."),
+}
+
+# DAG 的外部输入
+PIPELINE_INPUTS = ("txt_path", "mapping_file", "speaker_map", "start_time", "end_time")
+
+
+def build_pipeline_dag(
+    cfg: PipelineConfig,
+    call_model: ModelCaller,
+    ckpt: Optional[CheckpointStore] = None,
+) -> Dag:
+    """
+    Step 1~6 的 DAG：每个节点就是上面一个阶段函数，检查点仍由各阶段自己管（按批次 / 按讨论点落盘）。
+    外部输入见 PIPELINE_INPUTS，最终输出节点为 top5_clusters。
+    """
+    ckpt = ckpt or CheckpointStore(None, None)
+    prompts = cfg.prompts
+    return Dag([
+        Node("store", lambda txt_path, mapping_file, speaker_map, start_time, end_time: parse_messages(
+            txt_path, mapping_file, speaker_map, start_time, end_time,
+            cache_dir=cfg.parse_cache_dir, ckpt=ckpt,
+        ), inputs=PIPELINE_INPUTS, output_type=MessageStore),
+        Node("selection", lambda store: select_for_model(store, cfg.prefilter_rules, cfg.dedup),
+             inputs=("store",), output_type=tuple),
+        Node("clusters", lambda selection: cluster_batches(
+            selection[0], call_model, prompts, cfg.filter_model, cfg.main_model,
+            batch_tokens=cfg.batch_tokens, batch_size=cfg.batch_size,
+            max_workers=cfg.max_workers, ckpt=ckpt,
+        ), inputs=("selection",), output_type=tuple),
+        Node("agg", lambda clusters: aggregate_clusters(clusters[1], call_model, prompts, cfg.main_model, ckpt=ckpt),
+             inputs=("clusters",), output_type=AggregateResult),
+        Node("top5", lambda agg, store: compute_heat(agg, store, top_k=cfg.top_k, ckpt=ckpt),
+             inputs=("agg", "store"), output_type=list),
+        Node("opinions", lambda top5, agg, store: analyze_opinions(
+            top5, agg, store, call_model, prompts, cfg.main_model,
+            max_workers=cfg.opinion_workers if cfg.opinion_workers is not None else cfg.max_workers,
+            timeout=cfg.opinion_timeout if cfg.opinion_timeout is not None else cfg.timeout,
+            ckpt=ckpt,
+        ), inputs=("top5", "agg", "store"), output_type=list),
+        Node("top5_clusters", build_report, inputs=("top5", "opinions"), output_type=list),
+    ])
+
+
+def run_pipeline(
+    cfg: PipelineConfig,
+    txt_path: Union[str, Path],
+    mapping_file: Union[str, Path],
+    speaker_map: Dict[str, str],
+    start_time: str,
+    end_time: str,
+    ckpt: Optional[CheckpointStore] = None,
+    progress: Optional[ProgressCallback] = None,
+    call_model: Optional[ModelCaller] = None,
+    result: Optional[Dict[str, Any]] = None,
+    store: Optional[MessageStore] = None,
+) -> Dict[str, Any]:
+    """
+    Step 1~6 全流程（按 build_pipeline_dag 执行）。异常直接抛出，由调用方决定记录方式。
+    返回：status / date / time_range / total_messages / prefiltered_messages /
+          deduped_messages / filtered_messages / top5_clusters（无数据时 status="no_data" 并带 error）；
+          有批次/阶段失败或输出不可信时另带 partial=True / partial_reasons
+    传入 result 时就地填充并返回它，出错时调用方仍能拿到已完成阶段的计数。
+    传入 store（调用方已解析好的时间窗内发言，如批量回填时一次解析、按天切分）时跳过 Step 1。
+    """
+    ckpt = ckpt or CheckpointStore(None, None)
+    dag = build_pipeline_dag(cfg, call_model or make_model_caller(cfg), ckpt)
+
+    result = result if result is not None else {}
+    result.update({
+        "status": "processing",
+        "date": start_time.split(" ")[0] if " " in start_time else start_time[:10],
+        "time_range": f"{start_time} ~ {end_time}",
+        "total_messages": 0,
+        "prefiltered_messages": 0,
+        "deduped_messages": 0,
+        "filtered_messages": 0,
+        "top5_clusters": [],
+    })
+
+    def _on_node(name: str, i: int, total: int):
+        if progress and name in _STEP_MESSAGES:
+            step, message = _STEP_MESSAGES[name]
+            progress(step, TOTAL_STEPS, message)
+
+    def _on_done(name: str, value: Any):
+        # 计数随节点完成回填，中途出错时调用方仍能拿到已完成阶段的计数
+        if name == "store":
+            result["total_messages"] = len(value)
+        elif name == "selection":
+            result.update(value[1])
+        elif name == "clusters":
+            result["filtered_messages"] = value[0]
+
+    values: Dict[str, Any] = {
+        "txt_path": txt_path,
+        "mapping_file": mapping_file,
+        "speaker_map": speaker_map,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+    if store is not None:
+        values["store"] = store
+        _on_done("store", store)
+    values = dag.run(values, targets=["store"], ckpt=ckpt, on_node=_on_node, on_done=_on_done)
+    if not len(values["store"]):
+        result["status"] = "no_data"
+        result["error"] = "指定时间范围内没有聊天记录"
+        return result
+
+    values = dag.run(values, targets=["top5_clusters"], ckpt=ckpt,
+                     on_node=_on_node, on_done=_on_done)
+    result["top5_clusters"] = values["top5_clusters"]
+    result["status"] = "success"
+    if ckpt.partial:
+        result["partial"] = True
+        result["partial_reasons"] = list(ckpt.partial_reasons)
+    return result
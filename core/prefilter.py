@@ -0,0 +1,271 @@
+"""
+模型#1 之前的本地预过滤（规则版，零 API 调用）
+- 模型#1 的任务只是丢掉与游戏无关的闲聊；明显没有信息量的发言在本地先去掉，少发 token
+- 规则（均可配置，见 PrefilterRules / load_prefilter_rules）：
+    media    表情/图片等占位符、emoji，去掉后没有文字
+    url      只有链接
+    mention  只有 @某人
+    stop     停用语（“好的”“新年快乐”“请使用最新版手机QQ体验新功能”等，忽略标点和大小写）
+    short    很短的回复（有效字符 ≤ min_chars，如“对”“？”；或同一个字重复，如“哈哈哈”“666”）
+- 词典保护：用话题簇白名单（话题簇名称 + 相关描述）的二元组当游戏词典，
+  命中 ≥ keep_score 个词的短回复不会被删掉（如“闪退”“卡关”）；停用语是显式配置的，不受保护
+  白名单文件按优先级取：规则文件里的 whitelist_paths（相对路径相对规则文件）> 环境变量 PREFILTER_WHITELIST
+  （多个用 os.pathsep 分隔）> 仓库里研发侧目录下的两份（只有源码 / pip install -e . 布局下才有）；
+  一条词典都没读到时打印警告，此时短回复不受保护
+- 只影响送进模型#1 的行；热度统计、观点回溯仍用完整的原始发言
+- 与模型#1 的判定对比见 bench_prefilter.py
+"""
+from __future__ import annotations
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .message_store import MessageStore, as_message_store
+
+HERE = Path(__file__).parent
+WHITELIST_ENV = "PREFILTER_WHITELIST"
+# 话题簇白名单（供研发侧流程维护）；core 不是从仓库源码安装时这两个文件不存在
+DEFAULT_WHITELIST_PATHS = [
+    HERE.parent / "玩家发言分类（供研发侧）" / "话提簇白名单q1.jsonl",
+    HERE.parent / "玩家发言分类（供研发侧）" / "话提簇白名单q2.jsonl",
+]
+
+DEFAULT_STOP_PHRASES = [
+    "+1", "冲", "蹲", "up", "哈", "嘿", "哦",  # load_and_process 原有的灌水词
+    "好的", "好吧", "好滴", "是的", "对的", "对啊", "对呀", "确实", "可以", "行吧", "没事",
+    "收到", "谢谢", "感谢", "谢谢大佬", "好的谢谢", "ok", "okok", "欧克", "欧克欧克", "彳亍",
+    "嗯嗯", "哦哦", "嗷嗷", "啊这", "我靠", "卧槽", "好家伙", "笑死", "笑死我了", "嘻嘻",
+    "原来如此", "不知道", "我看看", "等一下", "稍等", "在吗", "早", "早上好", "早安", "晚安",
+    "午安", "新年快乐", "元旦快乐", "圣诞快乐", "签到", "老板大气",
+    "请使用最新版手机qq体验新功能",
+]
+
+# 兼容 QQ 导出里的 [图片] [表情] [菜汪] 之类占位符
+_BRACKET_TOKEN_PAT = re.compile(r"\[[^\[\]\s]{1,12}\]")
+_URL_PAT = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+_MENTION_PAT = re.compile(r"@\S+")
+_EMOJI_PAT = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+# 有效字符：中日韩文字、字母、数字（标点/空白/符号都不算）
+_CORE_CHAR_PAT = re.compile(r"[0-9A-Za-z\u3400-\u9fff\uf900-\ufaff]")
+_CJK_RUN_PAT = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]{2,}")
+
+REASONS = ("media", "url", "mention", "stop", "short")
+
+
+def default_whitelist_paths() -> List[str]:
+    """环境变量 PREFILTER_WHITELIST（os.pathsep 分隔）优先，否则用仓库里的 DEFAULT_WHITELIST_PATHS"""
+    env = os.environ.get(WHITELIST_ENV, "").strip()
+    if env:
+        return [p.strip() for p in env.split(os.pathsep) if p.strip()]
+    return [str(p) for p in DEFAULT_WHITELIST_PATHS]
+
+
+@dataclass
+class PrefilterRules:
+    stop_phrases: List[str] = field(default_factory=lambda: list(DEFAULT_STOP_PHRASES))
+    drop_media_only: bool = True
+    drop_url_only: bool = True
+    drop_mention_only: bool = True
+    # 有效字符数 ≤ min_chars 视为短回复；0 关闭
+    min_chars: int = 1
+    # 同一个字重复（哈哈哈 / ？？？ / 666）视为短回复
+    drop_repeated_char: bool = True
+    # 词典：话题簇白名单文件 + 额外关键词
+    whitelist_paths: List[str] = field(default_factory=default_whitelist_paths)
+    extra_keywords: List[str] = field(default_factory=list)
+    # 出现在超过这个比例的白名单条目里的二元组太泛（如“游戏”“相关”），不进词典
+    max_term_df: float = 0.2
+    # 命中词典词数 ≥ keep_score 的短回复不删除；0 关闭词典保护
+    keep_score: int = 1
+
+    def __post_init__(self):
+        self._stop_set = {normalize_core(s) for s in self.stop_phrases if s}
+        self._keywords = tuple(k.strip().lower() for k in self.extra_keywords if k and k.strip())
+        self._lexicon: Optional[frozenset] = None
+
+    @property
+    def lexicon(self) -> frozenset:
+        """白名单二元组词典（懒加载，只读一次文件）"""
+        if self._lexicon is None:
+            self._lexicon = build_lexicon(self.whitelist_paths, self.max_term_df)
+            if not self._lexicon and not self._keywords and self.keep_score > 0:
+                tried = "、".join(str(p) for p in self.whitelist_paths) or "（未配置）"
+                print(f"⚠️ [预过滤] 没有读到话题簇白名单词典，短回复不受词典保护: {tried}"
+                      f"（用规则文件的 whitelist_paths 或环境变量 {WHITELIST_ENV} 指定）")
+        return self._lexicon
+
+    def score(self, text: str) -> int:
+        """发言命中的不同词典词数（白名单二元组 + 额外关键词子串）"""
+        if not text:
+            return 0
+        lowered = text.lower()
+        return len(_bigrams(text) & self.lexicon) + sum(1 for k in self._keywords if k in lowered)
+
+
+def load_prefilter_rules(path: Optional[Union[str, Path]] = None) -> PrefilterRules:
+    """
+    path 为 JSON 文件：只写需要覆盖的字段，其余用默认值，例如
+        {"min_chars": 2, "extra_keywords": ["抽卡", "殖装"], "whitelist_paths": ["话提簇白名单q1.jsonl"]}
+    whitelist_paths 里的相对路径相对规则文件所在目录。path 为 None 时全部用默认值。
+    """
+    if path is None:
+        return PrefilterRules()
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    known = {f.name for f in fields(PrefilterRules)}
+    unknown = set(cfg) - known
+    if unknown:
+        raise ValueError(f"未知的预过滤配置项: {sorted(unknown)}")
+    if "whitelist_paths" in cfg:
+        base = Path(path).parent
+        cfg["whitelist_paths"] = [str(base / p) for p in cfg["whitelist_paths"]]
+    return PrefilterRules(**cfg)
+
+
+# ==================== 词典 ====================
+
+def _bigrams(text: str) -> set:
+    grams = set()
+    for run in _CJK_RUN_PAT.findall(text or ""):
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def build_lexicon(
+    whitelist_paths: Iterable[Union[str, Path]],
+    max_term_df: float = 0.2,
+) -> frozenset:
+    """话题簇白名单 → 中文二元组词典（去掉过于常见的二元组）"""
+    docs: List[set] = []
+    for p in whitelist_paths:
+        p = Path(p)
+        if not p.exists():
+            continue
+        with p.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                text = f"{item.get('话题簇名称') or ''} {item.get('相关描述') or ''}"
+                docs.append(_bigrams(text))
+
+    df = Counter(g for d in docs for g in d)
+    limit = max(1, int(max_term_df * len(docs)))
+    return frozenset(g for g, n in df.items() if n <= limit)
+
+
+# ==================== 单条判定 ====================
+
+def normalize_core(text: str) -> str:
+    """只留有效字符（中日韩文字/字母/数字），小写"""
+    return "".join(_CORE_CHAR_PAT.findall(text or "")).lower()
+
+
+def message_text(msg: Dict[str, Any]) -> str:
+    """取 玩家消息 / 客服消息 / 研发消息 中存在的那个"""
+    for key in ("玩家消息", "客服消息", "研发消息"):
+        if key in msg:
+            return msg.get(key) or ""
+    return ""
+
+
+def strip_noise(text: str) -> str:
+    """去掉链接、[图片]/[表情] 占位符和 @某人，剩下的才是发言本身"""
+    rest = _URL_PAT.sub(" ", text or "")
+    rest = _BRACKET_TOKEN_PAT.sub(" ", rest)
+    return _MENTION_PAT.sub(" ", rest)
+
+
+def classify_message(text: str, rules: PrefilterRules) -> Optional[str]:
+    """返回删除原因（REASONS 之一），保留返回 None"""
+    has_url = bool(_URL_PAT.search(text))
+    has_media = bool(_BRACKET_TOKEN_PAT.search(text) or _EMOJI_PAT.search(text))
+    has_mention = bool(_MENTION_PAT.search(text))
+
+    rest = strip_noise(text)
+    core = normalize_core(rest)
+
+    if not core:
+        if has_url and rules.drop_url_only:
+            return "url"
+        if has_media and rules.drop_media_only:
+            return "media"
+        if has_mention and rules.drop_mention_only:
+            return "mention"
+        return "short" if rules.min_chars > 0 else None
+
+    if core in rules._stop_set:
+        return "stop"
+    if not ((len(core) <= rules.min_chars) or (rules.drop_repeated_char and len(set(core)) == 1)):
+        return None
+    # 短回复里命中游戏词典的（“闪退”“卡关”）保留
+    if rules.keep_score > 0 and rules.score(rest) >= rules.keep_score:
+        return None
+    return "short"
+
+
+# ==================== 批量 ====================
+
+def prefilter_positions(
+    source: Union[MessageStore, Iterable[str]],
+    rules: Optional[PrefilterRules] = None,
+) -> Tuple[List[int], Dict[str, Any]]:
+    """
+    返回 (保留的下标列表, 报告)。
+    报告：{"total", "kept", "removed", "by_reason": {原因: 条数}, "removed_positions": {原因: [下标...]}}
+    """
+    store = as_message_store(source)
+    rules = rules or PrefilterRules()
+
+    kept: List[int] = []
+    removed: Dict[str, List[int]] = {r: [] for r in REASONS}
+    # 同一句话只判定一次（“[图片]”“好的”会重复成百上千次）
+    verdicts: Dict[str, Optional[str]] = {}
+    for pos, msg in enumerate(store.messages):
+        text = message_text(msg)
+        if text not in verdicts:
+            verdicts[text] = classify_message(text, rules)
+        reason = verdicts[text]
+        if reason is None:
+            kept.append(pos)
+        else:
+            removed[reason].append(pos)
+
+    report = {
+        "total": len(store),
+        "kept": len(kept),
+        "removed": len(store) - len(kept),
+        "by_reason": {r: len(v) for r, v in removed.items()},
+        "removed_positions": removed,
+    }
+    return kept, report
+
+
+def prefilter_store(
+    source: Union[MessageStore, Iterable[str]],
+    rules: Optional[PrefilterRules] = None,
+    verbose: bool = True,
+) -> Tuple[MessageStore, Dict[str, Any]]:
+    """预过滤后的子 store（原顺序、原 _idx）+ 报告"""
+    store = as_message_store(source)
+    kept, report = prefilter_positions(store, rules)
+    if verbose:
+        print(format_report(report))
+    return store.take(kept), report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    total = report["total"] or 1
+    parts = "，".join(f"{r} {n}" for r, n in report["by_reason"].items() if n)
+    return (
+        f"🧹 [预过滤] 移除 {report['removed']}/{report['total']} 条"
+        f"（{report['removed'] / total:.1%}）" + (f"：{parts}" if parts else "")
+    )
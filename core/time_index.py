@@ -0,0 +1,131 @@
+"""
+按天的发言时间索引（“日期 + 多段时间轴”查询用二分查找）
+- 每个发言日期一组 int64 秒数（当天 0 点起）+ 原始下标，按时间排序，只建一次
+- 单段查询 = 两次 searchsorted，与消息总数无关；多天版本窗口只会多几组数组
+- 时间比较为闭区间 [start, end]，与 match_dialogs_by_time 原来的 start <= t <= end 一致
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def time_to_seconds(ts: Any) -> Optional[int]:
+    """
+    'HH:MM:SS' → 当天秒数；解析规则同 datetime.strptime(ts, "%H:%M:%S")，失败返回 None。
+    标准 8 位格式走切片快路径，其余（如单位数小时）回退 strptime。
+    """
+    if not isinstance(ts, str):
+        return None
+    if len(ts) == 8 and ts[2] == ":" and ts[5] == ":":
+        hh, mm, ss = ts[0:2], ts[3:5], ts[6:8]
+        if hh.isdigit() and mm.isdigit() and ss.isdigit():
+            h, m, s = int(hh), int(mm), int(ss)
+            if h < 24 and m < 60 and s < 60:
+                return h * 3600 + m * 60 + s
+            return None
+    try:
+        t = datetime.strptime(ts, "%H:%M:%S")
+    except (ValueError, TypeError):
+        return None
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+class DayTimeIndex:
+    """
+    messages: 已解析的发言 dict 列表（含 发言日期 / 发言时间）。
+    查询结果是 messages 中的下标，调用方按需取原对象或原文行。
+    """
+
+    def __init__(
+        self,
+        messages: Sequence[Dict[str, Any]],
+        date_key: str = "发言日期",
+        time_key: str = "发言时间",
+    ):
+        dates = [msg.get(date_key) or "" for msg in messages]
+        secs = [time_to_seconds(msg.get(time_key) or "") for msg in messages]
+        self._days = self._build(dates, secs)
+
+    @classmethod
+    def from_columns(cls, dates: Sequence[str], seconds: Sequence[Optional[int]]) -> "DayTimeIndex":
+        """已有按列的 日期 / 秒数（None 或负数表示时间无效）时直接建，不再逐条解析"""
+        obj = cls.__new__(cls)
+        obj._days = cls._build(dates, seconds)
+        return obj
+
+    @staticmethod
+    def _build(dates: Sequence[str], seconds: Sequence[Optional[int]]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        buckets: Dict[str, Tuple[List[int], List[int]]] = {}
+        for pos, (day, sec) in enumerate(zip(dates, seconds)):
+            if sec is None or sec < 0:
+                continue
+            secs, poss = buckets.setdefault(day, ([], []))
+            secs.append(sec)
+            poss.append(pos)
+
+        # 稳定排序：同一秒内保持原始顺序
+        days: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for day, (secs, poss) in buckets.items():
+            s = np.asarray(secs, dtype=np.int64)
+            p = np.asarray(poss, dtype=np.int64)
+            order = np.argsort(s, kind="stable")
+            days[day] = (s[order], p[order])
+        return days
+
+    def __contains__(self, date_str: str) -> bool:
+        return date_str in self._days
+
+    def day_count(self, date_str: str) -> int:
+        day = self._days.get(date_str)
+        return 0 if day is None else len(day[0])
+
+    def day_bounds(self, date_str: str) -> Optional[Tuple[int, int]]:
+        """当天最早/最晚发言的秒数；当天无发言返回 None"""
+        day = self._days.get(date_str)
+        if day is None or not len(day[0]):
+            return None
+        return int(day[0][0]), int(day[0][-1])
+
+    def day_positions(self, date_str: str) -> np.ndarray:
+        """当天所有（时间有效的）发言下标，按原始顺序"""
+        day = self._days.get(date_str)
+        return np.empty(0, dtype=np.int64) if day is None else np.sort(day[1])
+
+    def range_positions(self, date_str: str, start_sec: int, end_sec: int) -> np.ndarray:
+        """单段 [start_sec, end_sec] 命中的下标（按原始顺序）；start > end 时为空"""
+        day = self._days.get(date_str)
+        if day is None or start_sec > end_sec:
+            return np.empty(0, dtype=np.int64)
+        secs, poss = day
+        lo = np.searchsorted(secs, start_sec, side="left")
+        hi = np.searchsorted(secs, end_sec, side="right")
+        return np.sort(poss[lo:hi])
+
+    def match_positions(
+        self,
+        date_str: str,
+        ranges: Iterable[Tuple[int, int]],
+        unique: bool = True,
+    ) -> List[int]:
+        """
+        多段查询：
+        - unique=True：各段并集，去重后按原始顺序（一条发言落在多段里只算一次）
+        - unique=False：逐段拼接（段内按原始顺序），重叠部分重复出现
+        """
+        parts = [self.range_positions(date_str, a, b) for a, b in ranges]
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return []
+        if unique:
+            return np.unique(np.concatenate(parts)).tolist()
+        return np.concatenate(parts).tolist()
+
+
+def dt_range_to_seconds(start_dt: datetime, end_dt: datetime) -> Tuple[int, int]:
+    """parse_time_range 的 (start_dt, end_dt) → 当天秒数区间"""
+    return (
+        start_dt.hour * 3600 + start_dt.minute * 60 + start_dt.second,
+        end_dt.hour * 3600 + end_dt.minute * 60 + end_dt.second,
+    )
@@ -0,0 +1,101 @@
+"""
+按 token 预算切批（替代固定 BATCH_SIZE 行切片）
+- estimate_tokens：本地近似估算，不依赖分词器。中日韩文字/全角符号按 1 字 1 token，
+  其余字符按 4 字符 1 token，每行再加 1（换行）；对豆包/DeepSeek 系分词器偏保守
+- pack_batches：按顺序装批，每批估算 token 不超过预算；装满前在“对话间隙”处切开，
+  尽量不把同一段连续讨论拆到两批里
+- 模型#1 只原样输出输入里的部分行，输出 token ≤ 输入 token，预算不超过 MAX_TOKENS 就不会被截断
+"""
+from __future__ import annotations
+import re
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from .message_store import MessageStore, as_message_store
+
+# 默认单批预算（估算 token），略低于 MAX_TOKENS=16384，给系统提示外的包装文字留余量
+DEFAULT_BATCH_TOKENS = 15000
+# 至少装到预算的这个比例才允许提前在间隙处切批，避免切出很多小批
+DEFAULT_MIN_FILL = 0.7
+
+_WIDE_CHAR_PAT = re.compile(r"[　-〿㐀-鿿豈-﫿＀-￯]")
+# 跨天视为最大的间隙
+_DAY_BREAK = np.iinfo(np.int64).max
+
+
+def estimate_tokens(text: str) -> int:
+    """单行文本的 token 估算"""
+    if not text:
+        return 1
+    wide = len(_WIDE_CHAR_PAT.findall(text))
+    return wide + (len(text) - wide + 3) // 4 + 1
+
+
+def _gaps_before(store: MessageStore) -> np.ndarray:
+    """gaps[p] = 第 p 条与第 p-1 条之间的间隔秒数（跨天为最大值，时间无效为 0）"""
+    n = len(store)
+    gaps = np.zeros(n, dtype=np.int64)
+    if n < 2:
+        return gaps
+    secs = store.seconds
+    diff = secs[1:] - secs[:-1]
+    valid = (secs[1:] >= 0) & (secs[:-1] >= 0)
+    gaps[1:] = np.where(valid, np.maximum(diff, 0), 0)
+    gaps[1:][store.dates[1:] != store.dates[:-1]] = _DAY_BREAK
+    return gaps
+
+
+def pack_batches(
+    source: Union[MessageStore, Iterable[str]],
+    max_tokens: int = DEFAULT_BATCH_TOKENS,
+    max_lines: Optional[int] = None,
+    min_fill: float = DEFAULT_MIN_FILL,
+) -> List[List[str]]:
+    """
+    把 JSONL 行按顺序切成若干批：
+    - 每批估算 token ≤ max_tokens（单行就超预算的独占一批），行数 ≤ max_lines（None 不限）
+    - 下一行装不下时，在本批 [min_fill * 预算, 装满] 这段里找与前一条间隔最大的位置切开
+      （跨天优先，同样大小取更靠后的），新一批从这段讨论的开头开始
+    - 行顺序、内容不变，所有批次拼起来等于输入
+    """
+    store = as_message_store(source)
+    n = len(store)
+    if n == 0:
+        return []
+
+    tokens = np.fromiter((estimate_tokens(s) for s in store.lines), dtype=np.int64, count=n)
+    cum = np.concatenate(([0], np.cumsum(tokens)))  # cum[p] = 前 p 行的 token 数
+    gaps = _gaps_before(store)
+    line_cap = max_lines if max_lines and max_lines > 0 else n
+
+    batches: List[List[str]] = []
+    start = 0
+    while start < n:
+        # 能装下的最远位置 end（批次为 [start, end)），至少 1 行
+        end = int(np.searchsorted(cum, cum[start] + max_tokens, side="right")) - 1
+        end = max(start + 1, min(end, start + line_cap, n))
+        if end < n:
+            lo = int(np.searchsorted(cum, cum[start] + min_fill * max_tokens, side="left"))
+            lo = max(lo, start + 1)
+            if lo <= end:
+                window = gaps[lo:end + 1]
+                # 反向 argmax：同样的间隙取最靠后的，批次尽量装满
+                end = lo + len(window) - 1 - int(np.argmax(window[::-1]))
+        batches.append(store.lines[start:end])
+        start = end
+    return batches
+
+
+def batch_token_stats(batches: List[List[str]]) -> dict:
+    """各批估算 token 的概况（日志/对比用）"""
+    sizes = [sum(estimate_tokens(s) for s in b) for b in batches]
+    if not sizes:
+        return {"batches": 0, "lines": 0, "min_tokens": 0, "max_tokens": 0, "mean_tokens": 0}
+    return {
+        "batches": len(batches),
+        "lines": sum(len(b) for b in batches),
+        "min_tokens": min(sizes),
+        "max_tokens": max(sizes),
+        "mean_tokens": round(sum(sizes) / len(sizes)),
+    }
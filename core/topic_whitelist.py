@@ -0,0 +1,259 @@
+"""
+话题簇白名单存储（JSONL，一行一个 {"话题簇名称": ..., "相关描述": ...}）
+- 打开时读一次文件并建索引；add() 只追加新条目到文件、同步更新内存索引，不再每批重读整个文件、重建 set
+- 名称归一化索引：NFKC + 只留中日韩文字/字母/数字、小写（同 prefilter.normalize_core），
+  “殖装 保留”“殖装保留”“殖装保留！”算同一个话题簇，去重按归一化名称
+- 字符二元组倒排索引（名称、描述各一份）：二元组 → 含它的条目下标
+- select(candidates, k)：按与本批候选话题簇的字面相似度只取 top-k 条，
+  模型#4 的校正提示词只带这些条目，白名单再长，提示词里的白名单也不超过 k 条
+    名称相似度 = 二元组 Dice 系数，归一化名称完全相同记 1
+    描述相似度 = 候选二元组被描述覆盖的比例 × DESC_WEIGHT（只作补充）
+    条目得分取所有候选里的最大值；同分时先入白名单的在前
+  出现在超过 MAX_GRAM_DF 比例条目里的二元组（如描述里的“游戏”）太泛，检索时跳过，
+  单批检索开销只和候选数、常规二元组的命中数有关，不随白名单线性增长
+- 研发侧 notebook 用的 load_whitelist / update_and_save_whitelist / build_user_prompt_cluster_correct
+  也在这里（兼容旧式 list 白名单），各 model_classifyV1*.py 从这里导入
+"""
+from __future__ import annotations
+import json
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from .json_stream import iter_json_objects
+from .prefilter import normalize_core
+
+NAME_KEY = "话题簇名称"
+DESC_KEY = "相关描述"
+
+DEFAULT_TOP_K = 40       # 每批校正提示词最多带的白名单条数
+DEFAULT_MIN_SCORE = 0.2  # 低于这个相似度的条目不选
+DESC_WEIGHT = 0.5        # 描述命中的权重（相对名称）
+MAX_GRAM_DF = 0.2        # 超过这个比例的条目都含有的二元组不参与检索
+MIN_GRAM_LIMIT = 50      # 白名单很小时不跳过任何二元组
+
+
+def normalize_name(name: Any) -> str:
+    """话题簇名称归一化：全角转半角，只留中日韩文字/字母/数字，小写"""
+    return normalize_core(unicodedata.normalize("NFKC", str(name or "")))
+
+
+def _grams(norm: str) -> frozenset:
+    """字符二元组；单字名称用自身"""
+    if len(norm) < 2:
+        return frozenset([norm]) if norm else frozenset()
+    return frozenset(norm[i:i + 2] for i in range(len(norm) - 1))
+
+
+def clusters_in_output(model_output: str) -> List[str]:
+    """
+    模型#3 输出（JSONL / JSON 数组 / 带解释语都行）里出现的话题簇名称，去重保序。
+    "话题簇" 字段是列表时逐个展开。
+    """
+    names, seen = [], set()
+    for obj in iter_json_objects([model_output or ""]):
+        value = obj.get("话题簇")
+        for name in (value if isinstance(value, list) else [value]):
+            name = str(name or "").strip()
+            if name and name not in seen:
+                seen.add(name)
+                names.append(name)
+    return names
+
+
+class WhitelistStore:
+    """
+    用法：
+        store = WhitelistStore.load("话提簇白名单q1.jsonl")
+        picked = store.select(clusters_in_output(output_classify2), k=40)
+        store.add([{"话题簇名称": "殖装保留", "相关描述": "..."}])   # 追加写文件 + 更新索引
+    可当作条目（dict）的只读序列使用：len(store)、for item in store、store[i]。
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None, items: Optional[Iterable[Dict[str, Any]]] = None):
+        self.path = Path(path) if path is not None else None
+        self.items: List[Dict[str, Any]] = []
+        self._by_norm: Dict[str, int] = {}
+        self._name_grams: List[frozenset] = []
+        self._name_index: Dict[str, List[int]] = defaultdict(list)
+        self._desc_index: Dict[str, List[int]] = defaultdict(list)
+        if self.path is not None and self.path.exists():
+            self._load()
+        for item in items or []:
+            self._index(item)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "WhitelistStore":
+        return cls(path)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict[str, Any]]) -> "WhitelistStore":
+        """只在内存里建索引（不关联文件，add 不落盘）"""
+        return cls(None, items)
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 写到一半的行
+                if isinstance(item, dict):
+                    self._index(item)
+
+    def _index(self, item: Dict[str, Any]) -> bool:
+        """登记一条；名称为空或归一化后已存在时返回 False"""
+        norm = normalize_name(item.get(NAME_KEY))
+        if not norm or norm in self._by_norm:
+            return False
+        idx = len(self.items)
+        self.items.append(item)
+        self._by_norm[norm] = idx
+        grams = _grams(norm)
+        self._name_grams.append(grams)
+        for g in grams:
+            self._name_index[g].append(idx)
+        for g in _grams(normalize_name(item.get(DESC_KEY))):
+            self._desc_index[g].append(idx)
+        return True
+
+    # ==================== 序列接口 ====================
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __contains__(self, name: Any) -> bool:
+        return normalize_name(name) in self._by_norm
+
+    def get(self, name: Any) -> Optional[Dict[str, Any]]:
+        """按名称（归一化后）查条目"""
+        idx = self._by_norm.get(normalize_name(name))
+        return None if idx is None else self.items[idx]
+
+    # ==================== 写入 ====================
+
+    def add(self, new_items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """新增条目（按归一化名称去重），追加写文件，返回实际新增的条目"""
+        added = [item for item in new_items if self._index(item)]
+        if added and self.path is not None:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for item in added:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        return added
+
+    # ==================== 检索 ====================
+
+    def scores(self, candidates: Iterable[str]) -> Dict[int, float]:
+        """条目下标 → 与候选话题簇的最大相似度（只含有命中的条目）"""
+        best: Dict[int, float] = {}
+        limit = max(MIN_GRAM_LIMIT, int(MAX_GRAM_DF * len(self.items)))
+        for cand in candidates:
+            norm = normalize_name(cand)
+            if not norm:
+                continue
+            grams = _grams(norm)
+            name_hits: Dict[int, int] = defaultdict(int)
+            desc_hits: Dict[int, int] = defaultdict(int)
+            for g in grams:
+                for index, hits in ((self._name_index, name_hits), (self._desc_index, desc_hits)):
+                    postings = index.get(g, ())
+                    if len(postings) > limit:
+                        continue
+                    for idx in postings:
+                        hits[idx] += 1
+
+            local: Dict[int, float] = {}
+            for idx, n in name_hits.items():
+                local[idx] = 2.0 * n / (len(grams) + len(self._name_grams[idx]))
+            for idx, n in desc_hits.items():
+                s = DESC_WEIGHT * n / len(grams)
+                if s > local.get(idx, 0.0):
+                    local[idx] = s
+            exact = self._by_norm.get(norm)
+            if exact is not None:
+                local[exact] = 1.0
+
+            for idx, s in local.items():
+                if s > best.get(idx, 0.0):
+                    best[idx] = s
+        return best
+
+    def select(
+        self,
+        candidates: Iterable[str],
+        k: int = DEFAULT_TOP_K,
+        min_score: float = DEFAULT_MIN_SCORE,
+    ) -> List[Dict[str, Any]]:
+        """与候选话题簇最相近的至多 k 条（得分降序，同分按入库顺序）"""
+        scored = [(s, idx) for idx, s in self.scores(candidates).items() if s >= min_score]
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [self.items[idx] for _, idx in scored[:k]]
+
+
+# ==================== notebook 接口 ====================
+
+def load_whitelist(path: Union[str, Path]) -> WhitelistStore:
+    """读一次白名单并建索引（文件不存在时为空）；返回值可当 list[dict] 用：len / 遍历 / 下标"""
+    return WhitelistStore.load(path)
+
+
+def update_and_save_whitelist(path: Union[str, Path], current, new_items: List[Dict[str, Any]]):
+    """
+    新增话题簇追加写进白名单文件。current 为 WhitelistStore 时按归一化名称去重、增量更新索引；
+    传旧式 list 时按精确名称去重并原地 extend。
+    """
+    if isinstance(current, WhitelistStore):
+        if current.path is None:
+            current.path = Path(path)
+        added = current.add(new_items)
+    else:
+        existing_names = {item[NAME_KEY] for item in current}
+        added = [item for item in new_items if item[NAME_KEY] not in existing_names]
+        if added:
+            with open(path, "a", encoding="utf-8") as f:
+                for item in added:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            current.extend(added)
+
+    if added:
+        print(f"✅ 新增 {len(added)} 条话题簇至白名单")
+    else:
+        print("⚪ 无新增话题簇")
+
+    return current
+
+
+def build_user_prompt_cluster_correct(clustered_jsonl: str, whitelist, top_k: Optional[int] = DEFAULT_TOP_K) -> str:
+    """
+    whitelist 为 load_whitelist 返回的 WhitelistStore 时，只带与本批话题簇（模型#3 输出里的“话题簇”）
+    字面最相近的 top_k 条，白名单再长提示词也不膨胀；传 list 时临时建索引再选；top_k=None 带全量（旧行为）。
+    """
+    if top_k is None:
+        picked = list(whitelist)
+    else:
+        store = whitelist if isinstance(whitelist, WhitelistStore) else WhitelistStore.from_items(whitelist)
+        picked = store.select(clusters_in_output(clustered_jsonl), k=top_k)
+    if not whitelist:
+        whitelist_text = "[当前白名单为空，暂无参考命名]"
+    elif not picked:
+        whitelist_text = "[白名单中没有与本批话题簇相近的条目]"
+    else:
+        whitelist_text = "\n".join(json.dumps(x, ensure_ascii=False) for x in picked)
+    return (
+        "你是一位“话题簇命名校正专家”。对照白名单统一命名；不匹配则保留原名。\n"
+        "仅输出字段：发言日期、发言时间、玩家ID、玩家消息、分类标签、话题簇、话题簇描述。\n"
+        "命中白名单时：话题簇 = 白名单名称；话题簇描述 = 白名单相关描述。\n"
+        "未命中白名单时：话题簇保持输入值；话题簇描述沿用输入（若无则输出空字符串）。\n\n"
+        "【发言】：\n" + clustered_jsonl + "\n\n"
+        "【白名单】：\n" + whitelist_text + "\n"
+    )
@@ -12,6 +12,10 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
 
+# --- Ark 共享客户端（连接池 + 指数退避/Retry-After + 调用指标），来自仓库根目录的 core 包（pip install -e .） ---
+from core.ark_client import get_default_client
+
+
 ################模型调用，出结果###################
 
 def load_system_prompt(path: Path) -> str:
@@ -53,29 +57,23 @@ def call_ark_chat_completions(
     max_tokens: int = 32700,
     timeout: int = 600,
     retries: int = 2,
+    stage: str = "",
+    use_cache: bool = True,
 ) -> str:
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
-    last_err = None
-    for attempt in range(retries + 1):
-        try:
-            resp = requests.post(api_url, headers=headers, json=payload, timeout=timeout)
-            if resp.status_code != 200:
-                raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
-        except Exception as e:
-            last_err = e
-            time.sleep(1.2 * (attempt + 1))
-    raise RuntimeError(f"Ark API 调用失败: {last_err}")
+    # 走共享客户端：复用连接池，失败按指数退避 + 抖动重试，429 遵循 Retry-After
+    return get_default_client().call(
+        api_url=api_url,
+        api_key=api_key,
+        model=model,
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        retries=retries,
+        stage=stage,
+        use_cache=use_cache,
+    )
 
 def extract_valid_json_lines(text: str) -> T.List[str]:
     """
@@ -0,0 +1,349 @@
+"""
+postprocess_excel_by_topic 性能对比：旧版逐行切段（df.iloc + 标量 to_datetime）+ 逐段合并/标记  vs  整列切段 + 一次写回
+- 默认生成 50k 行的合成报表（五个 sheet，话题簇/时间/纯图片消息/NaT 混合），两种实现各跑一遍
+- 同时校验两者输出一致：每个 sheet 的单元格值、A 列合并区域和 A 列边框都要相同
+- 两个变体都比：V1（段间按段首时间）和 Copy1（段间按话题簇+段首时间、回填空发言时间，qun1/qun2 用的这个）
+- 只测切段本身：--runs-only（不读写 Excel，直接比 _iter_topic_runs）
+- 按 sheet 并行：--processes N（再跑一遍 postprocess_excel_by_topic_parallel，与单进程新版比单元格值和合并区域；
+  并行版整本重写，合并区域内 A 列边框是完整正文样式，不比边框）
+
+用法（在本目录下）：
+    python bench_postprocess.py
+    python bench_postprocess.py --rows 20000 --gap 60 --nat-policy break
+    python bench_postprocess.py --skip-legacy          # 旧版太慢时只测新版
+    python bench_postprocess.py --skip-legacy --processes 5
+    python bench_postprocess.py --variant copy1        # 只比 Copy1 变体
+"""
+from __future__ import annotations
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from model_classifyV1 import (
+    SHEET_NAMES, IntentReportBuilder, create_intent_excel_styled, postprocess_excel_by_topic,
+    postprocess_excel_by_topic_parallel,
+    _iter_topic_runs, _ensure_named_style, _pre_unmerge_and_fill_topic, _norm_topic,
+    _clear_topic_merges, _remove_all_drawings, _is_pure_image_msg, _strip_trailing_flag,
+    TOPIC_COL, TIME_COL, MSG_COL,
+)
+from model_classifyV1_Copy1 import postprocess_excel_by_topic as copy1_postprocess_excel_by_topic
+
+
+# ==================== 旧版实现（基线，勿改） ====================
+
+def legacy_iter_topic_runs(df: pd.DataFrame, gap_minutes: int, nat_policy: str = "skip"):
+    def _to_ts(x):
+        try:
+            return pd.to_datetime(x, errors="coerce")
+        except Exception:
+            return pd.NaT
+
+    n = len(df)
+    if n == 0:
+        return []
+
+    segs = []
+    start = 0
+    topic = str(df.iloc[0]["话题簇"] or "")
+    last_ts = _to_ts(df.iloc[0]["发言时间"])
+
+    for i in range(1, n):
+        cur_topic = str(df.iloc[i]["话题簇"] or "")
+        cur_ts = _to_ts(df.iloc[i]["发言时间"])
+
+        same_topic = (cur_topic == topic and cur_topic != "")
+        cont = False
+
+        if same_topic:
+            if pd.notna(cur_ts) and pd.notna(last_ts):
+                cont = (cur_ts - last_ts) <= pd.Timedelta(minutes=gap_minutes)
+                if cont:
+                    last_ts = cur_ts
+            elif pd.isna(cur_ts):
+                cont = (nat_policy != "break")
+            else:
+                if nat_policy == "break":
+                    cont = False
+                else:
+                    cont = True
+                    last_ts = cur_ts
+        else:
+            cont = False
+
+        if not cont:
+            segs.append((start, i - 1, topic))
+            start = i
+            topic = cur_topic
+            last_ts = cur_ts if pd.notna(cur_ts) else pd.NaT
+
+    segs.append((start, n - 1, topic))
+    return [(s, e, t) for (s, e, t) in segs if (t or "").strip()]
+
+
+def legacy_sort_merge_flag(ws, gap_minutes: int = 15, nat_policy: str = "skip", fill_nat_in_topic: bool = True,
+                           copy1: bool = False):
+    """copy1=True 为旧 model_classifyV1_Copy1 的版本：回填空发言时间、空消息写 ""，段间按 (话题簇, 段首时间) 排序"""
+    _pre_unmerge_and_fill_topic(ws)
+
+    rows = []
+    if ws.max_row >= 2:
+        for r in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=4, values_only=True):
+            if r is None or all(x in (None, "") for x in r):
+                continue
+            rows.append(r)
+    df = pd.DataFrame(rows, columns=["话题簇","发言时间","玩家ID","玩家消息"])
+    if df.empty:
+        if ws.max_row > 1:
+            ws.delete_rows(2, ws.max_row - 1)
+        _clear_topic_merges(ws); _remove_all_drawings(ws)
+        return
+
+    df["话题簇"] = df["话题簇"].apply(_norm_topic)
+    col = df["发言时间"].astype(str).str.replace(r"[/.]", "-", regex=True).str.strip()
+    ts  = pd.to_datetime(col, errors="coerce")
+    bad = ts.isna()
+    if bad.any():
+        ts2 = pd.to_datetime(df.loc[bad, "发言时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        ts.loc[bad] = ts2
+    df["_ts"] = ts
+
+    if fill_nat_in_topic:
+        def _safe_fill(s: pd.Series) -> pd.Series:
+            if s.notna().any():
+                return s.ffill().bfill()
+            return s
+        df["_ts"] = df.groupby("话题簇")["_ts"].transform(_safe_fill)
+
+    if copy1:
+        _time_is_empty = df["发言时间"].isna() | (df["发言时间"].astype(str).str.strip() == "")
+        mask_fill = _time_is_empty & df["_ts"].notna()
+        if mask_fill.any():
+            df.loc[mask_fill, "发言时间"] = df.loc[mask_fill, "_ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        df["玩家消息"] = df["玩家消息"].astype(object).where(df["玩家消息"].notna(), "")
+
+    df = df.sort_values(by=["话题簇", "_ts", "发言时间"], ascending=[True, True, True], kind="mergesort")
+
+    runs = legacy_iter_topic_runs(df[["发言时间","话题簇"]].copy(), gap_minutes, nat_policy)
+
+    parts = []
+    run_meta = []
+    for (s, e, t) in runs:
+        seg = df.iloc[s:e+1].copy()
+        seg = seg.sort_values(by=["_ts","发言时间"], ascending=[True, True], kind="mergesort")
+        parts.append(seg)
+        seg_ts = pd.to_datetime(seg["发言时间"], errors="coerce")
+        start_ts = seg_ts.iloc[0] if not seg_ts.empty else pd.NaT
+        run_meta.append((len(parts)-1, t if copy1 else "", start_ts))
+
+    run_meta.sort(key=lambda x: (x[1], pd.isna(x[2]), x[2]))
+    df_out = pd.concat([parts[i] for (i, _topic, _ts0) in run_meta], ignore_index=True)
+
+    if ws.max_row > 1:
+        ws.delete_rows(2, ws.max_row - 1)
+    style = _ensure_named_style(ws.parent)
+    for row in df_out.drop(columns=["_ts"]).itertuples(index=False, name=None):
+        ws.append(row)
+    for rr in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=4):
+        for cell in rr:
+            cell.style = style
+
+    runs_new = legacy_iter_topic_runs(
+        pd.DataFrame({
+            "发言时间": [ws.cell(row=r, column=TIME_COL).value  for r in range(2, ws.max_row+1)],
+            "话题簇":   [ws.cell(row=r, column=TOPIC_COL).value  for r in range(2, ws.max_row+1)],
+        }),
+        gap_minutes, nat_policy
+    )
+
+    _clear_topic_merges(ws)
+    for (s, e, _t) in runs_new:
+        r1, r2 = s + 2, e + 2
+        if r2 > r1:
+            ws.merge_cells(start_row=r1, start_column=TOPIC_COL, end_row=r2, end_column=TOPIC_COL)
+
+    for (s, e, _t) in runs_new:
+        r1, r2 = s + 2, e + 2
+        has_img_only = False
+        for r in range(r1, r2 + 1):
+            msg = ws.cell(row=r, column=MSG_COL).value
+            if _is_pure_image_msg(msg):
+                has_img_only = True
+                ws.cell(row=r, column=MSG_COL).value = _strip_trailing_flag(msg) + " 🖼️"
+        if has_img_only:
+            tval = ws.cell(row=r1, column=TOPIC_COL).value
+            ws.cell(row=r1, column=TOPIC_COL).value = _strip_trailing_flag(tval) + " 🖼️"
+
+    _remove_all_drawings(ws)
+
+
+def legacy_postprocess_excel_by_topic(excel_path: str, gap_minutes: int = 15, nat_policy: str = "skip", copy1: bool = False):
+    wb = load_workbook(excel_path, data_only=True)
+    _ensure_named_style(wb)
+    for name in wb.sheetnames:
+        legacy_sort_merge_flag(wb[name], gap_minutes=gap_minutes, nat_policy=nat_policy, copy1=copy1)
+    wb.save(excel_path)
+
+
+# ==================== 合成数据 ====================
+
+def synthetic_records(n_rows: int, n_topics: int = 400, seed: int = 0, blank_topics: bool = False) -> list:
+    """
+    模拟模型输出：话题簇偏斜分布、时间跨 3 天、约 5% 纯图片消息、约 1% 时间缺失/格式不对。
+    blank_topics=True 时约 1% 没有话题簇。整本对比时不带空簇：pandas>=3 读出的空单元格是 NaN，
+    旧版 _norm_topic 会把它变成字面量 "nan" 话题，新版按空簇处理（丢弃），两者本就不同。
+    """
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 5)
+    topics = [f"话题{i:03d}" for i in range(n_topics)]
+    weights = [1.0 / (i + 1) for i in range(n_topics)]
+    out = []
+    for i in range(n_rows):
+        ts = base + timedelta(seconds=rng.randint(0, 3 * 86400))
+        r = rng.random()
+        if r < 0.005:
+            t = None
+        elif r < 0.01:
+            t = ts.strftime("%Y/%m/%d %H:%M")  # 旧导出里的斜杠格式
+        else:
+            t = ts.strftime("%Y-%m-%d %H:%M:%S")
+        msg = rng.choice(["[图片]", "[表情] [图片]", "[动画表情]"]) if rng.random() < 0.05 else f"玩家消息 {i}"
+        tag = [] if blank_topics and rng.random() < 0.01 else [rng.choices(topics, weights)[0]]
+        out.append({"一级分类": rng.randint(1, len(SHEET_NAMES)), "话题簇": tag, "发言时间": t,
+                    "玩家ID": f"玩家{rng.randint(1, 3000)}", "玩家消息": msg})
+    return out
+
+
+def build_workbook(path: Path, n_rows: int, seed: int = 0):
+    create_intent_excel_styled(str(path))
+    builder = IntentReportBuilder()
+    builder.add(synthetic_records(n_rows, seed=seed))
+    builder.write(str(path))
+
+
+# ==================== 对比 ====================
+
+def _snapshot(path: Path) -> dict:
+    wb = load_workbook(path)
+    try:
+        return {
+            name: (
+                [r for r in wb[name].iter_rows(min_row=2, max_col=4, values_only=True)],
+                sorted(str(r) for r in wb[name].merged_cells.ranges),
+                [tuple(getattr(c.border, side).style for side in ("left", "right", "top", "bottom"))
+                 for (c,) in wb[name].iter_rows(min_row=2, max_col=TOPIC_COL)],
+            )
+            for name in wb.sheetnames
+        }
+    finally:
+        wb.close()
+
+
+def _assert_same(a: dict, b: dict, borders: bool = True):
+    assert a.keys() == b.keys(), (a.keys(), b.keys())
+    for name in a:
+        rows_a, merges_a, borders_a = a[name]
+        rows_b, merges_b, borders_b = b[name]
+        assert len(rows_a) == len(rows_b), f"{name}: 行数 {len(rows_a)} != {len(rows_b)}"
+        for i, (ra, rb) in enumerate(zip(rows_a, rows_b)):
+            assert ra == rb, f"{name} 第 {i + 2} 行不一致：{ra} != {rb}"
+        assert merges_a == merges_b, f"{name}: 合并区域不一致（{len(merges_a)} vs {len(merges_b)}）"
+        if borders:
+            assert borders_a == borders_b, f"{name}: A 列边框不一致"
+
+
+def bench_runs(n_rows: int, gap: int, nat_policy: str, repeat: int):
+    df = pd.DataFrame([
+        {"话题簇": (r["话题簇"] or [""])[0], "发言时间": r["发言时间"]} for r in synthetic_records(n_rows, blank_topics=True)
+    ]).sort_values(["话题簇", "发言时间"], kind="mergesort", na_position="last").reset_index(drop=True)
+
+    def _best(fn):
+        best, out = float("inf"), None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn(df, gap, nat_policy)
+            best = min(best, time.perf_counter() - t0)
+        return best, out
+
+    t_new, runs_new = _best(_iter_topic_runs)
+    t_old, runs_old = _best(legacy_iter_topic_runs)
+    assert runs_new == runs_old, "切段结果不一致"
+    print(f"切段 {n_rows} 行（{len(runs_new)} 段）：旧版 {t_old:.3f}s，新版 {t_new:.3f}s，{t_old / t_new:.1f}x")
+
+
+VARIANTS = {
+    # 名字: (新版入口, 旧版 copy1 参数, 并行版额外参数)
+    "v1": (postprocess_excel_by_topic, False, {}),
+    "copy1": (copy1_postprocess_excel_by_topic, True, {"order_runs_by_topic": True, "fill_blank_time": True}),
+}
+
+
+def bench_variant(name: str, src: Path, tmp: str, args):
+    new_fn, legacy_copy1, parallel_opts = VARIANTS[name]
+    new_path = Path(tmp) / f"new_{name}.xlsx"
+    shutil.copy(src, new_path)
+    t0 = time.perf_counter()
+    new_fn(str(new_path), gap_minutes=args.gap, nat_policy=args.nat_policy)
+    t_new = time.perf_counter() - t0
+    print(f"[{name}] 新版：{t_new:.1f}s")
+
+    if args.processes > 1:
+        par_path = Path(tmp) / f"parallel_{name}.xlsx"
+        shutil.copy(src, par_path)
+        t0 = time.perf_counter()
+        postprocess_excel_by_topic_parallel(str(par_path), args.gap, args.nat_policy, processes=args.processes,
+                                            **parallel_opts)
+        t_par = time.perf_counter() - t0
+        print(f"[{name}] 并行（{args.processes} 进程）：{t_par:.1f}s（比单进程快 {t_new / t_par:.1f}x）")
+        _assert_same(_snapshot(new_path), _snapshot(par_path), borders=False)
+        print(f"✅ [{name}] 并行输出与单进程一致（单元格值 + A 列合并区域）")
+
+    if args.skip_legacy:
+        return
+    old_path = Path(tmp) / f"old_{name}.xlsx"
+    shutil.copy(src, old_path)
+    t0 = time.perf_counter()
+    legacy_postprocess_excel_by_topic(str(old_path), gap_minutes=args.gap, nat_policy=args.nat_policy,
+                                      copy1=legacy_copy1)
+    t_old = time.perf_counter() - t0
+    print(f"[{name}] 旧版：{t_old:.1f}s（新版快 {t_old / t_new:.1f}x）")
+
+    _assert_same(_snapshot(old_path), _snapshot(new_path))
+    print(f"✅ [{name}] 输出一致（单元格值 + A 列合并区域 + 边框）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="postprocess_excel_by_topic 性能对比")
+    parser.add_argument("--rows", type=int, default=50000, help="合成报表总行数")
+    parser.add_argument("--gap", type=int, default=60, help="gap_minutes")
+    parser.add_argument("--nat-policy", choices=["skip", "break"], default="skip")
+    parser.add_argument("--repeat", type=int, default=3, help="--runs-only 时每种实现跑几次取最小值")
+    parser.add_argument("--runs-only", action="store_true", help="只比切段函数，不读写 Excel")
+    parser.add_argument("--skip-legacy", action="store_true", help="不跑旧版（也就不校验一致性）")
+    parser.add_argument("--processes", type=int, default=0, help=">1 时再测按 sheet 并行的版本")
+    parser.add_argument("--variant", choices=["v1", "copy1", "both"], default="both",
+                        help="对比哪个模块的后处理（V1 / Copy1 行为不同）")
+    args = parser.parse_args()
+
+    if args.runs_only:
+        bench_runs(args.rows, args.gap, args.nat_policy, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "synthetic.xlsx"
+        t0 = time.perf_counter()
+        build_workbook(src, args.rows)
+        print(f"生成 {args.rows} 行合成报表：{time.perf_counter() - t0:.1f}s")
+
+        for name in (VARIANTS if args.variant == "both" else [args.variant]):
+            bench_variant(name, src, tmp, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,16 @@ from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedSty
 
 import re
 
+# --- Ark 共享客户端（连接池 + 指数退避/Retry-After + 调用指标），来自仓库根目录的 core 包（pip install -e .） ---
+from core.ark_client import get_default_client
+# --- 话题簇白名单：读写 + 按批只取相近 top-k 的校正提示词，来自 core.topic_whitelist ---
+from core.topic_whitelist import (  # noqa: F401  notebook 从本模块导入这些名字
+    load_whitelist,
+    update_and_save_whitelist,
+    build_user_prompt_cluster_correct,
+)
+
+
 ################模型调用，出结果###################
 
 def load_system_prompt(path: Path) -> str:
@@ -46,20 +56,6 @@ def build_user_prompt_classify(jsonl_block: str) -> str:
         "【输入】：\n" + jsonl_block
     )
 
-def build_user_prompt_cluster_correct(clustered_jsonl: str, whitelist: List[Dict]) -> str:
-    whitelist_text = "[当前白名单为空，暂无参考命名]" if not whitelist else "\n".join(
-        json.dumps(x, ensure_ascii=False) for x in whitelist
-    )
-    return (
-        "你是一位“话题簇命名校正专家”。对照白名单统一命名；不匹配则保留原名。\n"
-        "仅输出字段：发言日期、发言时间、玩家ID、玩家消息、分类标签、话题簇、话题簇描述。\n"
-        "命中白名单时：话题簇 = 白名单名称；话题簇描述 = 白名单相关描述。\n"
-        "未命中白名单时：话题簇保持输入值；话题簇描述沿用输入（若无则输出空字符串）。\n\n"
-        "【发言】：\n" + clustered_jsonl + "\n\n"
-        "【白名单】：\n" + whitelist_text + "\n"
-    )
-
-
 def call_ark_chat_completions(
     api_url: str,
     api_key: str,
@@ -70,29 +66,23 @@ def call_ark_chat_completions(
     max_tokens: int = 32700,
     timeout: int = 600,
     retries: int = 2,
+    stage: str = "",
+    use_cache: bool = True,
 ) -> str:
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
-    last_err = None
-    for attempt in range(retries + 1):
-        try:
-            resp = requests.post(api_url, headers=headers, json=payload, timeout=timeout)
-            if resp.status_code != 200:
-                raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
-        except Exception as e:
-            last_err = e
-            time.sleep(1.2 * (attempt + 1))
-    raise RuntimeError(f"Ark API 调用失败: {last_err}")
+    # 走共享客户端：复用连接池，失败按指数退避 + 抖动重试，429 遵循 Retry-After
+    return get_default_client().call(
+        api_url=api_url,
+        api_key=api_key,
+        model=model,
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        retries=retries,
+        stage=stage,
+        use_cache=use_cache,
+    )
 
 def extract_valid_json_lines(text: str) -> T.List[str]:
     """
@@ -198,12 +188,6 @@ def jsonl_to_dataframe_with_intent(jsonl_text: str) -> pd.DataFrame:
     return df[["话题簇","发言时间","玩家ID","玩家消息","一级分类"]]
 
 ##########################话提簇数据库################################
-def load_whitelist(path: Path) -> list[dict]:
-    if not path.exists():
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
-
 def extract_clusters_from_output(output_text: str) -> list[dict]:
     import json, re
     if not output_text:
@@ -244,29 +228,17 @@ def extract_clusters_from_output(output_text: str) -> list[dict]:
     return results
 
 
-def update_and_save_whitelist(path: Path, current: list[dict], new_items: list[dict]) -> list[dict]:
-    existing_names = {item["话题簇名称"] for item in current}
-    added = [item for item in new_items if item["话题簇名称"] not in existing_names]
-
-    if added:
-        with open(path, "a", encoding="utf-8") as f:
-            for item in added:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-        current.extend(added)
-        print(f"✅ 新增 {len(added)} 条话题簇至白名单")
-    else:
-        print("⚪ 无新增话题簇")
-
-    return current
-
-
 ##########################导入Excel格式要求###########################
 
+import os
+import tempfile
+from copy import copy
 from pathlib import Path
 from typing import List, Dict, Any
 import pandas as pd
 import unicodedata
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
@@ -392,94 +364,227 @@ def _normalize_records(records: List[Dict[str, Any]]) -> pd.DataFrame:
     return df[["话题簇","一级分类", "发言时间", "玩家ID", "玩家消息" ]]
 
 
-########################## 写入 + 按二级标签热度排序 ###########################
-def _rewrite_sheet_sorted_by_tag(wb, sheet_name: str, new_rows_df: pd.DataFrame):
+########################## 排序规则 ###########################
+def _sort_report_rows(df_all: pd.DataFrame) -> pd.DataFrame:
     """
-    合并历史+新增后，按：
-      1) 二级标签 升序（空标签放最后）
-      2) 发言时间 升序
-    重写正文区域（A2:D*）。
+    sheet 正文排序：
+      1) 话题簇 升序（空标签放最后）
+      2) 发言时间 升序（无法解析的时间排后，通过原字符串兜底）
     """
-    ws = wb[sheet_name]
-    body_style_name = _ensure_named_style(wb)
-
-    # 读取既有正文（A2:D*）
-    existing = []
-    if ws.max_row >= 2:
-        for r in ws.iter_rows(min_row=2, max_row=ws.max_row,
-                              min_col=1, max_col=len(HEADERS), values_only=True):
-            if r is None or all(x in (None, "") for x in r):
-                continue
-            existing.append(r)
-
-    cols = HEADERS  # ["发言时间","玩家ID","玩家消息","二级标签"]
-    df_exist = pd.DataFrame(existing, columns=cols) if existing else pd.DataFrame(columns=cols)
-
-    # 合并历史+新增
-    df_all = pd.concat([df_exist, new_rows_df[cols]], ignore_index=True)
-    if df_all.empty:
-        if ws.max_row > 1:
-            ws.delete_rows(2, ws.max_row - 1)
-        return
-
-    # 规范化：标签去首尾空白；构造“是否空标签”标记；解析时间
+    df_all = df_all.copy()
     df_all["话题簇"] = df_all["话题簇"].astype(str).str.strip()
     df_all["_tag_blank"] = df_all["话题簇"].eq("") | df_all["话题簇"].isna()
-    df_all["_ts"] =pd.to_datetime(df_all["发言时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
-
-    # 关键排序：非空标签在前 -> 标签升序 -> 时间升序（无法解析的时间排后，通过原字符串兜底）
-    df_all = df_all.sort_values(
+    df_all["_ts"] = pd.to_datetime(df_all["发言时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    return df_all.sort_values(
         by=["_tag_blank", "话题簇", "_ts", "发言时间"],
         ascending=[True, True, True, True],
         kind="mergesort"  # 稳定排序
     ).drop(columns=["_tag_blank", "_ts"])
 
-    # 清正文并写回
-    if ws.max_row > 1:
-        ws.delete_rows(2, ws.max_row - 1)
-    for row in df_all.itertuples(index=False, name=None):
-        ws.append(row)
 
-    # 套正文样式
-    if ws.max_row >= 2:
-        for r in ws.iter_rows(min_row=2, max_row=ws.max_row,
-                              min_col=1, max_col=len(HEADERS)):
-            for cell in r:
-                cell.style = body_style_name
+########################## 报表构建：跨批次累积，最后一次写出 ###########################
+def _cell_value(x):
+    """pandas 缺失值（NaN / NA / NaT）写成空单元格"""
+    if x is None:
+        return None
+    try:
+        return None if pd.isna(x) else x
+    except (TypeError, ValueError):
+        return x
 
 
+def _read_report_rows(excel_path: str) -> Dict[str, pd.DataFrame]:
+    """只读模式读出已有报表各 sheet 的正文（A2:D*），跳过空行"""
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        out = {}
+        for name in SHEET_NAMES:
+            if name not in wb.sheetnames:
+                continue
+            rows = [
+                r for r in wb[name].iter_rows(min_row=2, max_col=len(HEADERS), values_only=True)
+                if r is not None and not all(x in (None, "") for x in r)
+            ]
+            out[name] = pd.DataFrame(rows, columns=HEADERS)
+        return out
+    finally:
+        wb.close()
 
-def append_json_to_excel_by_cat_and_tag(records: List[Dict[str, Any]], excel_path: str):
+
+def _write_report_workbook(excel_path: str, frames: Dict[str, pd.DataFrame], merges: Dict[str, list] | None = None):
     """
-    主入口：
-    - 解析/规范化输入记录
-    - 按“一级分类”分发到 sheet
-    - 每个 sheet 写入后，对“所有内容（含历史+新增）”按“二级标签”热度降序重排
+    用 write-only 模式整本写出报表：frames 为 {sheet 名: 正文四列}（按字典顺序建 sheet），
+    merges 为 {sheet 名: [(start, end), ...]}，需要合并 A 列的正文行号（0-based）。
+    先写临时文件再替换，中途失败不会留下半本。
     """
-    df = _normalize_records(records)
-    if df.empty:
-        return
+    wb = Workbook(write_only=True)
+    body_style = _ensure_named_style(wb)
+    header_font = Font(name=FONT_NAME, size=HEADER_FONT_SIZE, bold=True)
+    header_align = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    header_fill = PatternFill("solid", fgColor=HEADER_FILL)
+
+    for name, df in frames.items():
+        ws = wb.create_sheet(title=name)
+        runs = (merges or {}).get(name, [])
+        if runs:
+            # 合并区域只保留段首的话题簇（与 ws.merge_cells 的结果一致）
+            covered = np.zeros(len(df), dtype=bool)
+            for (s, e) in runs:
+                covered[s + 1:e + 1] = True
+            df = df.astype(object)
+            df.iloc[covered, 0] = None
+        for col_idx, w in enumerate(COL_WIDTHS, start=1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = w
+        ws.freeze_panes = "A2"
+        ws.row_dimensions[1].height = HEADER_ROW_HEIGHT
 
-    wb, _ = _open_or_create_excel(excel_path)
+        header = []
+        for h in HEADERS:
+            cell = WriteOnlyCell(ws, value=h)
+            cell.font, cell.alignment, cell.fill = header_font, header_align, header_fill
+            header.append(cell)
+        ws.append(header)
+
+        # 每列解析一次 NamedStyle，逐行复制样式下标
+        protos = []
+        for _ in HEADERS:
+            proto = WriteOnlyCell(ws)
+            proto.style = body_style
+            protos.append(proto._style)
+        for row in df.itertuples(index=False, name=None):
+            cells = []
+            for v, style in zip(row, protos):
+                cell = WriteOnlyCell(ws, value=_cell_value(v))
+                cell._style = copy(style)
+                cells.append(cell)
+            ws.append(cells)
+
+        # write-only 模式下只登记合并区域，保存时写进 <mergeCells>
+        col = get_column_letter(TOPIC_COL)
+        for (s, e) in runs:
+            ws.merged_cells.add(f"{col}{s + 2}:{col}{e + 2}")
+
+    target = Path(excel_path)
+    fd, tmp = tempfile.mkstemp(dir=str(target.parent.resolve()), prefix=f".{target.stem}.", suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
-    # 按一级分类分组，每个组在各自 sheet 内完成“合并 + 重排 + 重写”
-    for ca, grp in df.groupby("一级分类", sort=False):
-        sheet = CA_TO_SHEET.get(int(ca))
-        if not sheet or sheet not in wb.sheetnames:
-            continue
 
-        # 仅保留写入列顺序
-        body_df = grp[["话题簇","发言时间", "玩家ID", "玩家消息" ]].copy()
+class IntentReportBuilder:
+    """
+    五个 sheet（体验反馈/疑惑询问/建议灵感/情绪输出/问题反馈）报表的构建器：
+    - add(records)：每批调用，规范化后按 sheet 暂存到内存（列式：每个 sheet 每列一个 list），不碰 Excel
+    - write(excel_path)：结束时排序，用 openpyxl write-only 模式一次写出；
+      正文样式（BodyStyle）每列只解析一次，逐行复用，不再逐格 cell.style 赋值
+    - staging_path：每批同时追加到 JSONL，内核中断后 resume=True 可从已跑批次接着攒
+    替代逐批调用 append_json_to_excel_by_cat_and_tag（那样每批都要读回整本、重排、重写、重套样式）。
+    """
 
-        _rewrite_sheet_sorted_by_tag(wb, sheet, body_df)
+    def __init__(self, staging_path: str | Path | None = None, resume: bool = False):
+        self._cols: Dict[str, Dict[str, list]] = {name: {c: [] for c in HEADERS} for name in SHEET_NAMES}
+        self.staging_path = Path(staging_path) if staging_path else None
+        if self.staging_path is not None:
+            if resume and self.staging_path.exists():
+                self._load_staging()
+            else:
+                self.staging_path.write_text("", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return sum(len(cols[HEADERS[0]]) for cols in self._cols.values())
+
+    def counts(self) -> Dict[str, int]:
+        """每个 sheet 已暂存的行数"""
+        return {name: len(cols[HEADERS[0]]) for name, cols in self._cols.items()}
+
+    def _stage(self, sheet: str, row: list):
+        cols = self._cols[sheet]
+        for c, v in zip(HEADERS, row):
+            cols[c].append(v)
+
+    def _load_staging(self):
+        with open(self.staging_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中断时写了半行
+                if item.get("sheet") in self._cols:
+                    self._stage(item["sheet"], item["row"])
+        print(f"♻️ 从暂存恢复 {len(self)} 行：{self.staging_path}")
+
+    def add(self, records: List[Dict[str, Any]]) -> int:
+        """暂存一批模型输出记录（格式同 append_json_to_excel_by_cat_and_tag），返回实际暂存的行数"""
+        df = _normalize_records(records)
+        if df.empty:
+            return 0
+        staged = []
+        for topic, ca, t, uid, msg in df.itertuples(index=False, name=None):
+            sheet = CA_TO_SHEET[int(ca)]
+            row = [_cell_value(topic), _cell_value(t), _cell_value(uid), _cell_value(msg)]
+            self._stage(sheet, row)
+            staged.append({"sheet": sheet, "row": row})
+        if self.staging_path is not None:
+            with open(self.staging_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in staged)
+        return len(staged)
+
+    def sorted_frames(self, existing: Dict[str, pd.DataFrame] | None = None) -> Dict[str, pd.DataFrame]:
+        """每个 sheet 排好序的正文（existing 为已有报表的正文，合并后一起排序）"""
+        out = {}
+        for name in SHEET_NAMES:
+            df = pd.DataFrame(self._cols[name], columns=HEADERS)
+            if existing and name in existing and not existing[name].empty:
+                df = pd.concat([existing[name], df], ignore_index=True)
+            out[name] = _sort_report_rows(df) if not df.empty else df
+        return out
+
+    def write(self, excel_path: str, merge_existing: bool = False) -> Dict[str, int]:
+        """
+        写出五个 sheet 的带样式工作簿（整本重写，先写临时文件再替换）。
+        merge_existing=True 时先读出 excel_path 里已有的正文，与暂存内容合并排序。
+        返回每个 sheet 写出的行数。
+        """
+        existing = _read_report_rows(excel_path) if merge_existing and Path(excel_path).exists() else None
+        frames = self.sorted_frames(existing)
+        _write_report_workbook(excel_path, frames)
+        counts = {name: len(df) for name, df in frames.items()}
+        print(f"✅ 已写出报表：{excel_path}（{sum(counts.values())} 行）")
+        return counts
 
-    wb.save(excel_path)
+
+def append_json_to_excel_by_cat_and_tag(records: List[Dict[str, Any]], excel_path: str):
+    """
+    单批写入（兼容旧调用）：
+    - 解析/规范化输入记录，按“一级分类”分发到 sheet
+    - 与文件里已有内容合并后按“话题簇→发言时间”重排，整本重写
+    每批调用一次时总开销随报表大小平方增长；批处理循环请改用 IntentReportBuilder，结束时 write 一次。
+    """
+    builder = IntentReportBuilder()
+    if not builder.add(records):
+        return
+    builder.write(excel_path, merge_existing=True)
 
 
 
 
 
 # ----------------------------Excel处理---------------------
+import numpy as np
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree import ElementTree
+from openpyxl.cell.cell import MergedCell
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.merge import MergedCellRange
 
 
 
@@ -514,9 +619,9 @@ def _pre_unmerge_and_fill_topic(ws):
             to_process.append(rng)
     for rng in to_process:
         top_val = ws.cell(row=rng.min_row, column=TOPIC_COL).value
+        ws.unmerge_cells(range_string=str(rng))  # 先拆开：MergedCell 的 value 只读
         for r in range(rng.min_row, rng.max_row + 1):
             ws.cell(row=r, column=TOPIC_COL).value = top_val
-        ws.unmerge_cells(range_string=str(rng))
 
 # ========== 文本规范化（去零宽/全角空格/多空白） ==========
 _ZW_RE = re.compile(r'[\u200b-\u200f\u202a-\u202e\u2060-\u206f\ufeff]')
@@ -570,68 +675,229 @@ def _strip_trailing_flag(s: str) -> str:
         return ""
     return re.sub(r'(?:\s*🖼️)+$', '', str(s).rstrip())
 
-# ========== 分段：同簇且相邻时间间隔≤gap，返回 df 行号段 ==========
+def _pure_image_mask(msgs: pd.Series) -> np.ndarray:
+    """_is_pure_image_msg 的整列版本"""
+    s = msgs.astype(object)
+    present = s.notna().to_numpy()
+    text = s.where(present, "").astype(str).str.strip()
+    return present & text.str.match(_IMG_PAT.pattern).fillna(False).to_numpy(dtype=bool)
+
+# ========== 文本/时间整列规范化 ==========
+def _norm_topic_series(s: pd.Series) -> pd.Series:
+    """_norm_topic 的整列版本（None/NaN → 空串）"""
+    s = s.astype(object)
+    s = s.where(s.notna(), "").astype(str)
+    return (s.str.normalize("NFKC")
+             .str.replace(_ZW_RE.pattern, "", regex=True)
+             .str.replace("\u3000", " ", regex=False)
+             .str.strip()
+             .str.replace(r"\s+", " ", regex=True))
+
+def _to_ts_series(values) -> pd.Series:
+    """
+    等价于逐个 pd.to_datetime(x, errors="coerce")，但先按标准格式整列解析，
+    只有解析不了的少数值才逐个兜底（保持原来逐行解析的宽松程度）。返回 0..n-1 索引的 Series。
+    """
+    s = pd.Series(list(values), dtype=object)
+    ts = pd.to_datetime(s, format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    rest = ts.isna() & s.notna()
+    if rest.any():
+        def _to_ts(x):
+            try:
+                return pd.to_datetime(x, errors="coerce")
+            except Exception:
+                return pd.NaT
+        ts = ts.astype(object)
+        ts[rest] = [_to_ts(x) for x in s[rest]]
+        ts = pd.to_datetime(ts, errors="coerce")
+    return ts
+
+# ========== 分段：同簇且相邻时间间隔≤gap ==========
+def _topic_run_bounds(topics: np.ndarray, ts: pd.Series, gap_minutes: int, nat_policy: str = "skip"):
+    """
+    topics: 已转成 str 的话题簇数组；ts: 与之等长的时间（NaT 表示无法解析），均已按『话题簇→时间』排序。
+    断段条件（整列计算）：簇变化 / 簇为空，或同簇内与基准时间的间隔 > gap_minutes；
+      - skip：NaT 并入当前段且不更新基准 → 基准 = 同簇连续块内上一个可解析时间（块内 ffill 后下移一行）
+      - break：NaT 所在行前后都断段 → 基准就是上一行时间，任一侧 NaT 即断
+    返回 (starts, ends)：每段首尾的 0-based 行号（含空簇段，由调用方过滤）。
+    """
+    n = len(topics)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    same = np.zeros(n, dtype=bool)
+    same[1:] = (topics[1:] == topics[:-1]) & (topics[1:] != "")
+    ts = ts.reset_index(drop=True)
+    gap = pd.Timedelta(minutes=gap_minutes)
+
+    if nat_policy == "break":
+        # 与 NaT 相减得 NaT，比较结果为 False → 断段
+        cont = same & ((ts - ts.shift(1)) <= gap).to_numpy()
+    else:
+        block = np.cumsum(~same)  # 同簇连续块编号
+        base = ts.groupby(block).ffill().shift(1)
+        within = ((ts - base) <= gap).to_numpy()
+        cont = same & (ts.isna().to_numpy() | base.isna().to_numpy() | within)
+
+    starts = np.flatnonzero(~cont)
+    ends = np.append(starts[1:] - 1, n - 1)
+    return starts, ends
+
 def _iter_topic_runs(df: pd.DataFrame, gap_minutes: int, nat_policy: str = "skip"):
     """
     df: 必须包含列 ["发言时间","话题簇"]，且已按『话题簇→时间』排过序。
     返回: [(start_idx, end_idx, topic_norm), ...] —— 注意是 df 的 0-based 行号。
     """
-    def _to_ts(x):
-        try:
-            return pd.to_datetime(x, errors="coerce")
-        except Exception:
-            return pd.NaT
+    topics = np.array([str(x or "") for x in df["话题簇"]], dtype=object)
+    starts, ends = _topic_run_bounds(topics, _to_ts_series(df["发言时间"]), gap_minutes, nat_policy)
+    # 过滤空 topic
+    return [(int(s), int(e), topics[s]) for s, e in zip(starts, ends) if topics[s].strip()]
 
-    n = len(df)
-    if n == 0:
-        return []
+# ========== 排序→切段→段间排序→标🖼️（纯 DataFrame 计算，不碰 worksheet） ==========
+def _arrange_topic_rows(
+    df: pd.DataFrame,
+    gap_minutes: int = 15,
+    nat_policy: str = "skip",
+    fill_nat_in_topic: bool = True,
+    bad_ts_path: str | None = None,
+    order_runs_by_topic: bool = False,
+    fill_blank_time: bool = False,
+):
+    """
+    df: 正文四列 ["话题簇","发言时间","玩家ID","玩家消息"]。
+    返回 (df_out, runs)：df_out 为重排并已打好 🖼️ 标记的正文，runs 为需要合并 A 列的 [(start, end)]（0-based 行号）。
+    空话题簇的行不进入任何段，会被丢弃（与旧版一致）。
+    order_runs_by_topic: 段间按 (话题簇, 段首时间) 排序，同簇的段排在一起；默认只按段首时间
+    fill_blank_time: 空的发言时间用同簇填补后的时间回填（"%Y-%m-%d %H:%M:%S"），空玩家消息写成 ""
+    （这两项是 model_classifyV1_Copy1 的行为）
+    """
+    df = df.copy()
+    # 规范 & 强韧解析时间
+    df["话题簇"] = _norm_topic_series(df["话题簇"])
+    col = df["发言时间"].astype(str).str.replace(r"[/.]", "-", regex=True).str.strip()
+    ts  = pd.to_datetime(col, errors="coerce")
+    bad = ts.isna()
+    if bad.any():
+        ts2 = pd.to_datetime(df.loc[bad, "发言时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        ts.loc[bad] = ts2
+    df["_ts"] = ts
 
-    segs = []
-    start = 0
-    topic = str(df.iloc[0]["话题簇"] or "")
-    last_ts = _to_ts(df.iloc[0]["发言时间"])
-
-    for i in range(1, n):
-        cur_topic = str(df.iloc[i]["话题簇"] or "")
-        cur_ts = _to_ts(df.iloc[i]["发言时间"])
-
-        same_topic = (cur_topic == topic and cur_topic != "")
-        cont = False
-
-        if same_topic:
-            if pd.notna(cur_ts) and pd.notna(last_ts):
-                cont = (cur_ts - last_ts) <= pd.Timedelta(minutes=gap_minutes)
-                if cont:
-                    last_ts = cur_ts
-            elif pd.isna(cur_ts):
-                # NaT：skip=并入但不更新基准；break=直接断段
-                cont = (nat_policy != "break")
-            else:  # last_ts NaT, cur_ts 可解析
-                if nat_policy == "break":
-                    cont = False
-                else:
-                    cont = True
-                    last_ts = cur_ts
-        else:
-            cont = False
+    if bad_ts_path and df["_ts"].isna().any():
+        df.loc[df["_ts"].isna(), ["话题簇","发言时间","玩家ID","玩家消息"]].to_excel(bad_ts_path, index=False)
 
-        if not cont:
-            segs.append((start, i - 1, topic))
-            start = i
-            topic = cur_topic
-            last_ts = cur_ts if pd.notna(cur_ts) else pd.NaT
+    if fill_nat_in_topic:
+        # 同簇内前后填补（整簇都是 NaT 时保持 NaT）
+        df["_ts"] = df.groupby("话题簇")["_ts"].ffill()
+        df["_ts"] = df.groupby("话题簇")["_ts"].bfill()
+
+    if fill_blank_time:
+        blank = df["发言时间"].isna() | (df["发言时间"].astype(str).str.strip() == "")
+        mask = blank & df["_ts"].notna()
+        if mask.any():
+            df["发言时间"] = df["发言时间"].astype(object)
+            df.loc[mask, "发言时间"] = df.loc[mask, "_ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        df["玩家消息"] = df["玩家消息"].astype(object).where(df["玩家消息"].notna(), "")
+
+    # 基础排序：话题簇→时间，便于切段稳定（段内因此已按时间有序）
+    df = df.sort_values(by=["话题簇", "_ts", "发言时间"],
+                        ascending=[True, True, True],
+                        kind="mergesort").reset_index(drop=True)
+
+    # ① 切段（按原始发言时间，不用填补后的 _ts）
+    topics = df["话题簇"].to_numpy(dtype=object)
+    raw_ts = _to_ts_series(df["发言时间"])
+    starts, ends = _topic_run_bounds(topics, raw_ts, gap_minutes, nat_policy)
+    keep = np.array([bool(topics[s].strip()) for s in starts], dtype=bool)
+    starts, ends = starts[keep], ends[keep]
+
+    # ② 段与段之间按段首时间排序（NaT 段放最后，同时间保持原顺序）；order_runs_by_topic 时先按话题簇
+    start_ts = raw_ts.iloc[starts]
+    start_nat = start_ts.isna().to_numpy()
+    start_key = start_ts.fillna(pd.Timestamp(0)).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    keys = (start_key, start_nat)
+    if order_runs_by_topic:
+        keys += (np.unique(topics[starts], return_inverse=True)[1],)
+    order = np.lexsort(keys)
+    starts, ends = starts[order], ends[order]
+
+    # 按段顺序拼接行号：每段 [s, e] 展开成连续下标
+    lens = ends - starts + 1
+    offsets = np.cumsum(lens) - lens
+    idx = np.repeat(starts - offsets, lens) + np.arange(lens.sum())
+    df_out = df.iloc[idx].drop(columns=["_ts"]).reset_index(drop=True)
+    out_ts = raw_ts.iloc[idx].reset_index(drop=True)
+
+    # ③ 新顺序下再切一次段 → 用于合并与标记（相邻的同簇段可能连成一段）
+    topics = df_out["话题簇"].to_numpy(dtype=object)
+    starts, ends = _topic_run_bounds(topics, out_ts, gap_minutes, nat_policy)
+
+    # ④ 标记 🖼️：段内出现纯图片行 → D 列尾部 + 段首 A 列 + 🖼️
+    img = _pure_image_mask(df_out["玩家消息"])
+    if img.any():
+        df_out["玩家消息"] = df_out["玩家消息"].astype(object)
+        df_out.loc[img, "玩家消息"] = [_strip_trailing_flag(m) + " 🖼️" for m in df_out.loc[img, "玩家消息"]]
+        flagged = starts[np.logical_or.reduceat(img, starts)]
+        df_out["话题簇"] = df_out["话题簇"].astype(object)
+        df_out.loc[flagged, "话题簇"] = [_strip_trailing_flag(t) + " 🖼️" for t in df_out.loc[flagged, "话题簇"]]
+
+    runs = [(int(s), int(e)) for s, e in zip(starts, ends) if e > s]
+    return df_out, runs
+
+# ========== 写回：重写正文（样式只解析一次）→ 合并 A 列 → 清图 ==========
+def _write_topic_rows(ws, df_out: pd.DataFrame, runs):
+    if ws.max_row > 1:
+        ws.delete_rows(2, ws.max_row - 1)
+    _clear_topic_merges(ws)
 
-    segs.append((start, n - 1, topic))
-    # 过滤空 topic
-    return [(s, e, t) for (s, e, t) in segs if (t or "").strip()]
+    for row in df_out.itertuples(index=False, name=None):
+        ws.append(row)
+    if ws.max_row >= 2:
+        first = ws.cell(row=2, column=1)
+        first.style = _ensure_named_style(ws.parent)
+        resolved = first._style
+        for rr in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=4):
+            for cell in rr:
+                cell._style = copy(resolved)
+
+    # 合并 A 列（话题簇）
+    _merge_topic_runs(ws, runs)
+
+    # 移除所有 shape（小图片图标）
+    _remove_all_drawings(ws)
+
+def _merge_topic_runs(ws, runs):
+    """
+    批量合并 A 列各段（runs 为 0-based 行号，对应 Excel 第 2 行起）。
+    ws.merge_cells 会给段内每个 MergedCell 重新叠加边框（每格几次样式查表），几万行时占后处理大半时间；
+    正文统一是 BodyStyle，各段段中 / 段尾 MergedCell 算出来的样式都一样，
+    所以只在拿到样式之前走 merge_cells，之后直接登记合并区域并复用样式下标。
+    """
+    col = get_column_letter(TOPIC_COL)
+    mid = last = None
+    for (s, e) in runs:
+        r1, r2 = s + 2, e + 2
+        if last is None or (mid is None and r2 - r1 >= 2):
+            ws.merge_cells(start_row=r1, start_column=TOPIC_COL, end_row=r2, end_column=TOPIC_COL)
+            last = ws._cells[(r2, TOPIC_COL)]._style
+            if r2 - r1 >= 2:
+                mid = ws._cells[(r1 + 1, TOPIC_COL)]._style
+            continue
+        ws.merged_cells.add(MergedCellRange(ws, f"{col}{r1}:{col}{r2}"))
+        for r in range(r1 + 1, r2 + 1):
+            cell = MergedCell(ws, row=r, column=TOPIC_COL)
+            cell._style = copy(last if r == r2 else mid)
+            ws._cells[(r, TOPIC_COL)] = cell
 
-# ========== 核心：排序→重写→切段→段内排序→段间排序→合并→标🖼️→清图 ==========
+# ========== 核心：读正文→排序/切段/标记→一次写回 ==========
 def _sort_merge_flag(
     ws,
     gap_minutes: int = 15,
     nat_policy: str = "skip",          # "skip": NaT 并入不更新基准；"break": NaT 直接断段
     fill_nat_in_topic: bool = True,    # 同簇内对少量 NaT 做前后填补
-    dump_bad_ts: bool = False
+    dump_bad_ts: bool = False,
+    order_runs_by_topic: bool = False, # 见 _arrange_topic_rows
+    fill_blank_time: bool = False,
 ):
     _pre_unmerge_and_fill_topic(ws)
 
@@ -649,99 +915,142 @@ def _sort_merge_flag(
         _clear_topic_merges(ws); _remove_all_drawings(ws)
         return
 
-    # 规范 & 强韧解析时间
-    df["话题簇"] = df["话题簇"].apply(_norm_topic)
-    col = df["发言时间"].astype(str).str.replace(r"[/.]", "-", regex=True).str.strip()
-    ts  = pd.to_datetime(col, errors="coerce")
-    bad = ts.isna()
-    if bad.any():
-        ts2 = pd.to_datetime(df.loc[bad, "发言时间"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
-        ts.loc[bad] = ts2
-    df["_ts"] = ts
-
-    if dump_bad_ts and df["_ts"].isna().any():
-        df.loc[df["_ts"].isna(), ["话题簇","发言时间","玩家ID","玩家消息"]].to_excel(
-            f"bad_ts_{ws.title}.xlsx", index=False
-        )
-
-    if fill_nat_in_topic:
-        def _safe_fill(s: pd.Series) -> pd.Series:
-            if s.notna().any():
-                return s.ffill().bfill()
-            return s
-        df["_ts"] = df.groupby("话题簇")["_ts"].transform(_safe_fill)
-
-    # 基础排序：话题簇→时间，便于切段稳定
-    df = df.sort_values(by=["话题簇", "_ts", "发言时间"],
-                        ascending=[True, True, True],
-                        kind="mergesort")
-
-    # ① 切段
-    runs = _iter_topic_runs(df[["发言时间","话题簇"]].copy(), gap_minutes, nat_policy)
-
-    # ② 段内排序；③ 段与段之间按段首时间排序
-    parts = []
-    run_meta = []   # [(idx_in_parts, start_ts)]
-    for (s, e, t) in runs:
-        seg = df.iloc[s:e+1].copy()
-        seg = seg.sort_values(by=["_ts","发言时间"], ascending=[True, True], kind="mergesort")
-        parts.append(seg)
-        seg_ts = pd.to_datetime(seg["发言时间"], errors="coerce")
-        start_ts = seg_ts.iloc[0] if not seg_ts.empty else pd.NaT
-        run_meta.append((len(parts)-1, start_ts))
-
-    run_meta.sort(key=lambda x: (pd.isna(x[1]), x[1]))  # NaT 段放最后
-    df_out = pd.concat([parts[i] for (i, _ts0) in run_meta], ignore_index=True)
-
-    # 重写 Excel（按重排后的顺序）
-    if ws.max_row > 1:
-        ws.delete_rows(2, ws.max_row - 1)
-    style = _ensure_named_style(ws.parent)
-    for row in df_out.drop(columns=["_ts"]).itertuples(index=False, name=None):
-        ws.append(row)
-    for rr in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=4):
-        for cell in rr:
-            cell.style = style
-
-    # 基于新顺序再切一次段 → 用于合并与标记
-    runs_new = _iter_topic_runs(
-        pd.DataFrame({
-            "发言时间": [ws.cell(row=r, column=TIME_COL).value  for r in range(2, ws.max_row+1)],
-            "话题簇":   [ws.cell(row=r, column=TOPIC_COL).value  for r in range(2, ws.max_row+1)],
-        }),
-        gap_minutes, nat_policy
+    df_out, runs = _arrange_topic_rows(
+        df, gap_minutes, nat_policy, fill_nat_in_topic,
+        bad_ts_path=f"bad_ts_{ws.title}.xlsx" if dump_bad_ts else None,
+        order_runs_by_topic=order_runs_by_topic, fill_blank_time=fill_blank_time,
     )
-
-    # 合并 A 列（话题簇）
-    _clear_topic_merges(ws)
-    for (s, e, _t) in runs_new:
-        r1, r2 = s + 2, e + 2
-        if r2 > r1:
-            ws.merge_cells(start_row=r1, start_column=TOPIC_COL, end_row=r2, end_column=TOPIC_COL)
-
-    # 标记 🖼️：段内出现纯图片行 → D 列尾部 + 段首 A 列 + 🖼️
-    for (s, e, _t) in runs_new:
-        r1, r2 = s + 2, e + 2
-        has_img_only = False
-        for r in range(r1, r2 + 1):
-            msg = ws.cell(row=r, column=MSG_COL).value
-            if _is_pure_image_msg(msg):
-                has_img_only = True
-                ws.cell(row=r, column=MSG_COL).value = _strip_trailing_flag(msg) + " 🖼️"
-        if has_img_only:
-            tval = ws.cell(row=r1, column=TOPIC_COL).value
-            # ws.cell[row=r1, column=TOPIC_COL].value = _strip_trailing_flag(tval) + " 🖼️"
-            ws.cell(row=r1, column=TOPIC_COL).value = _strip_trailing_flag(tval) + " 🖼️"
-
-    # 移除所有 shape（小图片图标）
-    _remove_all_drawings(ws)
+    _write_topic_rows(ws, df_out, runs)
 
 # ========== 入口：处理整个工作簿 ==========
-def postprocess_excel_by_topic(excel_path: str, gap_minutes: int = 15, nat_policy: str = "skip"):
+def postprocess_excel_by_topic(
+    excel_path: str,
+    gap_minutes: int = 15,
+    nat_policy: str = "skip",
+    processes: int | None = 1,
+    order_runs_by_topic: bool = False,
+    fill_blank_time: bool = False,
+):
+    """
+    processes=1：单进程，load_workbook 后逐 sheet 就地处理再保存（保留原表头等）。
+    processes>1（None=CPU 核数）：各 sheet 互不相关，改走 postprocess_excel_by_topic_parallel，
+    按 sheet 分进程处理，整本一次写回，耗时约等于最大那个 sheet + 写回；单核机器上 None 仍走单进程。
+    order_runs_by_topic / fill_blank_time 见 _arrange_topic_rows。
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        return postprocess_excel_by_topic_parallel(
+            excel_path, gap_minutes, nat_policy, processes,
+            order_runs_by_topic=order_runs_by_topic, fill_blank_time=fill_blank_time,
+        )
+
     wb = load_workbook(excel_path, data_only=True)
     _ensure_named_style(wb)
     for name in wb.sheetnames:
-        _sort_merge_flag(wb[name], gap_minutes=gap_minutes, nat_policy=nat_policy)
+        _sort_merge_flag(wb[name], gap_minutes=gap_minutes, nat_policy=nat_policy,
+                         order_runs_by_topic=order_runs_by_topic, fill_blank_time=fill_blank_time)
     wb.save(excel_path)
     print(f"✅ 已完成后处理：{excel_path}（gap={gap_minutes}min, NaT策略={nat_policy}）")
 
+
+# ========== 并行：按 sheet 分进程 读正文→排序/切段/标记，主进程一次写回 ==========
+def _read_only_topic_merges(ws) -> List[tuple]:
+    """只读模式拿不到 ws.merged_cells：直接扫 sheet XML 里的 <mergeCell ref="A2:A5"/>，返回 A 列的 (首行, 末行)"""
+    out = []
+    with ws._get_source() as src:
+        for _, el in ElementTree.iterparse(src):
+            if el.tag.endswith("}mergeCell"):
+                rng = CellRange(el.get("ref"))
+                if rng.min_col == TOPIC_COL and rng.max_col == TOPIC_COL:
+                    out.append((rng.min_row, rng.max_row))
+            el.clear()
+    return out
+
+def _list_sheet_names(excel_path: str) -> List[str]:
+    """直接读 xl/workbook.xml 取 sheet 名：load_workbook 即使只读也要先解析整本的共享字符串"""
+    try:
+        with zipfile.ZipFile(excel_path) as zf, zf.open("xl/workbook.xml") as f:
+            return [el.get("name") for el in ElementTree.parse(f).iter() if el.tag.endswith("}sheet")]
+    except KeyError:  # 非常规打包，退回 openpyxl
+        wb = load_workbook(excel_path, read_only=True)
+        try:
+            return list(wb.sheetnames)
+        finally:
+            wb.close()
+
+def _read_sheet_rows(excel_path: str, sheet_name: str) -> pd.DataFrame:
+    """只读模式读出一个 sheet 的正文：合并过的话题簇先按段首回填（同 _pre_unmerge_and_fill_topic），再跳过空行"""
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        values = [list(r) for r in ws.iter_rows(min_row=2, max_col=4, values_only=True)]
+        for (r1, r2) in _read_only_topic_merges(ws):
+            if not 0 <= r1 - 2 < len(values):
+                continue
+            top = values[r1 - 2][0]
+            for i in range(r1 - 2, min(r2 - 1, len(values))):
+                values[i][0] = top
+    finally:
+        wb.close()
+    rows = [r for r in values if not all(x in (None, "") for x in r)]
+    return pd.DataFrame(rows, columns=["话题簇","发言时间","玩家ID","玩家消息"])
+
+def _postprocess_sheet(excel_path: str, sheet_name: str, gap_minutes: int, nat_policy: str, **arrange_opts) -> dict:
+    """子进程入口：处理一个 sheet，返回重排后的正文、需要合并的段和各阶段耗时"""
+    t0 = time.perf_counter()
+    df = _read_sheet_rows(excel_path, sheet_name)
+    t1 = time.perf_counter()
+    if df.empty:
+        df_out, runs = df, []
+    else:
+        df_out, runs = _arrange_topic_rows(df, gap_minutes, nat_policy, **arrange_opts)
+    t2 = time.perf_counter()
+    return {"sheet": sheet_name, "df": df_out, "runs": runs, "rows": len(df_out),
+            "read_s": t1 - t0, "arrange_s": t2 - t1}
+
+def postprocess_excel_by_topic_parallel(
+    excel_path: str,
+    gap_minutes: int = 15,
+    nat_policy: str = "skip",
+    processes: int | None = None,
+    order_runs_by_topic: bool = False,
+    fill_blank_time: bool = False,
+) -> Dict[str, dict]:
+    """
+    与 postprocess_excel_by_topic 结果相同（单元格值、A 列合并），区别：
+    - 每个 sheet 在独立进程里只读打开工作簿、读自己的正文并排序/切段/标记，互不等待
+    - 主进程收齐后用 write-only 模式整本重写一次（表头统一为 HEADERS 样式）
+    返回 {sheet 名: {"rows", "read_s", "arrange_s", "elapsed_s"}}，并打印每个 sheet 的耗时。
+    Windows / Jupyter 下子进程以 spawn 启动，会重新 import 本模块，调用方无需 if __name__ == "__main__"。
+    """
+    t0 = time.perf_counter()
+    sheet_names = _list_sheet_names(excel_path)
+    workers = min(processes or os.cpu_count() or 1, len(sheet_names)) or 1
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_postprocess_sheet, excel_path, name, gap_minutes, nat_policy,
+                        order_runs_by_topic=order_runs_by_topic, fill_blank_time=fill_blank_time): name
+            for name in sheet_names
+        }
+        for fut in as_completed(futures):
+            res = fut.result()
+            res["elapsed_s"] = time.perf_counter() - t0
+            results[res["sheet"]] = res
+            print(f"  ⏱️ {res['sheet']}: {res['rows']} 行，读取 {res['read_s']:.1f}s，"
+                  f"排序/切段/标记 {res['arrange_s']:.1f}s（开始后 {res['elapsed_s']:.1f}s 完成）")
+    t1 = time.perf_counter()
+
+    _write_report_workbook(
+        excel_path,
+        {name: results[name]["df"] for name in sheet_names},
+        merges={name: results[name]["runs"] for name in sheet_names},
+    )
+    t2 = time.perf_counter()
+    print(f"✅ 已完成后处理：{excel_path}（gap={gap_minutes}min, NaT策略={nat_policy}，{workers} 进程；"
+          f"各 sheet {t1 - t0:.1f}s + 写回 {t2 - t1:.1f}s）")
+    return {
+        name: {k: results[name][k] for k in ("rows", "read_s", "arrange_s", "elapsed_s")}
+        for name in sheet_names
+    }
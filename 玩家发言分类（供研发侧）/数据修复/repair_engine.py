@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+"""
+数据修复公用引擎（含“极”乱码修正 / 空值补齐）
+- TXT 只解析一次，建 TxtIndex：发言时间 → 候选行、(时间, ID)、(时间, 消息)、(ID, 消息)、ID → 首行 的哈希索引，
+  逐行 df_txt[df_txt["发言时间"] == t] 的整列扫描改为字典查找
+- 同一秒有多条 TXT 记录时按 (时间, ID 前缀) 模糊兜底：ID 完全一致的优先，其次是 ID 里“极”之前的部分
+  与 TXT 的 ID 前缀一致的，都没有才取该秒第一条（旧逻辑）
+- 工作簿所有 sheet 读成一张表（带 sheet / 行号），“含极”“空值”的判定用向量化字符串运算一次算完，
+  只有被标记的行才去查索引；合并单元格的左上角用预先算好的映射，不再每写一格遍历一遍 merged_cells
+- jiyouhua.py / jidelete.py（含极修正）、none_update.py / none_process.py（空值补齐）保留原入口，内部都调这里
+
+规则：
+    RULE_BY_TIME     jiyouhua：按发言时间定位 TXT 原始记录，修正含极的 发言时间 / 玩家ID / 玩家消息
+    RULE_BY_CONTENT  jidelete：只有 ID 含极按 (时间, 消息)，只有消息含极按 (时间, ID)，
+                     都含极按 时间 + 消息前 6 字（去掉极）包含 定位，修正含极的 玩家ID / 玩家消息
+两种规则都会先清理话题簇里的“极海听雷”“极”
+"""
+import math
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
+from openpyxl.utils import range_boundaries
+
+FIELDS = ["话题簇", "发言时间", "玩家ID", "玩家消息"]
+TXT_COLS = ["发言时间", "玩家ID", "玩家消息"]
+
+RULE_BY_TIME = "by_time"
+RULE_BY_CONTENT = "by_content"
+
+FILL_YELLOW = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")
+
+_ZERO_WIDTH = re.compile(r"[\u200b\ufeff]")
+_SPACES = re.compile(r"[\u3000\u200b\u200c\u200d]")
+_EMOJI = (
+    "\U0001F300-\U0001F5FF"
+    "\U0001F600-\U0001F64F"
+    "\U0001F680-\U0001F6FF"
+    "\U0001F700-\U0001F77F"
+    "\U0001F780-\U0001F7FF"
+    "\U0001F800-\U0001F8FF"
+    "\U0001F900-\U0001F9FF"
+    "\U0001FA00-\U0001FA6F"
+    "\U0001FA70-\U0001FAFF"
+    "\u200d"
+    "\ufe0f"
+)
+_EMOJI_RE = re.compile(f"[{_EMOJI}]+", flags=re.UNICODE)
+# 含极修正额外去掉 ♀♂ 与杂项符号（☀ ★ ➡ 等），与旧版 jiyouhua / jidelete 一致
+_EMOJI_SYMBOLS_RE = re.compile(f"[{_EMOJI}\u2640-\u2642\u2600-\u2b55]+", flags=re.UNICODE)
+_TXT_HEAD = re.compile(r"(\d{4}[-/]\d{2}[-/]\d{2}\s+\d{1,2}:\d{2}(?::\d{2})?)\s+(.+)")
+
+
+# ===========================================================
+# =============== 工具函数 ===================================
+# ===========================================================
+
+def norm(s):
+    """基础清洗：去零宽字符、首尾空白"""
+    return str(s).replace("\u200b", "").replace("\ufeff", "").strip() if s else ""
+
+
+def strip_emoji(s: str, symbols: bool = False) -> str:
+    """去除 emoji、变体选择符；symbols=True 时连杂项符号一起去掉"""
+    if not s:
+        return ""
+    s = (_EMOJI_SYMBOLS_RE if symbols else _EMOJI_RE).sub("", str(s))
+    return _SPACES.sub("", s).strip()
+
+
+def has_ji(s) -> bool:
+    """检测是否含“极”"""
+    return "极" in str(s) if s else False
+
+
+def is_empty_val(v) -> bool:
+    """None / NaN / NaT / 空串 / 'nan' / 'nat' 都算空"""
+    if v is None:
+        return True
+    if isinstance(v, float) and math.isnan(v):
+        return True
+    s = str(v).strip()
+    return s == "" or s.lower() in ("nan", "nat")
+
+
+def normalize_time_str(t_raw: str) -> str:
+    """多格式自动标准化为 yyyy-MM-dd HH:MM:SS（斜杠日期、缺秒、一位小时都行），解析不了原样返回"""
+    if not t_raw:
+        return ""
+    t_raw = str(t_raw).strip().replace("/", "-")
+    parts = t_raw.split(" ")
+    if len(parts) == 2:
+        date_part, time_part = parts
+        segs = time_part.split(":")
+        if len(segs) == 2:
+            time_part += ":00"
+        elif len(segs) == 1:
+            time_part += ":00:00"
+        segs = time_part.split(":")
+        h, m, s = segs[0].zfill(2), segs[1].zfill(2), segs[2].zfill(2)
+        t_raw = f"{date_part} {h}:{m}:{s}"
+    try:
+        return datetime.strptime(t_raw, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return t_raw
+
+
+def parse_txt(path: str, strip_symbols: bool = False) -> pd.DataFrame:
+    """解析 TXT 聊天记录（时间行 + 下一行消息）为 DataFrame，时间标准化、消息去 emoji"""
+    print(f"🧾 正在读取 TXT：{path}")
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.read().splitlines()
+    n = len(lines)
+    recs = []
+    for i, line in enumerate(lines):
+        m = _TXT_HEAD.match(line.strip())
+        if m:
+            t_raw, pid = m.groups()
+            msg = lines[i + 1].strip() if i + 1 < n else ""
+            recs.append((normalize_time_str(t_raw), norm(pid), strip_emoji(norm(msg), symbols=strip_symbols)))
+    df = pd.DataFrame(recs, columns=TXT_COLS)
+    print(f"📄 TXT 解析完成，共 {len(df)} 条（时间已标准化）")
+    return df
+
+
+def _text(s: pd.Series) -> pd.Series:
+    """向量化版 norm：空值 → ""，其余转字符串后去零宽字符、首尾空白"""
+    s = s.where(s.notna(), "").astype(str)
+    return s.str.replace(_ZERO_WIDTH, "", regex=True).str.strip()
+
+
+def _strip_emoji_text(s: pd.Series) -> pd.Series:
+    """向量化版 strip_emoji(symbols=True)"""
+    return s.str.replace(_EMOJI_SYMBOLS_RE, "", regex=True).str.replace(_SPACES, "", regex=True).str.strip()
+
+
+def _empty_mask(s: pd.Series) -> pd.Series:
+    """向量化版 is_empty_val"""
+    t = s.where(s.notna(), "").astype(str).str.strip()
+    return s.isna() | (t == "") | t.str.lower().isin(["nan", "nat"])
+
+
+def _ji_mask(s: pd.Series) -> pd.Series:
+    return _text(s).str.contains("极", regex=False)
+
+
+# ===========================================================
+# =============== TXT 索引 ===================================
+# ===========================================================
+
+class TxtIndex:
+    """
+    用法：
+        index = TxtIndex.from_txt(txt_path)
+        ref = index.pick("2026-01-06 20:15:03", "极速蜗牛极")   # dict：发言时间 / 玩家ID / 玩家消息
+    所有查找都返回 TXT 里最早的一条（与旧版 cand.iloc[0] 一致），找不到返回 None。
+    """
+
+    def __init__(self, df_txt: pd.DataFrame):
+        self.times: List[str] = df_txt["发言时间"].tolist()
+        self.ids: List[str] = df_txt["玩家ID"].tolist()
+        self.msgs: List[str] = df_txt["玩家消息"].tolist()
+        self.by_time: Dict[str, List[int]] = {}
+        self._by_time_id: Dict[Tuple[str, str], int] = {}
+        self._by_time_msg: Dict[Tuple[str, str], int] = {}
+        self._by_id_msg: Dict[Tuple[str, str], int] = {}
+        self._by_id: Dict[str, int] = {}
+        self._containing: Dict[str, Optional[int]] = {}
+        for i, (t, pid, msg) in enumerate(zip(self.times, self.ids, self.msgs)):
+            self.by_time.setdefault(t, []).append(i)
+            self._by_time_id.setdefault((t, pid), i)
+            self._by_time_msg.setdefault((t, msg), i)
+            self._by_id_msg.setdefault((pid, msg), i)
+            self._by_id.setdefault(pid, i)
+
+    @classmethod
+    def from_txt(cls, path: str, strip_symbols: bool = False) -> "TxtIndex":
+        return cls(parse_txt(path, strip_symbols=strip_symbols))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def row(self, i: Optional[int]) -> Optional[Dict[str, str]]:
+        if i is None:
+            return None
+        return {"发言时间": self.times[i], "玩家ID": self.ids[i], "玩家消息": self.msgs[i]}
+
+    # ---------- 精确查找 ----------
+
+    def first_at(self, t: str) -> Optional[int]:
+        cand = self.by_time.get(t)
+        return cand[0] if cand else None
+
+    def by_time_id(self, t: str, pid: str) -> Optional[int]:
+        return self._by_time_id.get((t, pid))
+
+    def by_time_msg(self, t: str, msg: str) -> Optional[int]:
+        return self._by_time_msg.get((t, msg))
+
+    def by_id_msg(self, pid: str, msg: str) -> Optional[int]:
+        return self._by_id_msg.get((pid, msg))
+
+    def by_id(self, pid: str) -> Optional[int]:
+        return self._by_id.get(pid)
+
+    # ---------- 模糊查找 ----------
+
+    def at_time_containing(self, t: str, core: str) -> List[int]:
+        """该秒内消息包含 core 的行"""
+        return [i for i in self.by_time.get(t, ()) if core in self.msgs[i]]
+
+    def containing(self, core: str) -> Optional[int]:
+        """消息包含 core 的第一行（全表扫描，按 core 缓存；只用于时间、ID 都缺的行）"""
+        if core not in self._containing:
+            self._containing[core] = next((i for i, msg in enumerate(self.msgs) if core in msg), None)
+        return self._containing[core]
+
+    def pick(self, t: str, pid: str = "", cand: Optional[List[int]] = None) -> Optional[int]:
+        """
+        在该秒的候选行（默认 by_time[t]）里选一条：ID 完全一致 > ID 前缀一致 > 第一条。
+        ID 前缀取“极”之前的部分（乱码通常从“极”开始）。
+        """
+        cand = self.by_time.get(t) if cand is None else cand
+        if not cand:
+            return None
+        if len(cand) == 1 or not pid:
+            return cand[0]
+        for i in cand:
+            if self.ids[i] == pid:
+                return i
+        prefix = pid.split("极", 1)[0]
+        if prefix:
+            for i in cand:
+                if self.ids[i].startswith(prefix):
+                    return i
+        return cand[0]
+
+
+# ===========================================================
+# =============== 工作簿读写 =================================
+# ===========================================================
+
+class SheetBook:
+    """
+    工作簿的所有 sheet 读成一张表：FIELDS 四列（原始单元格值，object）+ sheet + 行号。
+    写回时按表头定位列，落在合并区域里的写到左上角。
+    """
+
+    def __init__(self, excel_path: str):
+        self.wb = load_workbook(excel_path)
+        self.headers: Dict[str, Dict[str, int]] = {}
+        self._merged: Dict[str, Dict[Tuple[int, int], Tuple[int, int]]] = {}
+        frames = []
+        for sheet in self.wb.sheetnames:
+            rows = list(self.wb[sheet].values)
+            if not rows:
+                continue
+            header = {}
+            for c, name in enumerate(rows[0], start=1):
+                header.setdefault(name, c)
+            self.headers[sheet] = header
+            body = pd.DataFrame(rows[1:], dtype=object)
+            df = pd.DataFrame({
+                f: (body[header[f] - 1] if f in header and len(body) else pd.Series([None] * len(body), dtype=object))
+                for f in FIELDS
+            }, dtype=object)
+            df["sheet"] = sheet
+            df["行号"] = range(2, len(df) + 2)
+            frames.append(df)
+        self.df = (pd.concat(frames, ignore_index=True) if frames
+                   else pd.DataFrame(columns=FIELDS + ["sheet", "行号"], dtype=object))
+        print(f"📘 Excel 加载成功，检测到 {len(self.wb.sheetnames)} 个 sheet，共 {len(self.df)} 行。")
+
+    def _top_left(self, sheet: str, row: int, col: int) -> Tuple[int, int]:
+        merged = self._merged.get(sheet)
+        if merged is None:
+            merged = {}
+            for rng in self.wb[sheet].merged_cells.ranges:
+                min_c, min_r, max_c, max_r = range_boundaries(str(rng))
+                for r in range(min_r, max_r + 1):
+                    for c in range(min_c, max_c + 1):
+                        merged.setdefault((r, c), (min_r, min_c))
+            self._merged[sheet] = merged
+        return merged.get((row, col), (row, col))
+
+    def write(self, sheet: str, row: int, field: str, value, fill: Optional[PatternFill] = None) -> bool:
+        """写一格；表头里没有这一列时返回 False"""
+        col = self.headers[sheet].get(field)
+        if col is None:
+            return False
+        r, c = self._top_left(sheet, row, col)
+        cell = self.wb[sheet].cell(row=r, column=c)
+        cell.value = value
+        if fill is not None:
+            cell.fill = fill
+        return True
+
+    def save(self, output_path: str):
+        self.wb.save(output_path)
+
+
+# ===========================================================
+# =============== 含极修正 ===================================
+# ===========================================================
+
+def _fix_topics(book: SheetBook, logs: List[dict]):
+    """① 清理话题簇中的“极海听雷”“极”"""
+    topic = book.df["话题簇"]
+    is_str = topic.map(lambda v: isinstance(v, str)).astype(bool)
+    hit = book.df[is_str & _ji_mask(topic)]
+    new = hit["话题簇"].str.replace("极海听雷", "", regex=False).str.replace("极", "", regex=False).str.strip()
+    for (sheet, row, old), new_val in zip(hit[["sheet", "行号", "话题簇"]].itertuples(index=False), new):
+        if new_val != old and book.write(sheet, row, "话题簇", new_val, FILL_YELLOW):
+            logs.append({"sheet": sheet, "行号": row, "字段": "话题簇", "原值": old, "修正值": new_val, "依据时间": ""})
+
+
+def _fix_fields(book: SheetBook, index: TxtIndex, rule: str, logs: List[dict]):
+    """② 按 TXT 原始记录修正含极的字段"""
+    df = book.df
+    t = _text(df["发言时间"])
+    pid = _strip_emoji_text(_text(df["玩家ID"]))
+    msg = _strip_emoji_text(_text(df["玩家消息"]))
+    id_bad = pid.str.contains("极", regex=False)
+    msg_bad = msg.str.contains("极", regex=False)
+    if rule == RULE_BY_TIME:
+        fix_cols = ["发言时间", "玩家ID", "玩家消息"]
+        flagged = t.str.contains("极", regex=False) | id_bad | msg_bad | _ji_mask(df["话题簇"])
+    elif rule == RULE_BY_CONTENT:
+        fix_cols = ["玩家ID", "玩家消息"]
+        flagged = (t != "") & (id_bad | msg_bad)
+    else:
+        raise ValueError(f"未知的修正规则: {rule}（可选 {RULE_BY_TIME} / {RULE_BY_CONTENT}）")
+
+    for i in flagged[flagged].index:
+        t0, p0, m0 = t[i], pid[i], msg[i]
+        if rule == RULE_BY_TIME:
+            t0 = t0.replace("极海听雷", "").replace("极", "极速蜗牛").strip()
+            ref = index.pick(t0, p0) if t0 else None
+        elif id_bad[i] and not msg_bad[i]:
+            ref = index.by_time_msg(t0, m0)
+        elif msg_bad[i] and not id_bad[i]:
+            ref = index.by_time_id(t0, p0)
+        else:
+            core = m0.replace("极", "")[:6]
+            cand = index.at_time_containing(t0, core) if core else index.by_time.get(t0, [])
+            ref = index.pick(t0, p0, cand)
+        ref = index.row(ref)
+        if ref is None:
+            continue
+
+        sheet, row = df.at[i, "sheet"], df.at[i, "行号"]
+        for col in fix_cols:
+            old_val = norm(df.at[i, col])
+            new_val = norm(ref[col])
+            if has_ji(old_val) and new_val and new_val != old_val and book.write(sheet, row, col, new_val, FILL_YELLOW):
+                logs.append({"sheet": sheet, "行号": row, "字段": col, "原值": old_val, "修正值": new_val, "依据时间": t0})
+
+
+def fix_extreme(excel_path, txt_path, output_path, log_path, rule: str = RULE_BY_TIME) -> List[dict]:
+    """含极修正：所有 sheet 一次处理，修正过的单元格标黄，修正日志写 log_path，返回日志"""
+    index = TxtIndex.from_txt(txt_path, strip_symbols=True)
+    if not len(index):
+        raise RuntimeError("❌ TXT 解析失败或为空，请检查 txt 文件格式。")
+    book = SheetBook(excel_path)
+
+    topic_logs, field_logs = [], []
+    _fix_topics(book, topic_logs)
+    _fix_fields(book, index, rule, field_logs)
+
+    # 日志按 sheet 顺序、先话题簇后字段排列（同旧版逐 sheet 处理的顺序）
+    order = {s: k for k, s in enumerate(book.wb.sheetnames)}
+    logs = sorted(topic_logs + field_logs, key=lambda r: order[r["sheet"]])
+    per_sheet = Counter(r["sheet"] for r in logs)
+    for sheet in book.headers:
+        print(f"✅ Sheet 《{sheet}》 处理完成，修正 {per_sheet[sheet]} 处。")
+
+    book.save(output_path)
+    print(f"💾 修正完成：{output_path}")
+    if logs:
+        pd.DataFrame(logs).to_excel(log_path, index=False)
+        print(f"📝 修正日志生成：{log_path}")
+    else:
+        print("⚪ 未发现需要修正的字段。")
+    return logs
+
+
+# ===========================================================
+# =============== 空值补齐 ===================================
+# ===========================================================
+
+def _time_key(v) -> str:
+    if is_empty_val(v):
+        return ""
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    return normalize_time_str(norm(v))
+
+
+def _find_for_fill(index: TxtIndex, t0: str, pid0: str, msg0: str) -> Optional[int]:
+    if t0:
+        if pid0:
+            return index.by_time_id(t0, pid0)
+        if msg0:
+            return index.by_time_msg(t0, msg0)
+        return index.first_at(t0)
+    if pid0 and msg0:
+        return index.by_id_msg(pid0, msg0)
+    if pid0:
+        return index.by_id(pid0)
+    if msg0:
+        return index.containing(msg0[:6])
+    return None
+
+
+def fill_empty(excel_path, txt_path, output_path) -> int:
+    """
+    空值补齐：发言时间 / 玩家ID / 玩家消息 缺一到两列的行，按剩下的列在 TXT 里定位原始记录回填。
+    有时间时按 (时间, ID) 或 (时间, 消息)，没时间时按 (ID, 消息)、ID、消息前 6 字包含 依次定位。
+    返回填充的单元格数。
+    """
+    index = TxtIndex.from_txt(txt_path)
+    book = SheetBook(excel_path)
+    df = book.df
+
+    empty = pd.DataFrame({c: _empty_mask(df[c]) for c in TXT_COLS})
+    n_empty = empty.sum(axis=1)
+    rows = df[(n_empty > 0) & (n_empty < 3)]
+
+    filled_count = 0
+    for i, raw_t, raw_pid, raw_msg, sheet, row in rows[["发言时间", "玩家ID", "玩家消息", "sheet", "行号"]].itertuples():
+        pid0 = "" if is_empty_val(raw_pid) else norm(raw_pid)
+        msg0 = "" if is_empty_val(raw_msg) else strip_emoji(norm(raw_msg))
+        ref = index.row(_find_for_fill(index, _time_key(raw_t), pid0, msg0))
+        if ref is None:
+            continue
+        for col in TXT_COLS:
+            if empty.at[i, col] and not is_empty_val(ref[col]) and book.write(sheet, row, col, ref[col]):
+                filled_count += 1
+
+    for sheet in book.headers:
+        print(f"✅ Sheet 《{sheet}》 补齐完成。")
+    book.save(output_path)
+    print(f"🎯 空值补齐完成，共填充 {filled_count} 个单元格。")
+    print(f"📁 输出文件：{output_path}")
+    return filled_count
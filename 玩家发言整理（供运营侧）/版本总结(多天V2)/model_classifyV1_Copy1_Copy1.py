@@ -5,7 +5,7 @@ import requests
 import math
 from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 import re, unicodedata
 from datetime import datetime
 from json import JSONDecodeError
@@ -24,6 +24,10 @@ from docx import Document
 from docx.shared import Pt
 from docx.oxml.ns import qn
 
+# --- 按天时间索引（时间轴匹配用二分查找），来自仓库根目录的 core 包（pip install -e .） ---
+from core.time_index import DayTimeIndex, dt_range_to_seconds
+from core.message_store import MessageStore, as_message_store
+
 
 ################ 模型调用，出结果 ###################
 
@@ -717,11 +721,14 @@ def match_dialogs_by_time(
     messages: List[Dict[str, Any]],
     date_str: str,
     time_axis_str: str,
+    index: Optional[DayTimeIndex] = None,
 ) -> List[Dict[str, Any]]:
     """
     根据 日期 + 时间轴，从 messages 中筛选对应的原始发言：
     - messages 里的时间字段为：发言日期 + 发言时间
     - time_axis_str 支持多段："16:10:56-16:23:00、21:00:00-21:10:00"
+    - 逐段输出（段内按原始顺序），多段重叠时同一条会出现多次，由调用方按需去重
+    - index: 基于同一个 messages 建好的 DayTimeIndex，反复查询时由调用方建一次传进来；不传则临时建
     """
 
     if not messages or not date_str:
@@ -729,9 +736,8 @@ def match_dialogs_by_time(
     if not time_axis_str or not isinstance(time_axis_str, str) or not time_axis_str.strip():
         return []
 
-    matched: List[Dict[str, Any]] = []
-
     # 多个时间段用 "、" 拼接
+    ranges: List[Tuple[int, int]] = []
     for part in str(time_axis_str).split("、"):
         part = part.strip()
         if not part:
@@ -740,29 +746,26 @@ def match_dialogs_by_time(
         start_dt, end_dt = parse_time_range(date_str, part)
         if not start_dt or not end_dt:
             continue
+        ranges.append(dt_range_to_seconds(start_dt, end_dt))
 
-        for row in messages:
-            # 1) 先过滤日期不一致的
-            if (row.get("发言日期") or "") != date_str:
-                continue
-
-            ts = row.get("发言时间") or ""
-            try:
-                msg_dt = datetime.strptime(f"{date_str} {ts}", "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                continue
+    if not ranges:
+        return []
 
-            if start_dt <= msg_dt <= end_dt:
-                matched.append(row)
+    if index is None:
+        index = DayTimeIndex(messages)
 
-    return matched
+    return [messages[pos] for pos in index.match_positions(date_str, ranges, unique=False)]
 
 
-def extract_cluster_stats(聚合话题簇列表: List[Dict[str, Any]], 原始发言: List[str]) -> List[Dict[str, Any]]:
+def extract_cluster_stats(
+    聚合话题簇列表: List[Dict[str, Any]],
+    原始发言: Union[MessageStore, List[str]],
+) -> List[Dict[str, Any]]:
     """
     统计每个聚合话题簇的发言玩家数 / 发言总数。
     """
-    parsed_msgs = [json.loads(line.strip()) for line in 原始发言 if line.strip()]
+    store = as_message_store(原始发言)
+    parsed_msgs, index = store.messages, store.time_index
     results: List[Dict[str, Any]] = []
 
     for cluster in 聚合话题簇列表:
@@ -772,7 +775,7 @@ def extract_cluster_stats(聚合话题簇列表: List[Dict[str, Any]], 原始发
             print(f"⚠ 聚合话题簇缺少日期或时间轴，跳过：{cluster}")
             continue
 
-        matched = match_dialogs_by_time(parsed_msgs, date, time_axis)
+        matched = match_dialogs_by_time(parsed_msgs, date, time_axis, index=index)
         players = {msg.get("玩家ID") for msg in matched if msg.get("玩家ID")}
         result = {
             "聚合话题簇": cluster.get("话题簇") or cluster.get("聚合话题簇"),
@@ -797,19 +800,21 @@ def compute_heat_score(U: int, M: int) -> float:
 
 def extract_top5_heat_clusters(
     聚合话题簇列表: List[Dict[str, Any]],
-    原始发言: List[str],
+    原始发言: Union[MessageStore, List[str]],
     top_k: int = 5
 ) -> List[Dict[str, Any]]:
     """
     对每个聚合话题簇计算热度，返回 TopK。
     """
-    parsed_msgs = [json.loads(line.strip()) for line in 原始发言 if line.strip()]
+    # 原始发言传 MessageStore 时不再重复解析；时间索引只建一次，每个簇的时间轴查询都是二分查找
+    store = as_message_store(原始发言)
+    parsed_msgs, index = store.messages, store.time_index
     enriched: List[Dict[str, Any]] = []
 
     for cluster in 聚合话题簇列表:
         date = cluster.get("日期")
         time_axis = cluster.get("时间轴")
-        matched = match_dialogs_by_time(parsed_msgs, date, time_axis)
+        matched = match_dialogs_by_time(parsed_msgs, date, time_axis, index=index)
 
         players = {msg.get("玩家ID") for msg in matched if msg.get("玩家ID")}
         U = len(players)
@@ -1411,7 +1416,7 @@ from typing import Set, List, Dict, Any
 def compute_version_cluster_heat_and_points(
     cluster: Dict[str, Any],
     tid_time_index: Dict[str, List[Dict[str, str]]],
-    raw_jsonl_lines: List[str],
+    raw_jsonl_lines: Union[MessageStore, List[str]],
 ) -> Dict[str, Any]:
     """
     针对一个“版本聚合话题簇”（模型#4 + #5 输出中的一条）：
@@ -1435,8 +1440,9 @@ def compute_version_cluster_heat_and_points(
     """
     discussion_points = cluster.get("讨论点") or []
 
-    # 解析原始发言
-    messages = [json.loads(line.strip()) for line in raw_jsonl_lines if line.strip()]
+    # 原始发言（传 MessageStore 时多个簇共用一次解析和时间索引）
+    store = as_message_store(raw_jsonl_lines)
+    messages, index = store.messages, store.time_index
 
     # —— 簇级别的累积量 —— 
     total_U = 0
@@ -1484,7 +1490,7 @@ def compute_version_cluster_heat_and_points(
             date_str = seg["日期"]
             time_axis_str = seg["时间轴"]
 
-            seg_msgs = match_dialogs_by_time(messages, date_str, time_axis_str)
+            seg_msgs = match_dialogs_by_time(messages, date_str, time_axis_str, index=index)
             for msg in seg_msgs:
                 # 在【讨论点内部】去重消息，避免同一消息因多段时间重复计数
                 key = msg.get("_idx")
@@ -1550,7 +1556,7 @@ from typing import List, Dict, Any, Set
 def compute_cluster_point_metrics(
     cluster: Dict[str, Any],
     tid_time_index: Dict[str, List[Dict[str, str]]],
-    raw_jsonl_lines: List[str],
+    raw_jsonl_lines: Union[MessageStore, List[str]],
 ) -> Dict[str, Any]:
     """
     输入：
@@ -1570,8 +1576,9 @@ def compute_cluster_point_metrics(
     # max_points=0 -> 不截断数量，保留全部讨论点
     discussion_points = _extract_points_min(raw_points, max_points=0)
 
-    # 解析原始发言
-    messages = [json.loads(line.strip()) for line in raw_jsonl_lines if line.strip()]
+    # 原始发言（传 MessageStore 时多个簇共用一次解析和时间索引）
+    store = as_message_store(raw_jsonl_lines)
+    messages, index = store.messages, store.time_index
 
     discussion_info: List[Dict[str, Any]] = []
 
@@ -1617,7 +1624,7 @@ def compute_cluster_point_metrics(
             date_str = seg["日期"]
             time_axis_str = seg["时间轴"]
 
-            seg_msgs = match_dialogs_by_time(messages, date_str, time_axis_str)
+            seg_msgs = match_dialogs_by_time(messages, date_str, time_axis_str, index=index)
             for msg in seg_msgs:
                 key = msg.get("_idx")
                 if key is None:
@@ -1678,7 +1685,7 @@ def compute_cluster_point_metrics(
 def compute_all_clusters_point_metrics(
     version_clusters: List[Dict[str, Any]],
     daily_top5_rows: List[Dict[str, Any]],
-    raw_jsonl_lines: List[str],
+    raw_jsonl_lines: Union[MessageStore, List[str]],
 ) -> List[Dict[str, Any]]:
     """
     对所有版本聚合话题簇，计算其下每个讨论点的：
@@ -1707,13 +1714,15 @@ def compute_all_clusters_point_metrics(
     """
     # 1) 构建 tid -> 日期时间轴 索引（来自 daily_top5）
     tid_time_index = build_tid_time_index(daily_top5_rows)
+    # 原始发言只解析一次，所有簇共用
+    store = as_message_store(raw_jsonl_lines)
 
     results: List[Dict[str, Any]] = []
     for cluster in version_clusters:
         metrics = compute_cluster_point_metrics(
             cluster=cluster,
             tid_time_index=tid_time_index,
-            raw_jsonl_lines=raw_jsonl_lines,
+            raw_jsonl_lines=store,
         )
         results.append(metrics)
 
@@ -1859,29 +1868,21 @@ def print_mech_time_from_version_top5(
     return rows
 ######根据讨论点的时间轴提取原文#######
 def get_dialogs_lines_by_dt_list_debug(
-    raw_jsonl_lines: List[str],
+    raw_jsonl_lines: Union[MessageStore, List[str]],
     dt_list: List[Dict[str, str]],
     debug: bool = False,
 ) -> List[str]:
     """
     输入：
-      - raw_jsonl_lines：原始发言 jsonl 列表（每行一个 JSON）
+      - raw_jsonl_lines：原始发言 jsonl 列表（每行一个 JSON），或 MessageStore
       - dt_list：形如 [{"日期":"2025-12-03","时间轴":"10:14:51-10:16:19"}, ...]
     输出：
       - dialogs_lines：匹配到的原文 jsonl 行列表（去重后）
     """
 
-    # 1) 解析原始 jsonl 为 dict
-    messages: List[Dict[str, Any]] = []
-    for line in raw_jsonl_lines:
-        s = (line or "").strip()
-        if not s:
-            continue
-        try:
-            obj = json.loads(s)
-        except Exception:
-            continue
-        messages.append(obj)
+    # 1) 原始发言（传 MessageStore 时不再逐行 json.loads）
+    store = as_message_store(raw_jsonl_lines)
+    messages, index = store.messages, store.time_index
 
     all_msgs: List[Dict[str, Any]] = []
     seen_msg_ids: Set[Any] = set()
@@ -1893,7 +1894,7 @@ def get_dialogs_lines_by_dt_list_debug(
         if not date_str or not axis_str:
             continue
 
-        seg_msgs = match_dialogs_by_time(messages, date_str, axis_str)
+        seg_msgs = match_dialogs_by_time(messages, date_str, axis_str, index=index)
 
         if debug:
             print(f"🔎 时间片 {date_str} {axis_str} 命中 {len(seg_msgs)} 条消息")
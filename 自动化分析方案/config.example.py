@@ -9,8 +9,7 @@ SUPABASE_URL = "https://your-project-id.supabase.co"
 SUPABASE_KEY = "your-anon-public-key"
 
 # ==================== 本地路径配置 ====================
-# 源代码目录（包含 model_classifyV1_Copy1_Copy1.py 等）
-SOURCE_CODE_DIR = r"E:\项目\玩家社群分析智能体\玩家发言整理（供运营侧）\玩家发言总结_版本总结V2-Copy1.0(单日）"
+# 分析代码来自仓库根目录的 core 包（在仓库根目录执行 pip install -e .），不再需要配置源代码目录
 
 # 提示词目录
 PROMPTS_DIR = r"E:\项目\玩家社群分析智能体\玩家发言整理（供运营侧）\玩家发言总结_版本总结V2-Copy1.0(单日）"
@@ -26,12 +25,25 @@ V3_MODEL_ID = "ep-20251020160142-5d7hp"
 V3_1_MODEL_ID = "ep-20251020160025-9p5tj"
 
 # ==================== 分析参数 ====================
-BATCH_SIZE = 300
+BATCH_SIZE = None       # 单批行数上限（None 不限，只按 token 预算切）
+BATCH_TOKENS = 15000    # 单批估算 token 预算，按对话间隙切批（略低于 MAX_TOKENS，模型#1 输出不会被截断）
+PREFILTER_ENABLED = True        # 模型#1 之前本地去掉纯表情/链接/@/停用语/短回复
+PREFILTER_RULES_FILE = None     # 预过滤规则 JSON（None 用默认规则）
+DEDUP_ENABLED = True            # 近似重复发言（刷屏/复读）只送一条代表，热度仍按全部发言统计
+STREAM_OUTPUT = False           # 模型输出走 SSE 流式（可选）：读超时代替总超时，断流时保留已完成的对象（不落检查点）
 TEMPERATURE = 0.20
 MAX_TOKENS = 16384
 TIMEOUT_SEC = 600
 RETRIES = 2
 
+# 模型#1/#2 批处理并发数 + 令牌桶限流（每个任务各自一份，总速率约为 WORKER_CONCURRENCY × QPS_LIMIT）
+MAX_WORKERS = 1
+QPS_LIMIT = 1.0
+
+# 模型#4 观点分析：并发数 + 单次调用墙钟超时（超时的讨论点记为缺失）
+OPINION_WORKERS = 4
+OPINION_TIMEOUT_SEC = 600
+
 # ==================== 研发人员映射 ====================
 SPEAKER_MAP = {
     "16186514": "peter本尊",
@@ -44,4 +56,13 @@ SPEAKER_MAP = {
 # 轮询间隔（秒）
 POLL_INTERVAL = 10
 
+# 并发 worker 数（每个 worker 同时处理一个任务）
+WORKER_CONCURRENCY = 2
+
+# 任务租约（秒）：处理期间每 1/3 租约心跳续期，worker 崩溃后超过租约的任务重新排队
+LEASE_SECONDS = 300
+
+# 同一任务最多尝试次数，超过后置为 failed
+MAX_ATTEMPTS = 3
+
 
@@ -0,0 +1,420 @@
+"""
+任务队列 + 并发 worker（替代 task_worker.main 里的串行轮询）
+- 认领是原子的：pending → processing 只有一个 worker 能成功（Supabase 用带 status 条件的 update，
+  本地 SQLite 用 BEGIN IMMEDIATE 事务），同一任务不会被两个 worker 同时跑
+- 认领时写入租约（claimed_by / lease_expires_at），处理期间后台心跳续租；
+  worker 崩溃或被杀后租约过期，任务自动回到 pending，超过 MAX_ATTEMPTS 次直接置为 failed
+- 小任务优先：按 txt 文件大小升序认领，大任务不会堵住队列（Supabase 在查询里排序，大小由入队时的触发器补上；
+  本地表没有大小时按时间窗口长度）
+- LocalTaskStore 是 analysis_tasks 表的 SQLite 替身，接口与 SupabaseClient 一致，离线可测：
+    python task_worker.py --local ./local_tasks.db --workers 2
+"""
+from __future__ import annotations
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# ==================== 工具函数 ====================
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def lease_deadline(lease_seconds: float) -> str:
+    """租约到期时间（UTC ISO 字符串，Supabase 与 SQLite 共用同一格式，可直接按字符串比较）"""
+    return (utc_now() + timedelta(seconds=lease_seconds)).isoformat()
+
+
+def task_size(task: Dict[str, Any]) -> float:
+    """
+    任务大小（越小越先跑）：优先用上传时记录的 txt_file_size（字节），
+    旧任务没有这一列时退化为时间窗口秒数；都拿不到视为最大。
+    """
+    size = task.get("txt_file_size")
+    if size is not None:
+        return float(size)
+    try:
+        st = datetime.strptime(task["start_time"], "%Y-%m-%d %H:%M:%S")
+        et = datetime.strptime(task["end_time"], "%Y-%m-%d %H:%M:%S")
+        return max((et - st).total_seconds(), 0.0)
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+
+
+def sort_by_priority(tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """小任务优先，同样大小按创建时间先后"""
+    return sorted(tasks, key=lambda t: (task_size(t), t.get("created_at") or ""))
+
+
+# ==================== 本地 SQLite 任务表 ====================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_tasks (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    txt_file_path TEXT,
+    mapping_file_path TEXT,
+    txt_file_size INTEGER,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    result TEXT,
+    error_message TEXT,
+    total_messages INTEGER,
+    filtered_messages INTEGER,
+    processing_time_seconds REAL,
+    claimed_by TEXT,
+    lease_expires_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON analysis_tasks(status);
+"""
+
+
+class LocalTaskStore:
+    """
+    analysis_tasks 表的本地替身（SQLite 单文件），方法签名与 SupabaseClient 保持一致。
+    文件“存储桶”就是 db 同目录下的 storage/<bucket>/...，download_task_files 从那里拷贝。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        self.storage_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "storage")
+        self.uploads_bucket = "uploads"
+        self.results_bucket = "results"
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # 每次操作一个连接（自动提交）：多个 worker 线程各自开连接，靠 SQLite 的库级写锁串行化写入
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_task(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        task = dict(row)
+        if task.get("result"):
+            task["result"] = json.loads(task["result"])
+        return task
+
+    # ==================== 任务操作 ====================
+
+    def get_pending_tasks(self):
+        """获取所有待处理的任务"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM analysis_tasks WHERE status = 'pending' ORDER BY created_at"
+            ).fetchall()
+        return [self._row_to_task(r) for r in rows]
+
+    def update_task_status(self, task_id: str, status: str, **kwargs):
+        """更新任务状态"""
+        self._update(task_id, {"status": status, **kwargs})
+        return [self.get_task_by_id(task_id)]
+
+    def _update(self, task_id: str, data: Dict[str, Any], worker_id: Optional[str] = None) -> bool:
+        """按 id 更新；worker_id 不为空时只更新仍由该 worker 持有的 processing 任务。返回是否更新到了行"""
+        data = {**data, "updated_at": utc_now().isoformat()}
+        if isinstance(data.get("result"), (dict, list)):
+            data["result"] = json.dumps(data["result"], ensure_ascii=False)
+        cols = ", ".join(f"{k} = ?" for k in data)
+        sql = f"UPDATE analysis_tasks SET {cols} WHERE id = ?"
+        params = [*data.values(), task_id]
+        if worker_id is not None:
+            sql += " AND status = 'processing' AND claimed_by = ?"
+            params.append(worker_id)
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount == 1
+
+    def set_task_processing(self, task_id: str):
+        """设置任务为处理中"""
+        return self.update_task_status(task_id, "processing")
+
+    def set_task_completed(self, task_id: str, result: dict,
+                           total_messages: int = 0,
+                           filtered_messages: int = 0,
+                           processing_time: float = 0,
+                           worker_id: Optional[str] = None) -> bool:
+        """设置任务为已完成；传 worker_id 时任务已不归该 worker（租约过期被回收）则不写，返回 False"""
+        return self._update(task_id, {
+            "status": "completed",
+            "result": result,
+            "total_messages": total_messages,
+            "filtered_messages": filtered_messages,
+            "processing_time_seconds": processing_time,
+            "lease_expires_at": None,
+        }, worker_id)
+
+    def set_task_failed(self, task_id: str, error_message: str,
+                        worker_id: Optional[str] = None) -> bool:
+        """设置任务为失败；worker_id 同 set_task_completed"""
+        return self._update(task_id, {
+            "status": "failed",
+            "error_message": error_message,
+            "lease_expires_at": None,
+        }, worker_id)
+
+    def create_task(self, start_time: str, end_time: str,
+                    txt_file_path: str = None,
+                    mapping_file_path: str = None,
+                    txt_file_size: int = None):
+        """创建新任务"""
+        now = utc_now().isoformat()
+        task_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO analysis_tasks (id, created_at, updated_at, status, txt_file_path,"
+                " mapping_file_path, txt_file_size, start_time, end_time)"
+                " VALUES (?, ?, ?, 'pending', ?, ?, ?, ?, ?)",
+                (task_id, now, now, txt_file_path, mapping_file_path, txt_file_size, start_time, end_time),
+            )
+        return self.get_task_by_id(task_id)
+
+    def get_task_by_id(self, task_id: str):
+        """根据 ID 获取任务"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM analysis_tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._row_to_task(row)
+
+    def get_completed_tasks(self, limit: int = 10):
+        """获取已完成的任务列表"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM analysis_tasks WHERE status = 'completed' ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [self._row_to_task(r) for r in rows]
+
+    # ==================== 队列操作（认领 / 心跳 / 回收） ====================
+
+    def claim_task(self, worker_id: str, lease_seconds: float = 300):
+        """
+        原子认领一个待处理任务（小任务优先），没有可认领的返回 None。
+        BEGIN IMMEDIATE 先拿写锁，选中 + 更新在同一事务里，多个 worker 不会认领到同一条。
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute("SELECT * FROM analysis_tasks WHERE status = 'pending'").fetchall()
+                if not rows:
+                    conn.execute("COMMIT")
+                    return None
+                task = sort_by_priority([dict(r) for r in rows])[0]
+                conn.execute(
+                    "UPDATE analysis_tasks SET status = 'processing', claimed_by = ?, lease_expires_at = ?,"
+                    " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (worker_id, lease_deadline(lease_seconds), utc_now().isoformat(), task["id"]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get_task_by_id(task["id"])
+
+    def heartbeat_task(self, task_id: str, worker_id: str, lease_seconds: float = 300) -> bool:
+        """续租；任务已不归该 worker（被回收/已结束）时返回 False"""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE analysis_tasks SET lease_expires_at = ? "
+                "WHERE id = ? AND status = 'processing' AND claimed_by = ?",
+                (lease_deadline(lease_seconds), task_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def requeue_expired_tasks(self, max_attempts: int = 3) -> int:
+        """租约过期的 processing 任务：未超次数的回到 pending，超过的置为 failed；返回处理条数"""
+        now = utc_now().isoformat()
+        with self._connect() as conn:
+            failed = conn.execute(
+                "UPDATE analysis_tasks SET status = 'failed', error_message = ?, lease_expires_at = NULL,"
+                " updated_at = ? WHERE status = 'processing' AND lease_expires_at < ? AND attempts >= ?",
+                (f"租约过期且已重试 {max_attempts} 次", now, now, max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE analysis_tasks SET status = 'pending', claimed_by = NULL, lease_expires_at = NULL,"
+                " updated_at = ? WHERE status = 'processing' AND lease_expires_at < ?",
+                (now, now),
+            ).rowcount
+        return failed + requeued
+
+    # ==================== 文件操作 ====================
+
+    def upload_file(self, bucket: str, file_path: str, file_content: bytes):
+        """上传文件到存储桶"""
+        dst = os.path.join(self.storage_dir, bucket, file_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(dst, "wb") as f:
+            f.write(file_content)
+        return {"path": file_path}
+
+    def download_file(self, bucket: str, file_path: str) -> bytes:
+        """从存储桶下载文件"""
+        with open(os.path.join(self.storage_dir, bucket, file_path), "rb") as f:
+            return f.read()
+
+    def upload_txt_file(self, task_id: str, file_content: bytes) -> str:
+        """上传聊天记录 txt 文件"""
+        file_path = f"tasks/{task_id}/chat.txt"
+        self.upload_file(self.uploads_bucket, file_path, file_content)
+        return file_path
+
+    def upload_mapping_file(self, task_id: str, file_content: bytes) -> str:
+        """上传 mapping xlsx 文件"""
+        file_path = f"tasks/{task_id}/mapping.xlsx"
+        self.upload_file(self.uploads_bucket, file_path, file_content)
+        return file_path
+
+    def download_task_files(self, task: dict, temp_dir: str):
+        """拷贝任务相关的文件到本地临时目录"""
+        os.makedirs(temp_dir, exist_ok=True)
+
+        txt_path = None
+        mapping_path = None
+
+        if task.get("txt_file_path"):
+            txt_path = os.path.join(temp_dir, "chat.txt")
+            shutil.copyfile(os.path.join(self.storage_dir, self.uploads_bucket, task["txt_file_path"]), txt_path)
+
+        if task.get("mapping_file_path"):
+            mapping_path = os.path.join(temp_dir, "mapping.xlsx")
+            shutil.copyfile(os.path.join(self.storage_dir, self.uploads_bucket, task["mapping_file_path"]), mapping_path)
+
+        return txt_path, mapping_path
+
+
+# ==================== worker 池 ====================
+
+class JobRunner:
+    """
+    N 个 worker 线程，各自循环：认领 → 处理（期间心跳续租）→ 再认领；队列空时 sleep poll_interval。
+    主线程每个 poll_interval 回收一次过期租约（其它进程里崩掉的 worker 留下的任务也会被收回）。
+
+    handler(task, store) 负责把任务置为 completed / failed，写回时带上 worker_id=task["claimed_by"]：
+    租约过期、任务被回收给别的 worker 后，旧 worker 的结果不会覆盖新 worker 的（写回返回 False，结果丢弃）。
+    handler 抛异常时这里兜底置为 failed（同样只在仍持有租约时）。
+    """
+
+    def __init__(
+        self,
+        store,
+        handler: Callable[[Dict[str, Any], Any], None],
+        workers: int = 2,
+        lease_seconds: float = 300,
+        poll_interval: float = 10,
+        max_attempts: int = 3,
+        worker_prefix: Optional[str] = None,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_prefix = worker_prefix or f"{socket.gethostname()}-{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ==================== 单个任务 ====================
+
+    def _heartbeat_loop(self, task_id: str, worker_id: str, done: threading.Event) -> None:
+        interval = max(self.lease_seconds / 3, 0.05)
+        while not done.wait(interval):
+            try:
+                if not self.store.heartbeat_task(task_id, worker_id, self.lease_seconds):
+                    # handler 刚写完 completed/failed 时也会走到这里，只有真被回收才提示
+                    if not done.is_set():
+                        print(f"⚠️ [{worker_id}] 任务 {task_id} 租约已失效（已被回收），本次结果将被丢弃")
+                    return
+            except Exception as e:  # 心跳失败不打断任务，下次再试
+                print(f"⚠️ [{worker_id}] 心跳失败: {e}")
+
+    def run_one(self, task: Dict[str, Any], worker_id: str) -> None:
+        done = threading.Event()
+        hb = threading.Thread(
+            target=self._heartbeat_loop, args=(task["id"], worker_id, done),
+            name=f"{worker_id}-hb", daemon=True,
+        )
+        hb.start()
+        try:
+            self.handler(task, self.store)
+        except Exception as e:
+            print(f"❌ [{worker_id}] 任务 {task['id']} 异常: {e}")
+            try:
+                if not self.store.set_task_failed(task["id"], f"{e}\n{traceback.format_exc()}", worker_id=worker_id):
+                    print(f"⚠️ [{worker_id}] 任务 {task['id']} 已不归本 worker，不置为失败")
+            except Exception as e2:
+                print(f"❌ [{worker_id}] 置为失败也出错（租约过期后会被回收）: {e2}")
+        finally:
+            done.set()
+            hb.join()
+
+    # ==================== 循环 ====================
+
+    def _worker_loop(self, n: int) -> None:
+        worker_id = f"{self.worker_prefix}-w{n}"
+        while not self._stop.is_set():
+            try:
+                task = self.store.claim_task(worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"\n❌ [{worker_id}] 认领任务出错: {e}")
+                task = None
+            if task is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            print(f"\n📬 [{worker_id}] 认领任务 {task['id']}（第 {task.get('attempts', 1)} 次）")
+            self.run_one(task, worker_id)
+
+    def reap(self) -> int:
+        """回收过期租约，返回处理的任务数"""
+        try:
+            n = self.store.requeue_expired_tasks(self.max_attempts)
+        except Exception as e:
+            print(f"\n❌ 回收过期任务出错: {e}")
+            return 0
+        if n:
+            print(f"\n♻️ 回收 {n} 个租约过期的任务")
+        return n
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._worker_loop, args=(i,), name=f"worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """不再认领新任务；wait=True 时等进行中的任务跑完"""
+        self._stop.set()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def run_forever(self) -> None:
+        """阻塞运行，Ctrl+C 后等进行中的任务结束再退出"""
+        self.reap()
+        self.start()
+        try:
+            while not self._stop.wait(self.poll_interval):
+                self.reap()
+        except KeyboardInterrupt:
+            print("\n\n👋 停止认领新任务，等待进行中的任务结束...")
+        finally:
+            self.stop(wait=True)
@@ -7,6 +7,8 @@ from datetime import datetime
 import json
 import os
 
+from job_queue import lease_deadline, utc_now
+
 # 导入配置
 try:
     from config import SUPABASE_URL, SUPABASE_KEY
@@ -47,32 +49,44 @@ class SupabaseClient:
         """设置任务为处理中"""
         return self.update_task_status(task_id, "processing")
     
+    def _finish(self, task_id: str, data: dict, worker_id: str = None) -> bool:
+        """写回最终状态；worker_id 不为空时只更新仍由该 worker 持有的 processing 任务。返回是否更新到了行"""
+        query = self.client.table(self.tasks_table)\
+            .update(data)\
+            .eq("id", task_id)
+        if worker_id is not None:
+            query = query.eq("status", "processing").eq("claimed_by", worker_id)
+        return bool(query.execute().data)
+    
     def set_task_completed(self, task_id: str, result: dict, 
                            total_messages: int = 0,
                            filtered_messages: int = 0,
-                           processing_time: float = 0):
-        """设置任务为已完成"""
-        return self.update_task_status(
-            task_id, 
-            "completed",
-            result=result,
-            total_messages=total_messages,
-            filtered_messages=filtered_messages,
-            processing_time_seconds=processing_time
-        )
-    
-    def set_task_failed(self, task_id: str, error_message: str):
-        """设置任务为失败"""
-        return self.update_task_status(
-            task_id, 
-            "failed",
-            error_message=error_message
-        )
+                           processing_time: float = 0,
+                           worker_id: str = None) -> bool:
+        """设置任务为已完成；传 worker_id 时任务已不归该 worker（租约过期被回收）则不写，返回 False"""
+        return self._finish(task_id, {
+            "status": "completed",
+            "result": result,
+            "total_messages": total_messages,
+            "filtered_messages": filtered_messages,
+            "processing_time_seconds": processing_time,
+            "lease_expires_at": None,
+        }, worker_id)
+    
+    def set_task_failed(self, task_id: str, error_message: str,
+                        worker_id: str = None) -> bool:
+        """设置任务为失败；worker_id 同 set_task_completed"""
+        return self._finish(task_id, {
+            "status": "failed",
+            "error_message": error_message,
+            "lease_expires_at": None,
+        }, worker_id)
     
     def create_task(self, start_time: str, end_time: str,
                     txt_file_path: str = None,
-                    mapping_file_path: str = None):
-        """创建新任务"""
+                    mapping_file_path: str = None,
+                    txt_file_size: int = None):
+        """创建新任务（txt_file_size 用于小任务优先调度；不填时由数据库触发器按 uploads 桶里的 txt 大小补上）"""
         data = {
             "start_time": start_time,
             "end_time": end_time,
@@ -80,6 +94,8 @@ class SupabaseClient:
             "mapping_file_path": mapping_file_path,
             "status": "pending"
         }
+        if txt_file_size is not None:
+            data["txt_file_size"] = txt_file_size
         response = self.client.table(self.tasks_table)\
             .insert(data)\
             .execute()
@@ -103,6 +119,70 @@ class SupabaseClient:
             .execute()
         return response.data
     
+    # ==================== 队列操作（认领 / 心跳 / 回收） ====================
+    
+    def claim_task(self, worker_id: str, lease_seconds: float = 300,
+                   candidates: int = 20):
+        """
+        原子认领一个待处理任务（小任务优先），没有可认领的返回 None。
+        排序在数据库里做（txt_file_size 升序、没有大小的排最后，同样大小按创建时间），
+        candidates 只是被别人抢走时的备选数量，不影响优先级。
+        条件更新 status = 'pending' → 'processing'：并发时只有一个 worker 的 update 会命中，
+        没命中说明被别人抢走了，换下一个候选。
+        """
+        response = self.client.table(self.tasks_table)\
+            .select("*")\
+            .eq("status", "pending")\
+            .order("txt_file_size", nullsfirst=False)\
+            .order("created_at")\
+            .limit(candidates)\
+            .execute()
+        for task in response.data or []:
+            claimed = self.client.table(self.tasks_table)\
+                .update({
+                    "status": "processing",
+                    "claimed_by": worker_id,
+                    "lease_expires_at": lease_deadline(lease_seconds),
+                    "attempts": (task.get("attempts") or 0) + 1,
+                })\
+                .eq("id", task["id"])\
+                .eq("status", "pending")\
+                .execute()
+            if claimed.data:
+                return claimed.data[0]
+        return None
+    
+    def heartbeat_task(self, task_id: str, worker_id: str,
+                       lease_seconds: float = 300) -> bool:
+        """续租；任务已不归该 worker（被回收/已结束）时返回 False"""
+        response = self.client.table(self.tasks_table)\
+            .update({"lease_expires_at": lease_deadline(lease_seconds)})\
+            .eq("id", task_id)\
+            .eq("status", "processing")\
+            .eq("claimed_by", worker_id)\
+            .execute()
+        return bool(response.data)
+    
+    def requeue_expired_tasks(self, max_attempts: int = 3) -> int:
+        """租约过期的 processing 任务：未超次数的回到 pending，超过的置为 failed；返回处理条数"""
+        now = utc_now().isoformat()
+        failed = self.client.table(self.tasks_table)\
+            .update({
+                "status": "failed",
+                "error_message": f"租约过期且已重试 {max_attempts} 次",
+                "lease_expires_at": None,
+            })\
+            .eq("status", "processing")\
+            .lt("lease_expires_at", now)\
+            .gte("attempts", max_attempts)\
+            .execute()
+        requeued = self.client.table(self.tasks_table)\
+            .update({"status": "pending", "claimed_by": None, "lease_expires_at": None})\
+            .eq("status", "processing")\
+            .lt("lease_expires_at", now)\
+            .execute()
+        return len(failed.data or []) + len(requeued.data or [])
+    
     # ==================== 文件操作 ====================
     
     def upload_file(self, bucket: str, file_path: str, file_content: bytes):
@@ -14,6 +14,13 @@ from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedSty
 
 import re
 
+# --- 话题簇白名单：读写 + 按批只取相近 top-k 的校正提示词，来自 core.topic_whitelist ---
+from core.topic_whitelist import (  # noqa: F401  notebook 从本模块导入这些名字
+    load_whitelist,
+    update_and_save_whitelist,
+    build_user_prompt_cluster_correct,
+)
+
 ################模型调用，出结果###################
 
 def load_system_prompt(path: Path) -> str:
@@ -46,20 +53,6 @@ def build_user_prompt_classify(jsonl_block: str) -> str:
         "【输入】：\n" + jsonl_block
     )
 
-def build_user_prompt_cluster_correct(clustered_jsonl: str, whitelist: List[Dict]) -> str:
-    whitelist_text = "[当前白名单为空，暂无参考命名]" if not whitelist else "\n".join(
-        json.dumps(x, ensure_ascii=False) for x in whitelist
-    )
-    return (
-        "你是一位“话题簇命名校正专家”。对照白名单统一命名；不匹配则保留原名。\n"
-        "仅输出字段：发言日期、发言时间、玩家ID、玩家消息、分类标签、话题簇、话题簇描述。\n"
-        "命中白名单时：话题簇 = 白名单名称；话题簇描述 = 白名单相关描述。\n"
-        "未命中白名单时：话题簇保持输入值；话题簇描述沿用输入（若无则输出空字符串）。\n\n"
-        "【发言】：\n" + clustered_jsonl + "\n\n"
-        "【白名单】：\n" + whitelist_text + "\n"
-    )
-
-
 def call_ark_chat_completions(
     api_url: str,
     api_key: str,
@@ -198,12 +191,6 @@ def jsonl_to_dataframe_with_intent(jsonl_text: str) -> pd.DataFrame:
     return df[["话题簇","发言时间","玩家ID","玩家消息","一级分类"]]
 
 ##########################话提簇数据库################################
-def load_whitelist(path: Path) -> list[dict]:
-    if not path.exists():
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f if line.strip()]
-
 def extract_clusters_from_output(output_text: str) -> list[dict]:
     import json, re
     if not output_text:
@@ -244,22 +231,6 @@ def extract_clusters_from_output(output_text: str) -> list[dict]:
     return results
 
 
-def update_and_save_whitelist(path: Path, current: list[dict], new_items: list[dict]) -> list[dict]:
-    existing_names = {item["话题簇名称"] for item in current}
-    added = [item for item in new_items if item["话题簇名称"] not in existing_names]
-
-    if added:
-        with open(path, "a", encoding="utf-8") as f:
-            for item in added:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-        current.extend(added)
-        print(f"✅ 新增 {len(added)} 条话题簇至白名单")
-    else:
-        print("⚪ 无新增话题簇")
-
-    return current
-
-
 ##########################导入Excel格式要求###########################
 
 from pathlib import Path
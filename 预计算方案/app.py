@@ -1491,6 +1491,14 @@ def show_homepage():
                         selected_date = selected_date_obj.strftime("%Y-%m-%d")
                         if selected_date in available_dates:
                             st.session_state.homepage_date_cache = selected_date
+                            # 索引里带每日 summary，预览当天概况不用先加载日结果文件
+                            day_summary = index.get("days", {}).get(selected_date)
+                            if day_summary:
+                                st.caption(
+                                    f"🔥 {day_summary.get('top_cluster', '')} · "
+                                    f"{day_summary.get('total_clusters', 0)} 个话题簇 · "
+                                    f"{day_summary.get('total_messages', 0)} 条发言"
+                                )
                     else:
                         selected_date = None
                 else:
@@ -0,0 +1,139 @@
+"""
+多群、多日期并行回填历史结果
+- 每个群的聊天记录只解析一次（core.build_jsonl_by_day），按天切分后随任务下发，子进程不再重复解析
+- (群, 日期) 任务交给 run_daily 的进程池：速率按 TOTAL_QPS 均分，同时在途的模型请求数受跨进程信号量限制
+- results/groupN/index.json 里已有的日期默认跳过（--force 覆盖）；当天没有发言的日期不建任务
+- 每个任务完成即原子写入结果文件并增量合并进索引，中断后重跑同一命令只补缺的日期
+
+使用方法:
+    python backfill.py --groups 1,2 --from 2025-12-01 --to 2026-01-08
+    python backfill.py --from 2025-12-01 --to 2025-12-31 --jobs 4 --api-concurrency 6
+    python backfill.py --groups 1 --from 2025-12-20 --to 2025-12-20 --force   # 覆盖已有结果
+（需先设置环境变量 ARK_API_KEY）
+"""
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from config import API_KEY, SOURCE_DIR, SPEAKER_MAP, PARALLEL_JOBS, TOTAL_QPS, API_CONCURRENCY, PARSE_CACHE_DIR
+from save_results import GROUPS, load_group_dates
+from run_daily import GROUP_CONFIGS, MISSING_API_KEY, AnalysisJob, find_chat_export, parse_groups, run_jobs, save_job_result
+
+
+def date_range(date_from: str, date_to: str) -> List[str]:
+    """[date_from, date_to] 闭区间内的每一天"""
+    start = datetime.strptime(date_from, "%Y-%m-%d")
+    end = datetime.strptime(date_to, "%Y-%m-%d")
+    if end < start:
+        raise ValueError(f"结束日期 {date_to} 早于开始日期 {date_from}")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+
+
+def plan_jobs(group_ids: List[str], dates: List[str], force: bool = False) -> Tuple[List[AnalysisJob], Dict[str, int]]:
+    """
+    按群解析一次聊天记录，为还没有结果、且当天有发言的日期建任务。
+    返回 (任务列表, {"skipped": 已有结果, "no_data": 当天无发言, "missing_export": 找不到聊天记录的群数})
+    """
+    from core import build_jsonl_by_day
+
+    jobs: List[AnalysisJob] = []
+    stats = {"skipped": 0, "no_data": 0, "missing_export": 0}
+    for gid in group_ids:
+        name = GROUPS[gid]["name"]
+        existing = set() if force else load_group_dates(gid)
+        pending = [d for d in dates if d not in existing]
+        stats["skipped"] += len(dates) - len(pending)
+        if not pending:
+            print(f"⏩ {name}: {len(dates)} 天都已有结果，跳过")
+            continue
+
+        nb_config = GROUP_CONFIGS[gid]
+        txt_path = find_chat_export(nb_config["txt_pattern"])
+        if txt_path is None:
+            print(f"❌ {name}: 未找到聊天记录 {nb_config['txt_pattern']}")
+            stats["missing_export"] += 1
+            continue
+
+        t0 = time.time()
+        end_time = (datetime.strptime(pending[-1], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        by_day = build_jsonl_by_day(
+            txt_path, SOURCE_DIR / nb_config["mapping_file"], SPEAKER_MAP,
+            f"{pending[0]} 00:00:00", f"{end_time} 00:00:00", cache_dir=PARSE_CACHE_DIR,
+        )
+        group_jobs = [AnalysisJob(gid, d, lines=tuple(by_day[d])) for d in pending if by_day.get(d)]
+        stats["no_data"] += len(pending) - len(group_jobs)
+        jobs.extend(group_jobs)
+        print(f"📖 {name}: 解析 {txt_path.name} 用时 {time.time() - t0:.1f}s，"
+              f"待分析 {len(group_jobs)} 天，无发言 {len(pending) - len(group_jobs)} 天，"
+              f"已有结果 {len(dates) - len(pending)} 天")
+    return jobs, stats
+
+
+def backfill(group_ids: List[str], date_from: str, date_to: str,
+             processes: int = PARALLEL_JOBS, resume: bool = True,
+             api_concurrency: int = API_CONCURRENCY, force: bool = False) -> bool:
+    """回填 [date_from, date_to] 的结果，所有任务成功（或无需分析）时返回 True"""
+    dates = date_range(date_from, date_to)
+
+    print("=" * 60)
+    print("🗂️ 批量回填历史结果")
+    print("=" * 60)
+    print(f"📅 日期: {date_from} ~ {date_to}（{len(dates)} 天）")
+    print(f"👥 群: {', '.join(GROUPS[g]['name'] for g in group_ids)}")
+    print(f"⚙️ 进程数: {processes}，总 QPS: {TOTAL_QPS}，并发上限: {api_concurrency}")
+    print()
+
+    jobs, stats = plan_jobs(group_ids, dates, force=force)
+    if not jobs:
+        print("\n✅ 没有需要分析的日期")
+        return stats["missing_export"] == 0
+
+    # 先跑日期早的，中途停下时结果是连续的一段
+    jobs.sort(key=lambda j: (j.date, j.group_id))
+    print(f"\n🚀 共 {len(jobs)} 个任务")
+    results = run_jobs(jobs, processes=processes, resume=resume, api_concurrency=api_concurrency,
+                       on_result=lambda job, res: save_job_result(res))
+
+    saved = sum(1 for r in results if r.get("status") == "success")
+    failed = [r for r in results if r.get("status") not in ("success", "no_data")]
+
+    print(f"\n📊 完成 {saved}，失败 {len(failed)}，跳过（已有结果）{stats['skipped']}，无发言 {stats['no_data']}")
+    for r in sorted(failed, key=lambda r: (r["date"], r["group_id"])):
+        print(f"   ❌ {GROUPS[r['group_id']]['name']} {r['date']}: {r.get('error')}")
+    return not failed and stats["missing_export"] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多群、多日期并行回填历史结果")
+    parser.add_argument("--groups", type=parse_groups, default=None, help="群ID，逗号分隔，如 1,2（默认全部）")
+    parser.add_argument("--from", dest="date_from", type=str, required=True, help="开始日期 (YYYY-MM-DD)，含")
+    parser.add_argument("--to", dest="date_to", type=str, required=True, help="结束日期 (YYYY-MM-DD)，含")
+    parser.add_argument("--jobs", type=int, default=PARALLEL_JOBS, help="并行进程数")
+    parser.add_argument("--api-concurrency", type=int, default=API_CONCURRENCY,
+                        help="所有进程合计同时在途的模型请求数上限（<=0 不限）")
+    parser.add_argument("--force", action="store_true", help="索引里已有的日期也重新分析并覆盖")
+    parser.add_argument("--fresh", action="store_true", help="忽略旧检查点，从头重跑")
+    args = parser.parse_args()
+    if not API_KEY:
+        parser.error(MISSING_API_KEY)
+
+    try:
+        success = backfill(
+            args.groups or list(GROUP_CONFIGS), args.date_from, args.date_to,
+            processes=args.jobs, resume=not args.fresh,
+            api_concurrency=args.api_concurrency, force=args.force,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("\n" + "=" * 60)
+    print("🎉 回填完成!" if success else "❌ 部分任务失败，请检查错误信息（重跑同一命令只补失败的日期）")
+    print("=" * 60)
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
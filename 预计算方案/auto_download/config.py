@@ -1,6 +1,7 @@
 """
 自动下载配置文件
 """
+import os
 from pathlib import Path
 
 # ==================== 路径配置 ====================
@@ -38,12 +39,14 @@ QQ_GROUPS = [
 NOTEBOOKS = [
     {
         "name": "地球群1",
+        "group_id": "1",  # 对应 results/group1
         "notebook": SOURCE_DIR / "top5_Q2_group1.ipynb",
         "mapping_file": "mapping地球1.xlsx",
         "txt_pattern": "《欢迎来到地球》测试1群.txt",  # 下载后的文件名
     },
     {
         "name": "地球群2",
+        "group_id": "2",  # 对应 results/group2
         "notebook": SOURCE_DIR / "top5_Q2_group2.ipynb",
         "mapping_file": "mapping地球2.xlsx",
         "txt_pattern": "《欢迎来到地球》测试2群.txt",  # 下载后的文件名
@@ -53,6 +56,30 @@ NOTEBOOKS = [
 # 保持向后兼容
 NOTEBOOK_PATH = SOURCE_DIR / "top5_Q2.ipynb"
 
+# ==================== 原生流水线配置（run_daily.py / backfill.py，不依赖 Jupyter） ====================
+# 与 预计算方案/save_result.py 保持一致；群 / 聊天记录 / mapping 沿用上面的 NOTEBOOKS
+
+API_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+API_KEY = os.environ.get("ARK_API_KEY", "")   # 火山方舟 API Key，从环境变量读，不写进代码
+V3_MODEL_ID = "ep-20251020160142-5d7hp"
+V3_1_MODEL_ID = "ep-20251020160025-9p5tj"
+
+SPEAKER_MAP = {
+    "16186514": "peter本尊",
+    "1655611808": "运营绾绾",
+    "2073820674": "沙利文老师",
+    "2726067525": "milissa",
+}
+
+BATCH_TOKENS = 15000     # 单批估算 token 预算
+PARALLEL_JOBS = 2        # 同时跑的 (群, 日期) 进程数
+TOTAL_QPS = 2.0          # 所有进程合计的模型请求速率上限（次/秒），按进程数均分
+API_CONCURRENCY = 8      # 所有进程合计同时在途的模型请求数上限（跨进程信号量）
+
+# 检查点 / 解析缓存（与 save_result.py 共用，续跑时已完成的阶段直接读盘）
+CHECKPOINT_DIR = PROJECT_ROOT / "预计算方案" / "checkpoints"
+PARSE_CACHE_DIR = PROJECT_ROOT / "预计算方案" / "parse_cache"
+
 # ==================== 操作等待时间（秒） ====================
 
 WAIT_TIMES = {
@@ -3,7 +3,7 @@
 每天凌晨自动执行：
 
 1. 点击脚本下载 2个群的聊天记录 txt
-2. 自动执行 Jupyter Notebook 分析
+2. 用原生流水线（run_daily.py）分析，不需要 Jupyter
 3. 保存结果到 results/ 并推送到 GitHub
 
 使用方法：
@@ -11,6 +11,7 @@
   python full_pipeline.py --skip-download  # 跳过下载，只运行分析
   python full_pipeline.py --skip-push      # 跳过推送
   python full_pipeline.py --date 2025-12-23  # 指定日期
+  python full_pipeline.py --use-notebook   # 旧方式：nbclient 执行 Notebook
 """
 import sys
 import os
@@ -58,9 +59,27 @@ def step1_download_chat():
         return False
 
 
+def step2_run_native_analysis(date_str: str):
+    """
+    步骤2: 原生流水线分析（run_daily.py）
+    两个群在多进程里并行跑，结果直接写入 results/ 并更新索引
+    """
+    print("\n" + "=" * 60)
+    print(f"📊 步骤 2/3: 原生流水线分析 ({date_str})")
+    print("=" * 60)
+
+    from run_daily import run_daily
+
+    try:
+        return run_daily(date_str)
+    except Exception as e:
+        print(f"❌ 执行出错: {e}")
+        return False
+
+
 def step2_run_jupyter_analysis(date_str: str):
     """
-    步骤2: 自动执行 Jupyter Notebook 分析
+    步骤2（旧方式）: 自动执行 Jupyter Notebook 分析
     
     直接执行你的 top5_Q2.ipynb，通过环境变量传递日期
     """
@@ -181,8 +200,10 @@ def main():
     parser.add_argument("--skip-download", action="store_true", help="跳过下载步骤")
     parser.add_argument("--skip-push", action="store_true", help="跳过推送步骤")
     parser.add_argument("--date", type=str, help="分析日期 (YYYY-MM-DD)，默认为昨天")
+    parser.add_argument("--use-notebook", action="store_true",
+                       help="使用 run_notebook.py 执行 Notebook（旧方式，需要 Jupyter）")
     parser.add_argument("--use-script", action="store_true", 
-                       help="使用 save_result.py 而不是执行 Notebook")
+                       help="使用 save_result.py 逐群串行分析")
     args = parser.parse_args()
     
     # 确定分析日期
@@ -209,9 +230,12 @@ def main():
     if args.use_script:
         # 使用 save_result.py（Python 脚本复现 Notebook 逻辑）
         step2_use_save_result(date_str)
-    else:
+    elif args.use_notebook:
         # 使用 run_notebook.py（直接执行 Notebook）
         step2_run_jupyter_analysis(date_str)
+    else:
+        # 使用 run_daily.py（core 流水线，多进程并行）
+        step2_run_native_analysis(date_str)
     
     # 步骤 3: 推送
     if not args.skip_push:
@@ -0,0 +1,268 @@
+"""
+原生 Python 执行每日分析（替代 run_notebook.py 的 nbclient / nbconvert 方式）
+- 每个 (群, 日期) 是一个任务，按 core.pipeline 的 DAG 跑 Step 1~6：不启动 Jupyter 内核，不改写 notebook 源码
+- 任务分发到多进程并行：模型请求速率按进程数均分 TOTAL_QPS，同时在途的请求数由跨进程信号量限制在 API_CONCURRENCY 以内
+- 每个任务有独立检查点（run_id 由 txt 指纹 + 时间范围生成），中断后重跑只补未完成的阶段/批次
+- 结果由主进程写 results/groupN/<date>.json（原子替换）并增量更新索引，子进程不碰结果目录
+- 多日回填见 backfill.py（复用这里的任务 / 进程池）
+
+使用方法:
+    python run_daily.py                                # 分析昨天，全部群
+    python run_daily.py --date 2026-01-08 --groups 1   # 指定日期 / 群
+    python run_daily.py --jobs 4 --fresh               # 4 个进程，忽略旧检查点重新跑
+（需先设置环境变量 ARK_API_KEY）
+"""
+import sys
+import time
+import argparse
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import (
+    SOURCE_DIR, CHAT_SAVE_DIR, NOTEBOOKS,
+    API_URL, API_KEY, V3_MODEL_ID, V3_1_MODEL_ID, SPEAKER_MAP,
+    BATCH_TOKENS, PARALLEL_JOBS, TOTAL_QPS, API_CONCURRENCY, CHECKPOINT_DIR, PARSE_CACHE_DIR,
+)
+from save_results import GROUPS, save_day_result
+
+# 群 ID → 聊天记录 / mapping 配置（沿用 NOTEBOOKS，不再需要 notebook 本身）
+GROUP_CONFIGS: Dict[str, dict] = {nb["group_id"]: nb for nb in NOTEBOOKS}
+
+MISSING_API_KEY = "未设置环境变量 ARK_API_KEY（火山方舟 API Key）"
+
+# 本进程的模型请求并发槽位（跨进程共享的信号量，由 run_jobs 经进程池 initializer 注入）
+_API_SLOTS = None
+
+
+@dataclass(frozen=True)
+class AnalysisJob:
+    group_id: str
+    date: str  # YYYY-MM-DD
+    # 主进程已解析好的当天 JSONL 行（backfill 一次解析后按天切分）；None 时子进程自己解析
+    lines: Optional[Tuple[str, ...]] = field(default=None, compare=False, repr=False)
+
+    @property
+    def start_time(self) -> str:
+        return f"{self.date} 00:00:00"
+
+    @property
+    def end_time(self) -> str:
+        next_day = datetime.strptime(self.date, "%Y-%m-%d") + timedelta(days=1)
+        return f"{next_day.strftime('%Y-%m-%d')} 00:00:00"
+
+    @property
+    def label(self) -> str:
+        return f"{GROUPS[self.group_id]['name']} {self.date}"
+
+
+def find_chat_export(pattern: str) -> Optional[Path]:
+    """
+    找群聊天记录 txt：先精确匹配，再匹配带日期前缀的文件（如 "1219《欢迎来到地球》测试1群.txt"），
+    多个候选时取最近修改的那份
+    """
+    exact = CHAT_SAVE_DIR / pattern
+    if exact.exists():
+        return exact
+    matches = sorted(CHAT_SAVE_DIR.glob(f"*{pattern}"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return matches[0] if matches else None
+
+
+def make_config(qps: float):
+    from core import PipelineConfig
+
+    if not API_KEY:
+        raise RuntimeError(MISSING_API_KEY)
+
+    # 进程内批次仍并发，整体速率由 qps 控制
+    return PipelineConfig(
+        api_url=API_URL,
+        api_key=API_KEY,
+        filter_model=V3_MODEL_ID,
+        main_model=V3_1_MODEL_ID,
+        prompt_dir=SOURCE_DIR,
+        batch_tokens=BATCH_TOKENS,
+        qps=qps,
+        parse_cache_dir=PARSE_CACHE_DIR,
+    )
+
+
+def _init_worker(api_slots):
+    global _API_SLOTS
+    _API_SLOTS = api_slots
+
+
+def _incomplete_reason(result: dict) -> Optional[str]:
+    """
+    只看真正的失败信号：批次出错、模型返回空输出、流式输出中断、讨论点失败（流水线标了 partial）。
+    返回原因，当作失败处理；正常结果（包括当天只有表情/水聊、没有话题簇的“空”日期）返回 None
+    """
+    if result.get("status") != "success" or not result.get("partial"):
+        return None
+    reasons = result.get("partial_reasons") or ["模型输出不完整"]
+    return "结果不完整：" + "；".join(reasons)
+
+
+def run_job(job: AnalysisJob, qps: float, resume: bool = True) -> dict:
+    """
+    子进程入口：跑完一个 (群, 日期)，返回 run_pipeline 的结果字典（附 group_id / elapsed）。
+    异常不往外抛，记为 status="error"，其它任务照常继续；结果不完整时同样记为 error（见 _incomplete_reason）。
+    有发言但没有话题簇的日期是正常结果（status="success"，top5_clusters 为空），照常保存、进索引。
+    """
+    from core import CheckpointStore, MessageStore, make_model_caller, run_pipeline
+
+    t0 = time.time()
+    result = {"group_id": job.group_id, "date": job.date, "error": None}
+    try:
+        nb_config = GROUP_CONFIGS[job.group_id]
+        txt_path = find_chat_export(nb_config["txt_pattern"])
+        if txt_path is None:
+            raise FileNotFoundError(f"未找到聊天记录: {nb_config['txt_pattern']}（目录 {CHAT_SAVE_DIR}）")
+
+        cfg = make_config(qps)
+        ckpt = CheckpointStore(CHECKPOINT_DIR, cfg.run_id_for(txt_path, job.start_time, job.end_time), resume=resume)
+
+        def _progress(step: int, total: int, message: str):
+            print(f"  [{job.label}] [{step}/{total}] {message}", flush=True)
+
+        run_pipeline(
+            cfg, txt_path, SOURCE_DIR / nb_config["mapping_file"], SPEAKER_MAP,
+            job.start_time, job.end_time, ckpt=ckpt, progress=_progress, result=result,
+            call_model=make_model_caller(cfg, concurrency=_API_SLOTS),
+            store=MessageStore.from_lines(job.lines) if job.lines is not None else None,
+        )
+        reason = _incomplete_reason(result)
+        if reason:
+            # 不保存、不进索引；出问题的批次和之后的阶段都没落检查点，下次只重跑这些，已完成的批次直接读盘
+            result["status"] = "error"
+            result["error"] = reason
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        result["traceback"] = traceback.format_exc()
+    result["elapsed"] = round(time.time() - t0, 1)
+    return result
+
+
+def run_jobs(
+    jobs: List[AnalysisJob],
+    processes: int = PARALLEL_JOBS,
+    resume: bool = True,
+    api_concurrency: int = API_CONCURRENCY,
+    on_result: Optional[Callable[[AnalysisJob, dict], None]] = None,
+) -> List[dict]:
+    """
+    多进程跑一批任务；processes<=1 或只有一个任务时在当前进程里跑（方便调试）。
+    on_result 在主进程里按完成顺序调用，用来边跑边保存（中断时已完成的日期不丢）。
+    """
+    if not jobs:
+        return []
+    processes = max(1, min(processes, len(jobs)))
+    qps = TOTAL_QPS / processes if TOTAL_QPS > 0 else 0
+    api_slots = multiprocessing.BoundedSemaphore(api_concurrency) if api_concurrency > 0 else None
+
+    results = []
+
+    def _collect(job: AnalysisJob, res: dict):
+        results.append(res)
+        _print_job_status(job, res)
+        if on_result:
+            on_result(job, res)
+
+    if processes == 1:
+        _init_worker(api_slots)
+        for job in jobs:
+            _collect(job, run_job(job, qps, resume))
+        return results
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(api_slots,)) as pool:
+        futures = {pool.submit(run_job, job, qps, resume): job for job in jobs}
+        for fut in as_completed(futures):
+            job = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:  # 子进程本身挂掉（如被杀）
+                res = {"group_id": job.group_id, "date": job.date, "status": "error", "error": str(e)}
+            _collect(job, res)
+    return results
+
+
+def _print_job_status(job: AnalysisJob, res: dict):
+    status = res.get("status")
+    if status == "success" and not res["top5_clusters"]:
+        print(f"✅ {job.label}: {res.get('total_messages', 0)} 条消息，没有可归纳的话题，{res.get('elapsed', '?')}s")
+    elif status == "success":
+        print(f"✅ {job.label}: Top{len(res['top5_clusters'])}，{res.get('total_messages', 0)} 条消息，{res.get('elapsed', '?')}s")
+    elif status == "no_data":
+        print(f"⚠️ {job.label}: 当天没有聊天记录")
+    else:
+        print(f"❌ {job.label}: {res.get('error')}")
+
+
+def save_job_result(res: dict) -> Optional[Path]:
+    """主进程写单个任务的结果文件并增量更新索引；非成功结果返回 None"""
+    if res.get("status") != "success":
+        return None
+    output_file = save_day_result(res["group_id"], res["date"], res["top5_clusters"])
+    print(f"💾 已保存: {output_file.parent.name}/{output_file.name}")
+    return output_file
+
+
+def run_daily(date_str: str = None, group_ids: List[str] = None,
+              processes: int = PARALLEL_JOBS, resume: bool = True,
+              api_concurrency: int = API_CONCURRENCY) -> bool:
+    """分析某一天（默认昨天）的指定群（默认全部），全部成功或无数据时返回 True"""
+    if date_str is None:
+        date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    group_ids = group_ids or list(GROUP_CONFIGS)
+    jobs = [AnalysisJob(gid, date_str) for gid in group_ids]
+
+    print("=" * 60)
+    print("🚀 原生流水线执行每日分析（无需 Jupyter）")
+    print("=" * 60)
+    print(f"📅 分析日期: {date_str}")
+    print(f"👥 群: {', '.join(GROUPS[g]['name'] for g in group_ids)}")
+    print(f"⚙️ 进程数: {min(processes, len(jobs))}，总 QPS: {TOTAL_QPS}，并发上限: {api_concurrency}")
+    print()
+
+    results = run_jobs(jobs, processes=processes, resume=resume, api_concurrency=api_concurrency,
+                       on_result=lambda job, res: save_job_result(res))
+    return all(r.get("status") in ("success", "no_data") for r in results)
+
+
+def parse_groups(value: str) -> List[str]:
+    groups = [g.strip() for g in value.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in GROUP_CONFIGS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"未知的群ID: {', '.join(unknown)}（可选 {', '.join(GROUP_CONFIGS)}）")
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原生 Python 执行每日分析（替代 Jupyter Notebook）")
+    parser.add_argument("--date", type=str, help="分析日期 (YYYY-MM-DD)，默认为昨天")
+    parser.add_argument("--groups", type=parse_groups, default=None, help="群ID，逗号分隔，如 1,2（默认全部）")
+    parser.add_argument("--jobs", type=int, default=PARALLEL_JOBS, help="并行进程数")
+    parser.add_argument("--api-concurrency", type=int, default=API_CONCURRENCY,
+                        help="所有进程合计同时在途的模型请求数上限（<=0 不限）")
+    parser.add_argument("--fresh", action="store_true", help="忽略旧检查点，从头重跑")
+    args = parser.parse_args()
+    if not API_KEY:
+        parser.error(MISSING_API_KEY)
+
+    success = run_daily(args.date, args.groups, processes=args.jobs, resume=not args.fresh,
+                        api_concurrency=args.api_concurrency)
+
+    print("\n" + "=" * 60)
+    print("🎉 执行完成!" if success else "❌ 部分任务失败，请检查错误信息")
+    print("=" * 60)
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
-自动执行 Jupyter Notebook 分析
+自动执行 Jupyter Notebook 分析（旧方式）
 自动修改日期参数后执行 top5_Q2.ipynb
+默认流程已改用 run_daily.py（core 流水线，不需要 Jupyter），此脚本仅在 full_pipeline.py --use-notebook 时使用
 
 使用方法:
     python run_notebook.py                    # 分析昨天的数据
@@ -5,11 +5,10 @@ import sys
 from pathlib import Path
 from datetime import datetime, timedelta
 
-# 添加项目根目录到路径
-PROJECT_ROOT = Path(__file__).parent.parent.parent
-sys.path.insert(0, str(PROJECT_ROOT))
+# 添加当前目录到路径
+sys.path.insert(0, str(Path(__file__).parent))
 
-from auto_download.run_notebook import run_notebook_via_nbclient
+from run_daily import run_daily
 
 if __name__ == "__main__":
     # 计算昨天的日期
@@ -22,17 +21,16 @@ if __name__ == "__main__":
     print(f"📅 分析日期: {date_str}")
     print()
     
-    # 运行所有 notebook
-    success = run_notebook_via_nbclient(date_str, run_all=True)
+    # 原生流水线分析所有群（结果直接写入 results/ 并更新索引）
+    success = run_daily(date_str)
     
     if success:
         print("\n" + "=" * 60)
         print("🎉 执行完成！")
         print("=" * 60)
         print("\n下一步：")
-        print("1. 检查输出文件")
-        print("2. 使用 save_results.py 保存结果")
-        print("3. 推送到 GitHub")
+        print("1. 检查 预计算方案/results/ 下的结果")
+        print("2. 推送到 GitHub")
     else:
         print("\n" + "=" * 60)
         print("❌ 执行失败，请检查错误信息")
@@ -23,11 +23,17 @@
     
     # 从文件读取保存
     python save_results.py --group 1 --file output.json --push
+
+    # 手工增删结果文件后重建所有索引
+    python save_results.py --rebuild-index
 """
 import json
 import os
 import subprocess
 import sys
+import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
@@ -52,6 +58,30 @@ def get_group_dir(group_id: str) -> Path:
     return RESULTS_DIR / group["dir"]
 
 
+def write_json_atomic(path: Path, data) -> Path:
+    """先写同目录临时文件再 os.replace：中途被打断不会留下半截 JSON，网页读到的要么是旧文件要么是新文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def load_group_dates(group_id: str) -> set:
+    """群索引 index.json 里已有结果的日期"""
+    index_file = get_group_dir(group_id) / "index.json"
+    if not index_file.exists():
+        return set()
+    with open(index_file, 'r', encoding='utf-8') as f:
+        return set(json.load(f).get("available_dates", []))
+
+
 def save_from_paste(group_id: str) -> bool:
     """
     从粘贴的 JSON 内容保存结果
@@ -176,107 +206,224 @@ def save_results_to_group(group_id: str, results: list) -> bool:
     for date in sorted(by_date.keys()):
         print(f"   {date}: {len(by_date[date])} 条话题簇")
     
-    # 保存每日结果
+    # 保存每日结果（逐日增量合并进群索引和总索引）
     saved_files = []
     for date in sorted(by_date.keys()):
         if date == "unknown":
             continue
-        
-        clusters = by_date[date]
-        
-        # 构建结果
-        result = {
-            "group": group["name"],
-            "group_id": group_id,
-            "date": date,
-            "generated_at": datetime.now().isoformat(),
-            "clusters": clusters,
-            "summary": {
-                "total_clusters": len(clusters),
-                "total_players": sum(c.get("发言玩家总数", 0) for c in clusters),
-                "total_messages": sum(c.get("发言总数", 0) for c in clusters),
-                "top_cluster": max(clusters, key=lambda x: x.get("热度评分", 0)).get("聚合话题簇", "") if clusters else "",
-            }
-        }
-        
-        # 保存
-        output_file = group_dir / f"{date}.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        
+        output_file = save_day_result(group_id, date, by_date[date])
         print(f"✅ 已保存: {group['dir']}/{date}.json")
         saved_files.append(output_file)
     
-    # 更新群索引
-    update_group_index(group_id)
-    
-    # 更新总索引
-    update_main_index()
-    
     print(f"\n📊 {group['name']} 共保存 {len(saved_files)} 个日期的结果")
     return True
 
 
-def update_group_index(group_id: str):
-    """更新群的索引文件"""
+def build_day_result(group_id: str, date: str, clusters: list) -> dict:
+    """单个群单日的结果文件内容（网页按这个结构读取）"""
     group = GROUPS.get(group_id)
-    group_dir = get_group_dir(group_id)
-    
-    # 扫描所有日期文件
-    dates = []
-    for f in group_dir.glob("*.json"):
-        if f.name != "index.json":
-            dates.append(f.stem)
-    
-    index = {
+    return {
         "group": group["name"],
         "group_id": group_id,
+        "date": date,
+        "generated_at": datetime.now().isoformat(),
+        "clusters": clusters,
+        "summary": {
+            "total_clusters": len(clusters),
+            "total_players": sum(c.get("发言玩家总数", 0) for c in clusters),
+            "total_messages": sum(c.get("发言总数", 0) for c in clusters),
+            "top_cluster": max(clusters, key=lambda x: x.get("热度评分", 0)).get("聚合话题簇", "") if clusters else "",
+        }
+    }
+
+
+def write_day_result(group_id: str, date: str, clusters: list) -> Path:
+    """只写 results/groupN/<date>.json，不动索引（一般用 save_day_result）"""
+    output_file = get_group_dir(group_id) / f"{date}.json"
+    return write_json_atomic(output_file, build_day_result(group_id, date, clusters))
+
+
+def save_day_result(group_id: str, date: str, clusters: list) -> Path:
+    """写单日结果文件，并把这一天增量合并进群索引和总索引"""
+    result = build_day_result(group_id, date, clusters)
+    output_file = write_json_atomic(get_group_dir(group_id) / f"{date}.json", result)
+    merge_day_into_index(group_id, date, day_index_entry(result))
+    return output_file
+
+
+# ==================== 索引 ====================
+# 群索引 groupN/index.json:
+#   available_dates（新→旧）/ total_days / days: {日期: summary + generated_at}
+#   网页列日期、预览当天概况只读索引，不必逐个打开日结果文件
+# 总索引 index.json: 各群天数 / 最新日期 + 所有日期的并集
+# 保存时只把新的一天合并进现有索引（读-改-写在跨进程锁内，原子替换写盘）；
+# 目录被手工改动后用 update_group_index / update_main_index（--rebuild-index）全量重建
+
+INDEX_LOCK_FILE = ".index.lock"
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def index_lock(timeout: float = 60.0):
+    """结果索引的跨进程锁（results/.index.lock），群索引和总索引的读-改-写都在锁内完成"""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_DIR / INDEX_LOCK_FILE, "a+b") as f:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _try_lock(f)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"等待索引锁超时（{timeout}s）: {f.name}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _read_json(path: Path):
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def day_index_entry(result: dict) -> dict:
+    """日结果 → 群索引 days 里的一项"""
+    return {**result.get("summary", {}), "generated_at": result.get("generated_at", "")}
+
+
+def _build_group_index(group_id: str, days: dict) -> dict:
+    dates = sorted(days, reverse=True)  # 最新日期在前
+    return {
+        "group": GROUPS[group_id]["name"],
+        "group_id": group_id,
         "updated_at": datetime.now().isoformat(),
-        "available_dates": sorted(dates, reverse=True),  # 最新日期在前
+        "available_dates": dates,
         "total_days": len(dates),
+        "days": {d: days[d] for d in dates},
     }
-    
-    index_file = group_dir / "index.json"
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
 
 
-def update_main_index():
-    """更新总索引文件"""
-    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-    
-    groups_info = []
+def _scan_group_index(group_id: str) -> dict:
+    """扫描群目录下所有日结果文件重建群索引（全量，只在重建 / 旧格式迁移时用）"""
+    days = {}
+    for f in get_group_dir(group_id).glob("*.json"):
+        if f.name == "index.json":
+            continue
+        try:
+            days[f.stem] = day_index_entry(_read_json(f) or {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 跳过无法读取的结果文件 {f.name}: {e}")
+    return _build_group_index(group_id, days)
+
+
+def _main_group_entry(group_id: str, group_index: dict) -> dict:
+    dates = group_index.get("available_dates", [])
+    return {
+        "group_id": group_id,
+        "name": GROUPS[group_id]["name"],
+        "total_days": group_index.get("total_days", len(dates)),
+        "latest_date": dates[0] if dates else "",
+    }
+
+
+def _build_main_index(group_indexes: dict) -> dict:
     all_dates = set()
-    
-    for group_id, group in GROUPS.items():
-        group_dir = RESULTS_DIR / group["dir"]
-        if group_dir.exists():
-            index_file = group_dir / "index.json"
-            if index_file.exists():
-                with open(index_file, 'r', encoding='utf-8') as f:
-                    group_index = json.load(f)
-                    groups_info.append({
-                        "group_id": group_id,
-                        "name": group["name"],
-                        "total_days": group_index.get("total_days", 0),
-                        "latest_date": group_index.get("available_dates", [""])[0] if group_index.get("available_dates") else "",
-                    })
-                    all_dates.update(group_index.get("available_dates", []))
-    
-    index = {
+    for group_index in group_indexes.values():
+        all_dates.update(group_index.get("available_dates", []))
+    return {
         "updated_at": datetime.now().isoformat(),
-        "groups": groups_info,
+        "groups": [_main_group_entry(gid, group_indexes[gid]) for gid in GROUPS if gid in group_indexes],
         "all_dates": sorted(all_dates, reverse=True),
         "total_days": len(all_dates),
     }
-    
-    index_file = RESULTS_DIR / "index.json"
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
-    
+
+
+def _load_group_indexes() -> dict:
+    indexes = {}
+    for group_id in GROUPS:
+        group_index = _read_json(get_group_dir(group_id) / "index.json")
+        if group_index is not None:
+            indexes[group_id] = group_index
+    return indexes
+
+
+def merge_day_into_index(group_id: str, date: str, entry: dict) -> dict:
+    """
+    把一天的结果合并进群索引和总索引，返回新的群索引。
+    只读写两个索引文件，不扫描目录；索引不存在或是旧格式（没有 days）时先全量重建一次。
+    """
+    group_dir = get_group_dir(group_id)
+    with index_lock():
+        group_index = _read_json(group_dir / "index.json")
+        if group_index is None or "days" not in group_index:
+            group_index = _scan_group_index(group_id)
+        days = dict(group_index["days"])
+        days[date] = entry
+        group_index = _build_group_index(group_id, days)
+        write_json_atomic(group_dir / "index.json", group_index)
+
+        main_index = _read_json(RESULTS_DIR / "index.json")
+        if main_index is None:
+            main_index = _build_main_index(_load_group_indexes())
+        else:
+            entries = {g["group_id"]: g for g in main_index.get("groups", [])}
+            entries[group_id] = _main_group_entry(group_id, group_index)
+            # 并上本群完整的日期列表（而不只是新的一天），旧的总索引落后于群索引时顺带补齐
+            all_dates = set(main_index.get("all_dates", [])) | set(group_index["available_dates"])
+            main_index = {
+                "updated_at": datetime.now().isoformat(),
+                "groups": [entries[gid] for gid in GROUPS if gid in entries],
+                "all_dates": sorted(all_dates, reverse=True),
+                "total_days": len(all_dates),
+            }
+        write_json_atomic(RESULTS_DIR / "index.json", main_index)
+    return group_index
+
+
+def update_group_index(group_id: str):
+    """全量重建群索引（扫描目录下所有日结果文件）；日常保存走 merge_day_into_index"""
+    with index_lock():
+        write_json_atomic(get_group_dir(group_id) / "index.json", _scan_group_index(group_id))
+
+
+def update_main_index():
+    """按各群索引全量重建总索引"""
+    with index_lock():
+        write_json_atomic(RESULTS_DIR / "index.json", _build_main_index(_load_group_indexes()))
     print(f"✅ 已更新总索引")
 
 
+def rebuild_indexes():
+    """目录被手工增删后，重建所有群索引和总索引"""
+    for group_id in GROUPS:
+        if get_group_dir(group_id).exists():
+            update_group_index(group_id)
+            print(f"✅ 已重建 {GROUPS[group_id]['name']} 索引")
+    update_main_index()
+
+
 def git_push():
     """推送到 GitHub"""
     print()
@@ -333,7 +480,7 @@ def git_push():
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="保存群分析结果到 results 目录")
-    parser.add_argument("--group", "-g", type=str, required=True, choices=["1", "2"],
+    parser.add_argument("--group", "-g", type=str, choices=["1", "2"],
                        help="群ID: 1=地球群1, 2=地球群2")
     parser.add_argument("--paste", "-p", action="store_true", 
                        help="粘贴模式：直接粘贴 JSON 内容保存")
@@ -341,11 +488,18 @@ def main():
                        help="从指定文件读取结果")
     parser.add_argument("--push", action="store_true", 
                        help="保存后推送到 GitHub")
+    parser.add_argument("--rebuild-index", action="store_true",
+                       help="扫描 results 目录全量重建所有索引")
     args = parser.parse_args()
     
     success = False
     
-    if args.paste:
+    if args.rebuild_index:
+        rebuild_indexes()
+        success = True
+    elif not args.group:
+        parser.error("保存结果需要 --group")
+    elif args.paste:
         success = save_from_paste(args.group)
     elif args.file:
         success = save_from_file(args.group, Path(args.file))
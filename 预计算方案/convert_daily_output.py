@@ -11,6 +11,10 @@ from typing import List, Dict
 
 PROJECT_ROOT = Path(__file__).parent.parent
 
+# 结果文件 / 索引的写入逻辑在 auto_download/save_results.py
+sys.path.insert(0, str(Path(__file__).parent / "auto_download"))
+from save_results import day_index_entry, get_group_dir, merge_day_into_index, write_json_atomic
+
 def parse_multiple_json_objects(text: str) -> List[Dict]:
     """
     从文本中解析多个独立的 JSON 对象
@@ -86,50 +90,17 @@ def calculate_summary(clusters: List[Dict]) -> Dict:
         "top_cluster": top_cluster
     }
 
-def update_group_index(group_id: str, date: str, group_name: str = None):
+def update_group_index(group_id: str, result: Dict) -> Path:
     """
-    更新对应群组的 index.json 文件
+    把转换好的单日结果增量合并进对应群组的 index.json（以及总索引）
+    与 auto_download/save_results.py 共用同一个更新器：跨进程加锁、原子写、带每日 summary
     
     Args:
         group_id: 群组ID ("1" 或 "2")
-        date: 日期字符串 (格式: "YYYY-MM-DD")
-        group_name: 群组名称（可选）
+        result: convert_to_result_format 的返回值
     """
-    if group_name is None:
-        group_name = f"地球群{group_id}"
-    
-    index_path = PROJECT_ROOT / "预计算方案" / "results" / f"group{group_id}" / "index.json"
-    
-    # 如果 index.json 不存在，创建新的
-    if not index_path.exists():
-        index_path.parent.mkdir(parents=True, exist_ok=True)
-        index_data = {
-            "group": group_name,
-            "group_id": group_id,
-            "updated_at": datetime.now().isoformat(),
-            "available_dates": [date],
-            "total_days": 1
-        }
-    else:
-        # 读取现有的 index.json
-        with open(index_path, 'r', encoding='utf-8') as f:
-            index_data = json.load(f)
-        
-        # 更新日期列表（如果日期不存在，添加到列表开头）
-        available_dates = index_data.get("available_dates", [])
-        if date not in available_dates:
-            available_dates.insert(0, date)  # 新日期添加到开头（最新的在前）
-            index_data["available_dates"] = available_dates
-            index_data["total_days"] = len(available_dates)
-        
-        # 更新更新时间
-        index_data["updated_at"] = datetime.now().isoformat()
-    
-    # 保存更新后的 index.json
-    with open(index_path, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2)
-    
-    return index_path
+    merge_day_into_index(group_id, result["date"], day_index_entry(result))
+    return get_group_dir(group_id) / "index.json"
 
 def convert_to_result_format(clusters: List[Dict], group_id: str, date: str, group_name: str = None) -> Dict:
     """
@@ -223,12 +194,11 @@ def process_input_file(input_path: str, output_path: str, group_id: str, date: s
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
     print(f"💾 保存到: {output_path}")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    write_json_atomic(output_file, result)
     
     # 更新对应群组的 index.json
     print(f"\n📝 更新 group{group_id} 的 index.json...")
-    index_path = update_group_index(group_id, date, group_name)
+    index_path = update_group_index(group_id, result)
     print(f"✅ index.json 已更新: {index_path}")
     
     # 显示 summary 信息